@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
 from dotenv import load_dotenv
 from datetime import timedelta
 
@@ -52,6 +54,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'src.tasks.middlewares.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -143,20 +146,74 @@ STATIC_URL = 'static/'
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    # PageNumberPagination с apaginate_queryset для async-вьюх
+    'DEFAULT_PAGINATION_CLASS': 'src.tasks.pagination.AsyncPageNumberPagination',
     'PAGE_SIZE': 5,
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'src.tasks.authentication.CachedJWTAuthentication',
     )
 }
 
+# Сколько пользователей держит кэш аутентификации в каждом процессе и сколько
+# секунд запись живет без проверки (изменения через QuerySet.update() и,
+# с LocMemLRUBackend, сделанные в других процессах, видны не позже этого)
+TASKS_AUTH_USER_CACHE_SIZE = 10000
+TASKS_AUTH_USER_CACHE_TIMEOUT = 5
+
+# Пакетные эндпоинты /tasks/bulk/ и /subtasks/bulk/
+TASKS_BULK_BATCH_SIZE = 500
+TASKS_BULK_MAX_BATCH_SIZE = 2000
+TASKS_BULK_MAX_ITEMS = 5000
+
+# Кэш ответов списка категорий и count_tasks. Для нескольких процессов:
+# {'BACKEND': 'src.tasks.cache.RedisBackend', 'OPTIONS': {'url': 'redis://localhost:6379/0'}}
+TASKS_CACHE = {
+    'BACKEND': 'src.tasks.cache.LocMemLRUBackend',
+    'OPTIONS': {'max_entries': 1024},
+}
+TASKS_CACHE_TIMEOUT = 300
+
+# /tasks/stats/: сколько задач в списке долей подзадач и через сколько
+# секунд снимок статистики считается устаревшим
+TASKS_STATS_TASKS_LIMIT = 100
+TASKS_STATS_SNAPSHOT_MAX_AGE = 900
+
+# Поисковый индекс в памяти (SQLite) строится в фоновом потоке, пока он
+# не готов, ?search= работает через LIKE; False - строить в потоке запроса
+TASKS_SEARCH_INDEX_BACKGROUND = True
+
+# Размер пачки чтения и сериализации в потоковой выгрузке /tasks/export/
+TASKS_EXPORT_CHUNK_SIZE = 1000
+
+# Списки задач и подзадач собираются из .values() без полей DRF (src/tasks/fastpath.py);
+# JSON рендерится через orjson, если он установлен (pip install orjson)
+TASKS_FAST_LIST_SERIALIZATION = True
+
+# Доля запросов, для которых ProfilingMiddleware считает SQL и время
+# сериализации (время ответа считается для всех); 0 - только время ответа
+TASKS_PROFILING_SAMPLE_RATE = 0.1
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=5),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'src.tasks.serializers.AcceleratedTokenRefreshSerializer',
 }
 
+# Индекс отозванных токенов (src/tasks/tokens.py) читает БД после смены версии
+# в TASKS_CACHE и не реже раза в столько секунд. Это окно, в течение которого
+# другой процесс еще принимает отозванный токен, если TASKS_CACHE не общий
+# (Redis) или запись прошла мимо сигналов; 0 - читать БД при каждой проверке
+TASKS_BLACKLIST_SYNC_INTERVAL = 60
+
+# Файловые логи пишутся фоновым потоком через очередь (src/tasks/logs.py)
+# в JSON по строке на запись, с ротацией по размеру. SQL на уровне DEBUG
+# (только при DEBUG = True) попадает в db_logs.log выборочно
+# Каталог файловых логов; тесты пишут во временный каталог, а не в BASE_DIR
+TESTING = sys.argv[1:2] == ['test'] or 'pytest' in sys.modules
+LOG_DIR = tempfile.mkdtemp(prefix='taskmanager-logs-') if TESTING else os.environ.get('TASKS_LOG_DIR', BASE_DIR)
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -169,6 +226,15 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'src.tasks.logs.JSONFormatter',
+        },
+    },
+    'filters': {
+        'sample_sql': {
+            '()': 'src.tasks.logs.SamplingFilter',
+            'rate': 0.01,
+        },
     },
     'handlers': {
         'console': {
@@ -176,19 +242,22 @@ LOGGING = {
             'formatter': 'simple'
         },
         'file': {
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'app.log'),
-            'formatter': 'verbose',
+            'class': 'src.tasks.logs.QueuedFileHandler',
+            'filename': os.path.join(LOG_DIR, 'app.log'),
+            'formatter': 'json',
         },
         'django_file': {
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'http_logs.log'),
-            'formatter': 'verbose',
+            'class': 'src.tasks.logs.QueuedFileHandler',
+            'filename': os.path.join(LOG_DIR, 'http_logs.log'),
+            'formatter': 'json',
         },
         'db_file': {
-            'class': 'logging.FileHandler',
-            'filename': os.path.join(BASE_DIR, 'db_logs.log'),
-            'formatter': 'verbose',
+            'class': 'src.tasks.logs.QueuedFileHandler',
+            'filename': os.path.join(LOG_DIR, 'db_logs.log'),
+            'formatter': 'json',
+            'max_bytes': 20 * 1024 * 1024,
+            'backup_count': 3,
+            'filters': ['sample_sql'],
         }
     },
     'loggers': {
@@ -215,4 +284,4 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 EMAIL_HOST = 'localhost'
 EMAIL_PORT = 1025
 EMAIL_USE_TLS = False
-DEFAULT_FROM_EMAIL = 'noreply@taskmanager.com' # актуализировать под домен
\ No newline at end of file
+DEFAULT_FROM_EMAIL = 'noreply@taskmanager.com' # актуализировать под домен
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Task, SubTask, Category
+from django.utils import timezone
+from .models import Task, SubTask, Category, EmailOutbox, touch_tasks
 
 
 # Инлайн-форма для подзадач
@@ -29,7 +30,9 @@ class TaskAdmin(admin.ModelAdmin):
 # Пользовательский action для подзадач
 @admin.action(description="Отметить как Done")
 def mark_as_done(modeladmin, request, queryset):
-    queryset.update(status="Done")
+    # update() идет мимо auto_now и сигналов: updated_at подзадач и задач обновляем сами
+    queryset.update(status="Done", updated_at=timezone.now())
+    touch_tasks(queryset.values('task_id'))
 
 
 # Класс админки для подзадачи
@@ -45,4 +48,11 @@ class SubTaskAdmin(admin.ModelAdmin):
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name',)
-    search_fields = ('name',)
\ No newline at end of file
+    search_fields = ('name',)
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = ('recipient', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status',)
+    search_fields = ('recipient', 'subject')
@@ -0,0 +1,117 @@
+import copy
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .cache import LRUCache, get_cache, get_version, invalidate
+
+
+USER_CACHE_NAMESPACE = 'auth_user'
+
+_user_cache = None
+_user_cache_lock = threading.Lock()
+
+
+def get_user_cache():
+    """
+    Кэш пользователей по id из токена в памяти процесса. Запись действительна,
+    пока не сменилась версия пользователя в общем кэше TASKS_CACHE (ее меняют
+    сигналы post_save/post_delete в любом процессе), и не дольше
+    TASKS_AUTH_USER_CACHE_TIMEOUT секунд - это предел устаревания для
+    изменений без сигналов (QuerySet.update()) и для LocMemLRUBackend,
+    версия в котором видна только своему процессу
+    """
+    global _user_cache
+    if _user_cache is None:
+        with _user_cache_lock:
+            if _user_cache is None:
+                _user_cache = LRUCache(
+                    max_entries=getattr(settings, 'TASKS_AUTH_USER_CACHE_SIZE', 10000),
+                    timeout=min(
+                        getattr(settings, 'TASKS_AUTH_USER_CACHE_TIMEOUT', 5),
+                        api_settings.ACCESS_TOKEN_LIFETIME.total_seconds(),
+                    ),
+                )
+    return _user_cache
+
+
+def user_namespace(user_id):
+    return f'{USER_CACHE_NAMESPACE}:{user_id}'
+
+
+def invalidate_user(user):
+    user_id = getattr(user, api_settings.USER_ID_FIELD)
+    get_user_cache().delete(str(user_id))
+    # Остальные процессы увидят новую версию после фиксации транзакции
+    invalidate(user_namespace(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication, который не делает SELECT пользователя на каждый запрос:
+    пользователь берется из LRU-кэша процесса, если его версия в TASKS_CACHE
+    не менялась (одно чтение из кэша вместо запроса к БД). Изменения через
+    QuerySet.update(), которые не отправляют сигналов, вступают в силу
+    через TASKS_AUTH_USER_CACHE_TIMEOUT секунд
+    """
+
+    def get_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None:
+            return super().get_user(validated_token)
+        # Версия читается до SELECT: изменение, зафиксированное между ними,
+        # сменит версию, и следующий запрос перечитает пользователя
+        version = get_version(user_namespace(user_id))
+        user = self.get_cached_user(user_id, version, validated_token)
+        if user is None:
+            # Проверки активности и смены пароля выполняет JWTAuthentication
+            user = super().get_user(validated_token)
+            get_user_cache().set(str(user_id), (version, user))
+        # Копия, чтобы изменения request.user в одном запросе не попали в другие
+        return copy.copy(user)
+
+    def get_cached_user(self, user_id, version, validated_token):
+        cached = get_user_cache().get(str(user_id))
+        if cached is None or cached[0] != version:
+            return None
+        self.check_user(cached[1], validated_token)
+        return cached[1]
+
+    async def aauthenticate(self, request):
+        """
+        authenticate() для async-вьюх (см. AsyncAPIMixin): токен проверяется
+        без БД, пользователь из кэша берется в event loop, и только при
+        промахе кэша SELECT уходит в поток
+        """
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        user_id = validated_token.get(api_settings.USER_ID_CLAIM)
+        if user_id is None or not isinstance(get_cache(), LRUCache):
+            # Версия во внешнем кэше (Redis) читается по сети - не в event loop
+            return await sync_to_async(self.get_user)(validated_token)
+        user = self.get_cached_user(user_id, get_version(user_namespace(user_id)), validated_token)
+        if user is None:
+            return await sync_to_async(self.get_user)(validated_token)
+        return copy.copy(user)
+
+    def check_user(self, user, validated_token):
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
@@ -0,0 +1,357 @@
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db import IntegrityError, transaction
+from django.dispatch import Signal
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+from rest_framework.relations import ManyRelatedField
+from rest_framework.validators import UniqueValidator
+
+
+# bulk_create/bulk_update не отправляют post_save, поэтому пакетные операции
+# сообщают о себе отдельными сигналами: instances - сохраненные объекты,
+# для обновления еще fields - имена измененных полей
+post_bulk_create = Signal()
+post_bulk_update = Signal()
+# Пакетная запись связей M2M (без m2m_changed): field - имя поля,
+# removed и added - списки пар (pk объекта, pk связанного объекта)
+bulk_m2m_changed = Signal()
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bulk_create_with_ids(model, objects, batch_size, key='title'):
+    """
+    bulk_create, после которого у объектов гарантированно есть pk.
+    MySQL не возвращает id из пакетной вставки, поэтому дочитываем их
+    по уникальному полю key.
+    """
+    created = model._base_manager.bulk_create(objects, batch_size=batch_size)
+    missing = [obj for obj in created if obj.pk is None]
+    if missing:
+        ids = {}
+        for chunk in chunked([getattr(obj, key) for obj in missing], batch_size):
+            ids.update(model._base_manager.filter(**{f'{key}__in': chunk}).values_list(key, 'pk'))
+        for obj in missing:
+            obj.pk = ids[getattr(obj, key)]
+    return created
+
+
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    PrimaryKeyRelatedField, который при пакетной валидации берет объекты из
+    заранее загруженного словаря context['preloaded'][model] вместо запроса на каждый id
+    """
+
+    def to_internal_value(self, data):
+        preloaded = self.context.get('preloaded', {}).get(self.get_queryset().model)
+        if preloaded is None:
+            return super().to_internal_value(data)
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            pk = self.get_queryset().model._meta.pk.to_python(data)
+        except DjangoValidationError:
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        obj = preloaded.get(pk)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class BulkWriter:
+    """
+    Пакетное создание и обновление записей из списка.
+
+    Валидация идет одним проходом одним экземпляром сериализатора: связанные
+    объекты загружаются заранее, уникальные поля проверяются одним запросом
+    на пачку, вставка - через bulk_create с пачками строк M2M.
+    В режиме atomic любая ошибка отменяет всю операцию, иначе валидные
+    записи сохраняются, а ошибки возвращаются по каждому элементу.
+    """
+
+    def __init__(self, serializer_class, request, batch_size, atomic=True, queryset=None, extra_fields=None):
+        self.serializer_class = serializer_class
+        self.model = serializer_class.Meta.model
+        self.request = request
+        self.batch_size = batch_size
+        self.atomic = atomic
+        self.queryset = queryset if queryset is not None else self.model._default_manager.all()
+        self.extra_fields = extra_fields or {}
+        self.unique_fields = [
+            field.name for field in self.model._meta.concrete_fields
+            if field.unique and not field.primary_key
+        ]
+
+    # --- результаты ---
+
+    @staticmethod
+    def success(index, instance, status):
+        return {'index': index, 'status': status, 'id': instance.pk}
+
+    @staticmethod
+    def error(index, errors):
+        return {'index': index, 'status': 'error', 'errors': errors}
+
+    # --- валидация ---
+
+    def get_child(self, items, partial):
+        context = {'request': self.request, 'preloaded': {}}
+        child = self.serializer_class(context=context, partial=partial)
+        context['preloaded'] = self.preload_related(child, items)
+        return child
+
+    def preload_related(self, child, items):
+        # Все id связанных объектов из всего списка загружаются одним запросом на пачку
+        preloaded = {}
+        for name, field in child.fields.items():
+            if field.read_only:
+                continue
+            relation = field.child_relation if isinstance(field, ManyRelatedField) else field
+            if not isinstance(relation, PreloadedPrimaryKeyRelatedField):
+                continue
+            queryset = relation.get_queryset()
+            pk_field = queryset.model._meta.pk
+            pks = set()
+            for item in items:
+                value = item.get(name) if isinstance(item, dict) else None
+                for pk in value if isinstance(value, list) else [value]:
+                    if pk is None or isinstance(pk, bool):
+                        continue
+                    try:
+                        pks.add(pk_field.to_python(pk))
+                    except (DjangoValidationError, TypeError):
+                        continue
+            objects = {}
+            for chunk in chunked(list(pks), self.batch_size):
+                objects.update(queryset.in_bulk(chunk))
+            preloaded[queryset.model] = objects
+        return preloaded
+
+    def run_validation(self, child, index, item, results):
+        try:
+            return child.run_validation(item)
+        except ValidationError as exc:
+            results[index] = self.error(index, exc.detail)
+            return None
+
+    @staticmethod
+    def get_unique_message(child, field_name):
+        # Текст ошибки тот же, что у UniqueValidator при создании по одной записи;
+        # у сериализаторов пакетных операций валидатор снят (см. TaskBulkSerializer)
+        field = child.fields.get(field_name)
+        for validator in getattr(field, 'validators', ()):
+            if isinstance(validator, UniqueValidator):
+                return validator.message
+        return UniqueValidator.message
+
+    def check_unique(self, child, valid, results):
+        """
+        Проверка уникальных полей: один запрос к БД на пачку значений
+        плюс поиск дублей внутри самого списка
+        """
+        for field_name in self.unique_fields:
+            message = self.get_unique_message(child, field_name)
+            values = [data[field_name] for _, _, data in valid if field_name in data]
+            existing = {}
+            for chunk in chunked(values, self.batch_size):
+                existing.update(
+                    self.model._base_manager.filter(**{f'{field_name}__in': chunk}).values_list(field_name, 'pk')
+                )
+
+            seen = set()
+            still_valid = []
+            for index, instance, data in valid:
+                value = data.get(field_name)
+                if field_name in data:
+                    owner_pk = existing.get(value)
+                    own_pk = instance.pk if instance is not None else None
+                    if value in seen or (owner_pk is not None and owner_pk != own_pk):
+                        results[index] = self.error(index, {field_name: [message]})
+                        continue
+                    seen.add(value)
+                still_valid.append((index, instance, data))
+            valid = still_valid
+        return valid
+
+    def split_m2m(self, data):
+        m2m = {}
+        for name in list(data):
+            field = self.model._meta.get_field(name)
+            if field.many_to_many:
+                m2m[name] = data.pop(name)
+        return m2m
+
+    # --- запись ---
+
+    def write_m2m(self, pending, replace):
+        by_field = {}
+        for instance, m2m in pending:
+            for name, related in m2m.items():
+                by_field.setdefault(name, []).append((instance, related))
+
+        for name, pairs in by_field.items():
+            field = self.model._meta.get_field(name)
+            through = field.remote_field.through
+            source = f'{field.m2m_field_name()}_id'
+            target = f'{field.m2m_reverse_field_name()}_id'
+            removed = []
+            if replace:
+                ids = [instance.pk for instance, _ in pairs]
+                for chunk in chunked(ids, self.batch_size):
+                    old_rows = through.objects.filter(**{f'{source}__in': chunk})
+                    removed.extend(old_rows.values_list(source, target))
+                    old_rows.delete()
+            rows = [
+                through(**{source: instance.pk, target: obj.pk})
+                for instance, related in pairs
+                for obj in {obj.pk: obj for obj in related}.values()
+            ]
+            through.objects.bulk_create(rows, batch_size=self.batch_size)
+            bulk_m2m_changed.send(
+                sender=self.model, field=name, removed=removed,
+                added=[(getattr(row, source), getattr(row, target)) for row in rows],
+            )
+
+    def save_batches(self, pending, results, status, save_batch):
+        """
+        Сохраняет пачками. В режиме atomic все пачки в одной транзакции, иначе
+        каждая пачка в своей и ошибка БД помечает только ее элементы.
+        Возвращает список сохраненных объектов.
+        """
+        if self.atomic:
+            try:
+                with transaction.atomic():
+                    for batch in chunked(pending, self.batch_size):
+                        save_batch(batch)
+            except IntegrityError as exc:
+                for index, _, _ in pending:
+                    results[index] = self.error(index, {'non_field_errors': [str(exc)]})
+                return []
+            batches = [pending]
+        else:
+            batches = []
+            for batch in chunked(pending, self.batch_size):
+                try:
+                    with transaction.atomic():
+                        save_batch(batch)
+                except IntegrityError as exc:
+                    for index, _, _ in batch:
+                        results[index] = self.error(index, {'non_field_errors': [str(exc)]})
+                else:
+                    batches.append(batch)
+
+        saved = []
+        for batch in batches:
+            for index, instance, _ in batch:
+                results[index] = self.success(index, instance, status)
+                saved.append(instance)
+        return saved
+
+    def skip_valid(self, valid, results):
+        # В режиме atomic валидные элементы не сохраняются из-за ошибок в других
+        for index, _, _ in valid:
+            results[index] = {'index': index, 'status': 'skipped'}
+        return results, False
+
+    def create(self, items):
+        results = [None] * len(items)
+        child = self.get_child(items, partial=False)
+
+        valid = []
+        for index, item in enumerate(items):
+            data = self.run_validation(child, index, item, results)
+            if data is not None:
+                valid.append((index, None, data))
+        valid = self.check_unique(child, valid, results)
+
+        if self.atomic and len(valid) != len(items):
+            return self.skip_valid(valid, results)
+
+        pending = []
+        for index, _, data in valid:
+            m2m = self.split_m2m(data)
+            pending.append((index, self.model(**data, **self.extra_fields), m2m))
+
+        def save_batch(batch):
+            key = self.unique_fields[0] if self.unique_fields else None
+            instances = [instance for _, instance, _ in batch]
+            bulk_create_with_ids(self.model, instances, self.batch_size, key=key)
+            self.write_m2m([(instance, m2m) for _, instance, m2m in batch], replace=False)
+            # Внутри транзакции пачки: счетчики и письма outbox фиксируются вместе с данными
+            post_bulk_create.send(sender=self.model, instances=instances)
+
+        created = self.save_batches(pending, results, 'created', save_batch)
+        return results, len(created) == len(items)
+
+    def update(self, items):
+        results = [None] * len(items)
+        child = self.get_child(items, partial=True)
+        pk_field = self.model._meta.pk
+
+        ids = []
+        for index, item in enumerate(items):
+            try:
+                ids.append(pk_field.to_python(item.get('id')) if isinstance(item, dict) else None)
+            except DjangoValidationError:
+                ids.append(None)
+        instances = {}
+        for chunk in chunked([pk for pk in set(ids) if pk is not None], self.batch_size):
+            instances.update(self.queryset.in_bulk(chunk))
+
+        valid = []
+        seen_ids = set()
+        for index, (pk, item) in enumerate(zip(ids, items)):
+            instance = instances.get(pk)
+            if instance is None:
+                results[index] = self.error(index, {'id': ['Not found.']})
+                continue
+            if pk in seen_ids:
+                results[index] = self.error(index, {'id': ['Duplicate id in the request.']})
+                continue
+            seen_ids.add(pk)
+            if instance.owner_id != self.request.user.pk:
+                results[index] = self.error(index, {'detail': 'You do not have permission to perform this action.'})
+                continue
+            child.instance = instance
+            data = self.run_validation(child, index, {k: v for k, v in item.items() if k != 'id'}, results)
+            if data is not None:
+                valid.append((index, instance, data))
+        child.instance = None
+        valid = self.check_unique(child, valid, results)
+
+        if self.atomic and len(valid) != len(items):
+            return self.skip_valid(valid, results)
+
+        pending = []
+        fields = set()
+        # bulk_update не вызывает pre_save, поля auto_now (updated_at) заполняем сами
+        auto_now = [field for field in self.model._meta.concrete_fields if getattr(field, 'auto_now', False)]
+        for index, instance, data in valid:
+            m2m = self.split_m2m(data)
+            for name, value in data.items():
+                setattr(instance, name, value)
+                fields.add(name)
+            for field in auto_now:
+                field.pre_save(instance, add=False)
+            pending.append((index, instance, m2m))
+        # Изменение одних связей M2M тоже считается изменением записи
+        fields.update(field.name for field in auto_now)
+
+        def save_batch(batch):
+            instances = [instance for _, instance, _ in batch]
+            if fields:
+                self.model._base_manager.bulk_update(instances, sorted(fields), batch_size=self.batch_size)
+            self.write_m2m([(instance, m2m) for _, instance, m2m in batch if m2m], replace=True)
+            # Внутри транзакции пачки: счетчики и письма outbox фиксируются вместе с данными
+            post_bulk_update.send(sender=self.model, instances=instances, fields=fields)
+
+        updated = self.save_batches(pending, results, 'updated', save_batch)
+        for instance in updated:
+            if hasattr(instance, 'reset_tracked_fields'):
+                instance.reset_tracked_fields()
+        return results, len(updated) == len(items)
@@ -0,0 +1,273 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.http import http_date, parse_etags, parse_http_date_safe, quote_etag
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.response import Response
+
+try:
+    import redis
+except ImportError:  # redis-py нужен только для RedisBackend с url
+    redis = None
+
+
+class LRUCache:
+    """
+    Потокобезопасный кэш в памяти процесса с вытеснением давно не используемых
+    записей (LRU) и временем жизни записей
+    """
+
+    def __init__(self, max_entries=1024, timeout=None):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        expires_at = time.monotonic() + timeout if timeout else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def incr(self, key, delta=1):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            value += delta
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocMemLRUBackend(LRUCache):
+    """
+    Бэкенд кэша ответов по умолчанию - LRU в памяти процесса
+    """
+
+
+class LocalRedisStandIn:
+    """
+    Замена клиента redis-py в памяти процесса (get/set/incr/delete/flushdb):
+    позволяет использовать RedisBackend локально и в тестах без сервера
+    """
+
+    def __init__(self):
+        self._cache = LRUCache(max_entries=10 ** 6)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self._cache.get(key)
+
+    def set(self, key, value, ex=None):
+        self._cache.set(key, value, timeout=ex)
+        return True
+
+    def incr(self, key, amount=1):
+        # Как и Redis, хранит число строкой
+        with self._lock:
+            value = int(self._cache.get(key) or 0) + amount
+            self._cache.set(key, str(value).encode())
+            return value
+
+    def delete(self, *keys):
+        for key in keys:
+            self._cache.delete(key)
+        return len(keys)
+
+    def flushdb(self):
+        self._cache.clear()
+        return True
+
+
+class RedisBackend:
+    """
+    Бэкенд кэша поверх Redis-совместимого клиента. Без url используется
+    LocalRedisStandIn, с url - redis-py (pip install redis)
+    """
+
+    def __init__(self, url=None, client=None, timeout=None, prefix='tasks'):
+        if client is None:
+            if url is None:
+                client = LocalRedisStandIn()
+            elif redis is None:
+                raise ImportError('RedisBackend с url требует пакет redis')
+            else:
+                client = redis.Redis.from_url(url)
+        self.client = client
+        self.timeout = timeout
+        self.prefix = prefix
+
+    def make_key(self, key):
+        return f'{self.prefix}:{key}'
+
+    def get(self, key, default=None):
+        value = self.client.get(self.make_key(key))
+        if value is None:
+            return default
+        if isinstance(value, bytes) and value.isdigit():
+            return int(value)
+        return pickle.loads(value) if isinstance(value, bytes) else value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else timeout
+        payload = str(value).encode() if isinstance(value, int) else pickle.dumps(value)
+        self.client.set(self.make_key(key), payload, ex=timeout or None)
+
+    def delete(self, key):
+        self.client.delete(self.make_key(key))
+
+    def incr(self, key, delta=1):
+        return int(self.client.incr(self.make_key(key), delta))
+
+    def clear(self):
+        self.client.flushdb()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Кэш из настройки TASKS_CACHE: {'BACKEND': путь к классу, 'OPTIONS': {...}}
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                config = getattr(settings, 'TASKS_CACHE', {})
+                backend = import_string(config.get('BACKEND', 'src.tasks.cache.LocMemLRUBackend'))
+                _cache = backend(**config.get('OPTIONS', {}))
+    return _cache
+
+
+def reset_cache():
+    get_cache().clear()
+
+
+def version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_version(namespace):
+    """
+    Текущая версия пространства ключей. Начальное значение берется от времени,
+    чтобы после вытеснения или перезапуска версия не совпала со старой
+    """
+    cache = get_cache()
+    version = cache.get(version_key(namespace))
+    if version is None:
+        version = time.time_ns()
+        cache.set(version_key(namespace), version, timeout=0)
+    return version
+
+
+def bump_version(namespace):
+    """
+    Инвалидирует все ключи пространства имен: старые записи больше не читаются
+    и со временем вытесняются
+    """
+    cache = get_cache()
+    if cache.get(version_key(namespace)) is None:
+        cache.set(version_key(namespace), time.time_ns(), timeout=0)
+    else:
+        cache.incr(version_key(namespace))
+
+
+def invalidate(namespace):
+    """
+    Инвалидация после фиксации транзакции: если сменить версию раньше,
+    параллельный запрос успеет закэшировать еще старые данные
+    """
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def etag_matches(request, etag):
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    etags = parse_etags(header)
+    # Для If-None-Match используется слабое сравнение
+    return '*' in etags or etag.removeprefix('W/') in [tag.removeprefix('W/') for tag in etags]
+
+
+def make_etag(*parts):
+    return quote_etag(hashlib.md5(':'.join(str(part) for part in parts).encode()).hexdigest())
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Можно ли ответить 304: If-None-Match совпал с ETag, а если его нет -
+    ресурс не менялся после If-Modified-Since (с точностью до секунды)
+    """
+    if request.headers.get('If-None-Match'):
+        return etag_matches(request, etag)
+    since = parse_http_date_safe(request.headers.get('If-Modified-Since') or '')
+    return since is not None and last_modified is not None and int(last_modified.timestamp()) <= since
+
+
+def validator_headers(etag, last_modified=None):
+    # no-cache: клиент хранит ответ, но каждый раз проверяет его условным запросом
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified.timestamp())
+    return headers
+
+
+def cached_response(request, namespace, build, timeout=None):
+    """
+    Ответ GET-запроса из кэша по ключу (namespace, версия, полный URL).
+    build() вызывается только при промахе и возвращает данные ответа.
+    ETag зависит от версии и URL, поэтому If-None-Match проверяется
+    до обращения к кэшу и при совпадении возвращается 304 без тела.
+    """
+    if timeout is None:
+        timeout = getattr(settings, 'TASKS_CACHE_TIMEOUT', 300)
+    version = get_version(namespace)
+    key = f'{namespace}:{version}:{request.build_absolute_uri()}'
+    etag = make_etag(key)
+    headers = validator_headers(etag)
+
+    if etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    cache = get_cache()
+    data = cache.get(key)
+    if data is None:
+        data = build()
+        cache.set(key, data, timeout=timeout)
+    return Response(data, headers=headers)
+
+
+CATEGORY_CACHE_NAMESPACE = 'categories'
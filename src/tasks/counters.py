@@ -0,0 +1,124 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from .bulk import chunked
+from .models import Task, CategoryTaskCounter, OwnerStatusTaskCounter
+
+
+TaskCategory = Task.categories.through
+
+
+def apply_deltas(model, deltas, key_fields):
+    """
+    Прибавляет приращения к счетчикам: deltas - {ключ: приращение}, ключ -
+    кортеж значений key_fields. Недостающие строки создаются с нулем, затем
+    UPDATE ... SET task_count = task_count + n
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    # Строки создаются только для положительных приращений: уменьшать
+    # несуществующий счетчик незачем, а при каскадном удалении владельца
+    # новая строка ссылалась бы на удаляемого пользователя
+    model.objects.bulk_create(
+        [model(**dict(zip(key_fields, key))) for key, delta in deltas.items() if delta > 0],
+        ignore_conflicts=True,
+    )
+    by_delta = {}
+    for key, delta in deltas.items():
+        by_delta.setdefault(delta, []).append(key)
+    for delta, keys in by_delta.items():
+        if len(key_fields) == 1:
+            filters = {f'{key_fields[0]}__in': [key for key, in keys]}
+            model.objects.filter(**filters).update(task_count=F('task_count') + delta)
+        else:
+            for key in keys:
+                model.objects.filter(**dict(zip(key_fields, key))).update(task_count=F('task_count') + delta)
+
+
+def adjust_category_counts(deltas):
+    """
+    deltas - {id категории: приращение}
+    """
+    apply_deltas(CategoryTaskCounter, {(pk,): delta for pk, delta in deltas.items()}, ('category_id',))
+
+
+def adjust_owner_status_counts(deltas):
+    """
+    deltas - {(id владельца, статус): приращение}
+    """
+    apply_deltas(OwnerStatusTaskCounter, deltas, ('owner_id', 'status'))
+
+
+def category_ids_for_tasks(task_ids, batch_size=1000):
+    """
+    Сколько раз каждая категория встречается у задач task_ids
+    """
+    counts = Counter()
+    for chunk in chunked(list(task_ids), batch_size):
+        counts.update(
+            TaskCategory.objects.filter(task_id__in=chunk).values_list('category_id', flat=True)
+        )
+    return counts
+
+
+def owner_status_counts(owner):
+    """
+    {статус: количество задач} пользователя - одно чтение по ключу
+    """
+    return dict(
+        OwnerStatusTaskCounter.objects.filter(owner=owner, task_count__gt=0).values_list('status', 'task_count')
+    )
+
+
+def compute_counts():
+    """
+    Счетчики, посчитанные заново по таблицам задач
+    """
+    categories = dict(
+        TaskCategory.objects.filter(task__is_deleted=False).values('category_id')
+        .annotate(n=Count('id')).values_list('category_id', 'n')
+    )
+    owner_statuses = {
+        (owner_id, status): n
+        for owner_id, status, n in Task.objects.order_by().values('owner_id', 'status')
+        .annotate(n=Count('id')).values_list('owner_id', 'status', 'n')
+    }
+    return categories, owner_statuses
+
+
+def reconcile(dry_run=False):
+    """
+    Сверяет таблицы счетчиков с реальными данными и исправляет расхождения.
+    Возвращает {'categories': число исправленных строк, 'owner_statuses': ...}
+    """
+    with transaction.atomic():
+        # Блокируем счетчики, чтобы параллельные изменения дождались сверки
+        stored_categories = dict(
+            CategoryTaskCounter.objects.select_for_update().values_list('category_id', 'task_count')
+        )
+        stored_owner_statuses = {
+            (owner_id, status): n
+            for owner_id, status, n in OwnerStatusTaskCounter.objects.select_for_update()
+            .values_list('owner_id', 'status', 'task_count')
+        }
+        categories, owner_statuses = compute_counts()
+
+        category_deltas = {
+            pk: categories.get(pk, 0) - stored_categories.get(pk, 0)
+            for pk in set(categories) | set(stored_categories)
+        }
+        owner_status_deltas = {
+            key: owner_statuses.get(key, 0) - stored_owner_statuses.get(key, 0)
+            for key in set(owner_statuses) | set(stored_owner_statuses)
+        }
+        if not dry_run:
+            adjust_category_counts(category_deltas)
+            adjust_owner_status_counts(owner_status_deltas)
+
+    return {
+        'categories': sum(1 for delta in category_deltas.values() if delta),
+        'owner_statuses': sum(1 for delta in owner_status_deltas.values() if delta),
+    }
@@ -0,0 +1,75 @@
+import csv
+
+from rest_framework.utils.encoders import JSONEncoder
+
+from .pagination import keyset_queryset
+
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'tasks.ndjson'),
+    'csv': ('text/csv', 'tasks.csv'),
+}
+
+TASK_COLUMNS = ('id', 'title', 'description', 'status', 'deadline', 'created_at', 'owner')
+SUBTASK_COLUMNS = ('id', 'title', 'description', 'status', 'deadline', 'created_at')
+
+
+def serialized_chunks(queryset, serializer_class, chunk_size):
+    """
+    Обходит queryset пачками по ключу (created_at, id) - каждая пачка отдельный
+    запрос с LIMIT, prefetch_related выполняется на пачку - и сериализует их,
+    так что в памяти одновременно только одна пачка. iterator() для этого
+    не годится: драйвер MySQL буферизует весь результат на клиенте.
+    Порядок - по убыванию created_at, по возрастанию при ?ordering=created_at.
+    Ранжирование поиска (search_rank) в выгрузке не сохраняется: ?search=
+    только отбирает задачи, а пачки идут по ключу (created_at, id)
+    """
+    ascending = queryset.query.order_by[:1] == ('created_at',)
+    position = None
+    while True:
+        chunk = list(keyset_queryset(queryset, position, ascending)[:chunk_size])
+        if not chunk:
+            return
+        yield serializer_class(chunk, many=True).data
+        if len(chunk) < chunk_size:
+            return
+        position = chunk[-1].created_at, chunk[-1].pk
+
+
+def ndjson_lines(chunks):
+    encoder = JSONEncoder(ensure_ascii=False)
+    for chunk in chunks:
+        yield ''.join(encoder.encode(task) + '\n' for task in chunk)
+
+
+class Echo:
+    # csv.writer пишет в "файл", а мы сразу отдаем получившуюся строку
+    def write(self, value):
+        return value
+
+
+def csv_lines(chunks):
+    """
+    Одна строка на подзадачу с повторением полей задачи;
+    задача без подзадач - одна строка с пустыми полями подзадачи
+    """
+    writer = csv.writer(Echo())
+    yield writer.writerow(
+        [*TASK_COLUMNS, 'categories'] + [f'subtask_{column}' for column in SUBTASK_COLUMNS]
+    )
+    for chunk in chunks:
+        lines = []
+        for task in chunk:
+            task_row = [task[column] for column in TASK_COLUMNS]
+            task_row.append('|'.join(category['name'] for category in task['categories']))
+            subtasks = task['subtasks'] or [None]
+            for subtask in subtasks:
+                subtask_row = [subtask[column] for column in SUBTASK_COLUMNS] if subtask else [''] * len(SUBTASK_COLUMNS)
+                lines.append(writer.writerow(task_row + subtask_row))
+        yield ''.join(lines)
+
+
+def export_lines(file_format, chunks):
+    if file_format == 'csv':
+        return csv_lines(chunks)
+    return ndjson_lines(chunks)
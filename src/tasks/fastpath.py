@@ -0,0 +1,229 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import F, ForeignObjectRel, QuerySet
+from rest_framework import serializers
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.renderers import JSONRenderer
+
+from .cache import LRUCache
+from .models import related_ordering
+
+try:
+    import orjson
+except ImportError:  # orjson нужен только для ускорения FastJSONRenderer
+    orjson = None
+
+
+# Поля, у которых to_representation для значения из .values() возвращает
+# его же (str, int, bool, id). Сравнение по точному типу: подкласс мог
+# переопределить to_representation
+IDENTITY_FIELDS = {
+    serializers.CharField,
+    serializers.EmailField,
+    serializers.SlugField,
+    serializers.IntegerField,
+    serializers.BooleanField,
+    serializers.ChoiceField,
+    PrimaryKeyRelatedField,
+}
+
+PARENT_KEY = '_values_parent'
+
+
+class UnsupportedSerializer(Exception):
+    pass
+
+
+class ManyRelation:
+    """
+    Связь "многие" (M2M или обратный FK): один запрос .values() на страницу,
+    строки группируются по id родителя. Порядок тот же, что у prefetch_related
+    в EagerLoadingMixin - менеджер по умолчанию и related_ordering модели
+    """
+
+    def __init__(self, model_field, nested=None):
+        self.related_model = model_field.related_model
+        if isinstance(model_field, ForeignObjectRel):
+            self.query_name = model_field.field.name
+        else:
+            self.query_name = model_field.related_query_name()
+        # nested=None - свернутая связь, отдается списком id
+        self.nested = nested
+
+    def fetch(self, parent_pks):
+        return self.group(self.get_rows(parent_pks))
+
+    async def afetch(self, parent_pks):
+        return self.group([row async for row in self.get_rows(parent_pks)])
+
+    def get_rows(self, parent_pks):
+        queryset = self.related_model._default_manager.filter(
+            **{f'{self.query_name}__in': parent_pks}
+        ).order_by(*related_ordering(self.related_model))
+        if self.nested is None:
+            return queryset.values_list(self.query_name, self.related_model._meta.pk.name)
+        return queryset.values(*self.nested.columns, **{PARENT_KEY: F(self.query_name)})
+
+    def group(self, rows):
+        grouped = defaultdict(list)
+        if self.nested is None:
+            for parent, pk in rows:
+                grouped[parent].append(pk)
+            return grouped
+        build = self.nested.build
+        for row in rows:
+            grouped[row[PARENT_KEY]].append(build(row, None))
+        return grouped
+
+
+class ValuesSerializer:
+    """
+    Скомпилированный по экземпляру ModelSerializer сериализатор только для
+    чтения: какие колонки взять через .values() и как собрать из строки
+    словарь ответа. Порядок и представление полей те же, что у исходного
+    сериализатора, поэтому JSON получается побайтно тем же.
+
+    Поддерживаются поля модели, PrimaryKeyRelatedField, вложенный
+    ModelSerializer на внешний ключ и many=True по M2M/обратному FK;
+    для остального бросается UnsupportedSerializer
+    """
+
+    def __init__(self, serializer, prefix=''):
+        self.model = serializer.Meta.model
+        self.prefix = prefix
+        self.pk_column = prefix + self.model._meta.pk.name
+        # required_model_fields (ключ курсорной пагинации) читаются, даже если их нет в ответе
+        self.columns = [self.pk_column, *(prefix + name for name in getattr(serializer, 'required_model_fields', ()))]
+        self.relations = []
+        self.getters = []
+        for field in serializer.fields.values():
+            if not field.write_only:
+                self.getters.append((field.field_name, self.compile_field(field)))
+
+    def add_column(self, column):
+        if column not in self.columns:
+            self.columns.append(column)
+
+    def compile_field(self, field):
+        source = field.source
+        if source == '*' or '.' in source:
+            raise UnsupportedSerializer(field.field_name)
+        try:
+            model_field = self.model._meta.get_field(source)
+        except FieldDoesNotExist:
+            raise UnsupportedSerializer(field.field_name)
+
+        if isinstance(field, serializers.ListSerializer) and isinstance(field.child, serializers.ModelSerializer):
+            return self.compile_many(model_field, ValuesSerializer(field.child))
+        if isinstance(field, ManyRelatedField) and type(field.child_relation) is PrimaryKeyRelatedField:
+            return self.compile_many(model_field, None)
+        if model_field.many_to_many or model_field.one_to_many or not model_field.concrete:
+            raise UnsupportedSerializer(field.field_name)
+
+        column = self.prefix + source
+        if isinstance(field, serializers.ModelSerializer):
+            nested = ValuesSerializer(field, prefix=column + '__')
+            if nested.relations:
+                raise UnsupportedSerializer(field.field_name)
+            for nested_column in nested.columns:
+                self.add_column(nested_column)
+
+            def get_nested(row, related):
+                return None if row[nested.pk_column] is None else nested.build(row, related)
+            return get_nested
+
+        self.add_column(column)
+        if type(field) in IDENTITY_FIELDS:
+            return lambda row, related: row[column]
+        convert = field.to_representation
+
+        def get_converted(row, related):
+            value = row[column]
+            return None if value is None else convert(value)
+        return get_converted
+
+    def compile_many(self, model_field, nested):
+        if self.prefix or (nested is not None and nested.relations):
+            # Вложенность глубже одного уровня обычным путем
+            raise UnsupportedSerializer(model_field.name)
+        relation = ManyRelation(model_field, nested)
+        self.relations.append(relation)
+        pk_column = self.pk_column
+
+        def get_many(row, related):
+            return related[relation].get(row[pk_column], [])
+        return get_many
+
+    def build(self, row, related):
+        return {name: get(row, related) for name, get in self.getters}
+
+    def serialize(self, rows):
+        rows = list(rows)
+        related = {}
+        if rows and self.relations:
+            pks = [row[self.pk_column] for row in rows]
+            related = {relation: relation.fetch(pks) for relation in self.relations}
+        return [self.build(row, related) for row in rows]
+
+    async def aserialize(self, rows):
+        """serialize() для async-вьюх: rows - список или QuerySet, читаемый через async for"""
+        rows = [row async for row in rows] if isinstance(rows, QuerySet) else list(rows)
+        related = {}
+        if rows and self.relations:
+            pks = [row[self.pk_column] for row in rows]
+            related = {relation: await relation.afetch(pks) for relation in self.relations}
+        return [self.build(row, related) for row in rows]
+
+
+_compiled = LRUCache(max_entries=256)
+
+
+def get_values_serializer(serializer_class, request):
+    """
+    ValuesSerializer для сериализатора вьюхи с учетом ?fields= и ?expand=,
+    или None, если быстрый путь выключен или сериализатор не поддерживается.
+    Скомпилированные варианты кэшируются
+    """
+    if not getattr(settings, 'TASKS_FAST_LIST_SERIALIZATION', True):
+        return None
+    if not hasattr(serializer_class, 'get_requested_fields'):
+        return None
+    requested = serializer_class.get_requested_fields(request)
+    expanded = serializer_class.get_expanded_fields(request)
+    key = (serializer_class, frozenset(requested) if requested is not None else None, frozenset(expanded))
+    compiled = _compiled.get(key)
+    if compiled is None:
+        try:
+            compiled = ValuesSerializer(serializer_class(context={'request': request}))
+        except UnsupportedSerializer:
+            compiled = False
+        _compiled.set(key, compiled)
+    return compiled or None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer через orjson, если он установлен. Вывод побайтно совпадает
+    с JSONRenderer: компактные разделители, UTF-8 без экранирования,
+    \\u2028/\\u2029 экранируются, даты и Decimal - через кодировщик DRF.
+    Для отступов (?format=api, indent=) и без orjson - обычный JSONRenderer
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            # Например, целые больше 64 бит
+            return super().render(data, accepted_media_type, renderer_context)
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
@@ -0,0 +1,388 @@
+import csv
+import json
+import sys
+import time
+from collections import Counter
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .bulk import bulk_create_with_ids
+from .cache import CATEGORY_CACHE_NAMESPACE, invalidate
+from .counters import adjust_category_counts, adjust_owner_status_counts
+from .models import Task, SubTask, Category, Status, touch_tasks
+from .search import get_search_backend
+
+
+FILE_FORMATS = ('ndjson', 'csv')
+
+
+class ImportRowError(ValueError):
+    pass
+
+
+@contextmanager
+def open_input(path):
+    if path == '-':
+        yield sys.stdin
+    else:
+        with open(path, encoding='utf-8', newline='') as file:
+            yield file
+
+
+def detect_format(path):
+    if path.endswith('.csv'):
+        return 'csv'
+    return 'ndjson'
+
+
+def read_records(path, file_format=None):
+    """
+    Построчно читает записи из NDJSON или CSV, не загружая файл целиком.
+    Выдает пары (номер строки, словарь)
+    """
+    file_format = file_format or detect_format(path)
+    with open_input(path) as file:
+        if file_format == 'csv':
+            reader = csv.DictReader(file)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for line_num, line in enumerate(file, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError as exc:
+                    yield line_num, ImportRowError(f'некорректный JSON: {exc}')
+                    continue
+                yield line_num, record
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ImportResult:
+
+    max_errors_kept = 20
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.rows = 0
+        self.created = 0
+        self.skipped = 0
+        self.errors = []
+        self.error_count = 0
+        self.started = time.monotonic()
+        self.elapsed = 0.0
+
+    def error(self, line_num, message):
+        self.error_count += 1
+        if len(self.errors) < self.max_errors_kept:
+            self.errors.append((line_num, message))
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.elapsed if self.elapsed else float(self.rows)
+
+
+class TaskImporter:
+    """
+    Потоковый импорт задач, подзадач и связей задача - категория.
+
+    Пользователи и категории держатся в словарях в памяти (их немного),
+    задачи для подзадач и связей ищутся одним запросом на пачку. Каждая пачка
+    вставляется через bulk_create в своей транзакции (или все в одной при
+    atomic=True). Сигналы при этом не отправляются, поэтому счетчики
+    обновляются здесь же, а кэш категорий и поисковый индекс сбрасываются в finish().
+    """
+
+    def __init__(self, batch_size=1000, create_categories=False, default_owner=None, atomic=False):
+        self.batch_size = batch_size
+        self.create_categories = create_categories
+        self.atomic = atomic
+        self.owners = dict(User.objects.values_list('username', 'id').iterator(chunk_size=5000))
+        self.owner_ids = set(self.owners.values())
+        self.load_categories()
+        self.default_owner = None
+        if default_owner is not None:
+            self.default_owner = self.owners.get(default_owner)
+            if self.default_owner is None:
+                raise ImportRowError(f'пользователь {default_owner} не найден')
+
+    def load_categories(self):
+        # Связывать задачи можно только с активными категориями; названия
+        # мягко удаленных запоминаются, чтобы не пытаться создать их заново
+        self.categories = {}
+        self.deleted_categories = set()
+        for name, pk, is_deleted in Category.all_objects.values_list('name', 'id', 'is_deleted'):
+            if is_deleted:
+                self.deleted_categories.add(name)
+            else:
+                self.categories[name] = pk
+
+    # --- разбор полей ---
+
+    def get_owner(self, row, default=None):
+        """
+        Владелец: колонка owner_id - id пользователя, колонка owner - имя
+        пользователя (в NDJSON число в owner - тоже id, как в /tasks/export/)
+        """
+        owner_id = row.get('owner_id')
+        if owner_id not in (None, ''):
+            try:
+                if isinstance(owner_id, bool):
+                    raise ValueError
+                owner_id = int(owner_id)
+            except (TypeError, ValueError):
+                raise ImportRowError(f'некорректный owner_id: {owner_id}')
+            if owner_id not in self.owner_ids:
+                raise ImportRowError(f'пользователь с id {owner_id} не найден')
+            return owner_id
+        value = row.get('owner')
+        if value in (None, ''):
+            if default is None:
+                raise ImportRowError('не указан владелец (owner)')
+            return default
+        if isinstance(value, int) and not isinstance(value, bool):
+            # В выгрузке /tasks/export/ владелец - id пользователя
+            owner_id = value if value in self.owner_ids else None
+        else:
+            owner_id = self.owners.get(str(value))
+        if owner_id is None:
+            raise ImportRowError(f'пользователь {value} не найден')
+        return owner_id
+
+    @staticmethod
+    def get_title(row, field='title'):
+        title = (row.get(field) or '').strip()
+        if not title:
+            raise ImportRowError(f'пустое поле {field}')
+        if len(title) > 200:
+            raise ImportRowError(f'поле {field} длиннее 200 символов')
+        return title
+
+    @staticmethod
+    def get_status(row):
+        value = row.get('status') or Status.NEW
+        if value not in Status.values:
+            raise ImportRowError(f'неизвестный статус {value}')
+        return value
+
+    @staticmethod
+    def get_datetime(row, field):
+        value = row.get(field)
+        if value in (None, ''):
+            return None
+        parsed = parse_datetime(value) if isinstance(value, str) else None
+        if parsed is None:
+            raise ImportRowError(f'некорректная дата в поле {field}: {value}')
+        if timezone.is_naive(parsed):
+            parsed = timezone.make_aware(parsed)
+        return parsed
+
+    @staticmethod
+    def get_category_names(row):
+        value = row.get('categories')
+        if value in (None, ''):
+            return []
+        if isinstance(value, str):
+            value = value.split('|')
+        # В выгрузке /tasks/export/ категории - объекты с name
+        names = [item.get('name') if isinstance(item, dict) else item for item in value]
+        return [str(name).strip() for name in names if name and str(name).strip()]
+
+    def resolve_categories(self, names):
+        missing = [
+            name for name in dict.fromkeys(names)
+            if name not in self.categories and name not in self.deleted_categories
+        ]
+        if missing and self.create_categories:
+            created = bulk_create_with_ids(
+                Category, [Category(name=name) for name in missing], self.batch_size, key='name'
+            )
+            self.categories.update((category.name, category.pk) for category in created)
+            invalidate(CATEGORY_CACHE_NAMESPACE)
+            missing = []
+        return missing
+
+    def get_category_ids(self, names):
+        deleted = [name for name in names if name in self.deleted_categories]
+        if deleted:
+            raise ImportRowError(f'категории удалены: {", ".join(deleted)}')
+        unknown = [name for name in names if name not in self.categories]
+        if unknown:
+            raise ImportRowError(f'категории не найдены: {", ".join(unknown)}')
+        return list(dict.fromkeys(self.categories[name] for name in names))
+
+    def find_tasks(self, titles):
+        # Задачи пачки одним запросом: title -> (id, owner_id)
+        return {
+            title: (pk, owner_id)
+            for title, pk, owner_id in Task.objects.filter(title__in=set(titles)).values_list('title', 'id', 'owner_id')
+        }
+
+    # --- общий цикл ---
+
+    def run(self, kind, records, save_batch):
+        result = ImportResult(kind)
+        context = transaction.atomic() if self.atomic else nullcontext()
+        with context:
+            for batch in batched(records, self.batch_size):
+                rows = []
+                for line_num, row in batch:
+                    result.rows += 1
+                    if isinstance(row, Exception):
+                        result.error(line_num, str(row))
+                    elif not isinstance(row, dict):
+                        result.error(line_num, 'запись должна быть объектом')
+                    else:
+                        rows.append((line_num, row))
+                try:
+                    with transaction.atomic():
+                        save_batch(rows, result)
+                except IntegrityError as exc:
+                    if self.atomic:
+                        raise
+                    # Категории, созданные в откаченной пачке, тоже откатились
+                    self.load_categories()
+                    for line_num, _ in rows:
+                        result.error(line_num, f'ошибка БД в пачке: {exc}')
+        result.finish()
+        return result
+
+    def build(self, rows, result, build_row):
+        built = []
+        for line_num, row in rows:
+            try:
+                built.append(build_row(row))
+            except ImportRowError as exc:
+                result.error(line_num, str(exc))
+        return built
+
+    # --- задачи ---
+
+    def import_tasks(self, records):
+        return self.run('tasks', records, self.save_tasks)
+
+    def save_tasks(self, rows, result):
+        self.resolve_categories([name for _, row in rows for name in self.get_category_names(row)])
+        existing = set(
+            Task.all_objects.filter(title__in=[(row.get('title') or '').strip() for _, row in rows])
+            .values_list('title', flat=True)
+        )
+
+        def build_row(row):
+            title = self.get_title(row)
+            if title in existing:
+                result.skipped += 1
+                return None
+            task = Task(
+                title=title,
+                description=row.get('description') or '',
+                owner_id=self.get_owner(row, self.default_owner),
+                status=self.get_status(row),
+                deadline=self.get_datetime(row, 'deadline'),
+            )
+            category_ids = self.get_category_ids(self.get_category_names(row))
+            # Название занято только строкой, которая прошла все проверки
+            existing.add(title)
+            return task, category_ids
+
+        built = [item for item in self.build(rows, result, build_row) if item is not None]
+        if not built:
+            return
+        tasks = bulk_create_with_ids(Task, [task for task, _ in built], self.batch_size)
+        links = [
+            Task.categories.through(task_id=task.pk, category_id=category_id)
+            for task, category_ids in built
+            for category_id in category_ids
+        ]
+        Task.categories.through.objects.bulk_create(links, batch_size=self.batch_size)
+        adjust_owner_status_counts(Counter((task.owner_id, task.status) for task in tasks))
+        adjust_category_counts(Counter(link.category_id for link in links))
+        result.created += len(tasks)
+
+    # --- подзадачи ---
+
+    def import_subtasks(self, records):
+        return self.run('subtasks', records, self.save_subtasks)
+
+    def save_subtasks(self, rows, result):
+        tasks = self.find_tasks((row.get('task') or '').strip() for _, row in rows)
+        existing = set(
+            SubTask.all_objects.filter(title__in=[(row.get('title') or '').strip() for _, row in rows])
+            .values_list('title', flat=True)
+        )
+
+        def build_row(row):
+            title = self.get_title(row)
+            if title in existing:
+                result.skipped += 1
+                return None
+            task_title = self.get_title(row, 'task')
+            if task_title not in tasks:
+                raise ImportRowError(f'задача {task_title} не найдена')
+            task_id, task_owner_id = tasks[task_title]
+            subtask = SubTask(
+                title=title,
+                description=row.get('description') or '',
+                task_id=task_id,
+                owner_id=self.get_owner(row, task_owner_id),
+                status=self.get_status(row),
+                deadline=self.get_datetime(row, 'deadline'),
+            )
+            existing.add(title)
+            return subtask
+
+        subtasks = [item for item in self.build(rows, result, build_row) if item is not None]
+        SubTask.objects.bulk_create(subtasks, batch_size=self.batch_size)
+        touch_tasks(subtask.task_id for subtask in subtasks)
+        result.created += len(subtasks)
+
+    # --- связи задача - категория ---
+
+    def import_links(self, records):
+        return self.run('links', records, self.save_links)
+
+    def save_links(self, rows, result):
+        self.resolve_categories([(row.get('category') or '').strip() for _, row in rows if row.get('category')])
+        tasks = self.find_tasks((row.get('task') or '').strip() for _, row in rows)
+        through = Task.categories.through
+        existing = set(
+            through.objects.filter(task_id__in=[pk for pk, _ in tasks.values()])
+            .values_list('task_id', 'category_id')
+        )
+
+        def build_row(row):
+            task_title = self.get_title(row, 'task')
+            if task_title not in tasks:
+                raise ImportRowError(f'задача {task_title} не найдена')
+            category_id, = self.get_category_ids([self.get_title(row, 'category')])
+            key = (tasks[task_title][0], category_id)
+            if key in existing:
+                result.skipped += 1
+                return None
+            existing.add(key)
+            return through(task_id=key[0], category_id=key[1])
+
+        links = [item for item in self.build(rows, result, build_row) if item is not None]
+        through.objects.bulk_create(links, batch_size=self.batch_size)
+        adjust_category_counts(Counter(link.category_id for link in links))
+        touch_tasks(link.task_id for link in links)
+        result.created += len(links)
+
+    def finish(self):
+        invalidate(CATEGORY_CACHE_NAMESPACE)
+        # Индекс в памяти перестроится при следующем поиске, FULLTEXT в MySQL обновляется сам
+        get_search_backend().reset()
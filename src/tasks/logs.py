@@ -0,0 +1,153 @@
+import json
+import logging
+import os
+import queue
+import random
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler, TimedRotatingFileHandler
+
+
+# Атрибуты LogRecord, которые не считаются дополнительными полями (extra=)
+RECORD_ATTRS = set(vars(logging.LogRecord('', 0, '', 0, '', None, None))) | {'message', 'asctime'}
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Одна запись - одна строка JSON: время UTC, уровень, логгер, сообщение,
+    процесс, поток, traceback и поля, переданные через extra=
+    """
+
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data['exc'] = record.exc_text
+        if record.stack_info:
+            data['stack'] = self.formatStack(record.stack_info)
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRS and key not in data:
+                data[key] = value
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает долю rate записей ниже уровня level; записи уровня level
+    и выше проходят всегда
+    """
+
+    def __init__(self, rate=1.0, level=logging.WARNING):
+        super().__init__()
+        self.rate = rate
+        self.level = level if isinstance(level, int) else logging.getLevelName(level)
+
+    def filter(self, record):
+        if record.levelno >= self.level or self.rate >= 1:
+            return True
+        return self.rate > 0 and random.random() < self.rate
+
+
+class _QueueListener(QueueListener):
+
+    def enqueue_sentinel(self):
+        # При остановке очередь может быть полна - ждем места, а не теряем сигнал
+        self.queue.put(self._sentinel)
+
+
+class QueuedFileHandler(QueueHandler):
+    """
+    Файловый обработчик с ротацией, который не пишет на потоке запроса:
+    запись кладется в ограниченную очередь, а в файл ее пишет фоновый
+    QueueListener. Форматирование (formatter из LOGGING) тоже выполняется
+    в фоновом потоке. При переполнении очереди записи отбрасываются,
+    число отброшенных пишется в лог, как только место освободится.
+
+    Ротация по размеру (max_bytes) или по времени (when, interval) -
+    как у RotatingFileHandler и TimedRotatingFileHandler. Ротация
+    не согласована между процессами: у каждого воркера свой файл
+    или внешний logrotate с max_bytes=0
+    """
+
+    def __init__(self, filename, max_bytes=50 * 1024 * 1024, backup_count=5, when=None, interval=1,
+                 queue_size=10000):
+        super().__init__(queue.Queue(queue_size))
+        if when:
+            self.target = TimedRotatingFileHandler(
+                filename, when=when, interval=interval, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+        else:
+            self.target = RotatingFileHandler(
+                filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8', delay=True
+            )
+        self.dropped = 0
+        self._dropped_lock = threading.Lock()
+        self._listener = None
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # dictConfig назначает formatter этому обработчику, а форматирует целевой
+        self.target.setFormatter(fmt)
+
+    def ensure_listener(self):
+        # Поток не переживает fork (gunicorn --preload), поэтому запускается
+        # при первой записи в каждом процессе
+        if self._listener_pid == os.getpid():
+            return
+        with self._listener_lock:
+            if self._listener_pid != os.getpid():
+                if self._listener_pid is not None:
+                    # Записи, попавшие в очередь до fork, пишет родительский процесс
+                    self.queue = queue.Queue(self.queue.maxsize)
+                self._listener = _QueueListener(self.queue, self.target)
+                self._listener.start()
+                self._listener_pid = os.getpid()
+
+    def prepare(self, record):
+        # Аргументы подставляются сразу: к моменту записи объекты могут измениться
+        record = logging.makeLogRecord(vars(record))
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self.ensure_listener()
+        # Счетчик меняют потоки всех запросов: забираем его под блокировкой,
+        # а если очередь все еще полна - возвращаем обратно
+        with self._dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        try:
+            if dropped:
+                self.queue.put_nowait(logging.makeLogRecord({
+                    'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                    'msg': f'Очередь логов переполнена, отброшено записей: {dropped}',
+                }))
+                dropped = 0
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self._dropped_lock:
+                self.dropped += dropped + 1
+
+    def flush(self):
+        # Дожидается записи всего, что уже в очереди
+        if self._listener_pid == os.getpid():
+            self.queue.join()
+        self.target.flush()
+
+    def close(self):
+        with self._listener_lock:
+            if self._listener is not None and self._listener_pid == os.getpid():
+                self._listener.stop()
+            self._listener = self._listener_pid = None
+        self.target.close()
+        super().close()
@@ -0,0 +1,446 @@
+import asyncio
+import http.client
+import json
+import math
+import platform
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+import django
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from src.tasks.models import Task, SubTask, Category, Status
+from src.tasks.profiling import get_profile_store
+from src.tasks.seeding import seed_dataset
+
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+MODES = ('client', 'asgi', 'wsgi')
+PROFILING_MIDDLEWARE = 'src.tasks.middlewares.ProfilingMiddleware'
+
+
+class BenchCase:
+    """
+    Один сценарий: метод, маршрут и параметры запроса. prepare(context, i)
+    вызывается до замера и может вернуть тело и заголовки конкретного запроса.
+    limit ограничивает число запросов для дорогих сценариев
+    """
+
+    def __init__(self, label, method, url_name, args=(), query=None, data=None, prepare=None, limit=None):
+        self.label = label
+        self.method = method
+        self.url_name = url_name
+        self.args = args
+        self.query = query
+        self.data = data
+        self.prepare = prepare
+        self.limit = limit
+
+    def build(self, context, index):
+        data, headers = self.data, {'Authorization': f'Bearer {context["access"]}'}
+        if self.prepare is not None:
+            data, extra_headers = self.prepare(context, index)
+            headers.update(extra_headers)
+        path = reverse(self.url_name, args=[context[arg] for arg in self.args])
+        if self.query:
+            path = f'{path}?{urlencode(self.query)}'
+        body = json.dumps(data).encode() if data is not None else b''
+        return self.method, path, body, headers
+
+
+def new_title(kind):
+    def prepare(context, index):
+        return {'title': f'{context["run"]} {kind} {index}', **context[f'{kind}_payload']}, {}
+    return prepare
+
+
+def bulk_payload(kind, size=10):
+    def prepare(context, index):
+        payload = context[f'{kind}_payload']
+        return [{'title': f'{context["run"]} {kind} bulk {index}-{j}', **payload} for j in range(size)], {}
+    return prepare
+
+
+def login(context, index):
+    return {'username': context['username'], 'password': context['password']}, {}
+
+
+def register(context, index):
+    username = f'{context["run"]}_user_{index}'.replace(' ', '_')
+    return {
+        'username': username, 'email': f'{username}@example.com',
+        'password': context['password'], 'password2': context['password'],
+    }, {}
+
+
+def refresh(context, index):
+    return {'refresh': str(RefreshToken.for_user(context['user']))}, {}
+
+
+def logout(context, index):
+    return None, {'Cookie': f'refresh={RefreshToken.for_user(context["user"])}'}
+
+
+def deleted_task(context, index):
+    # Удаляется отдельная задача на каждый запрос, созданная до замера
+    context['delete_id'] = Task.objects.create(title=f'{context["run"]} delete {index}', owner=context['user']).pk
+    return None, {}
+
+
+BENCH_CASES = [
+    BenchCase('tasks list', 'GET', 'task-list-create'),
+    BenchCase('tasks list page_size=50', 'GET', 'task-list-create', query={'page_size': 50}),
+    BenchCase('tasks list cursor', 'GET', 'task-list-create', query={'pagination': 'cursor', 'page_size': 50}),
+    BenchCase('tasks list filter+order', 'GET', 'task-list-create', query={'status': Status.DONE, 'ordering': '-created_at'}),
+    BenchCase('tasks list search', 'GET', 'task-list-create', query={'search': 'task 42'}),
+    BenchCase('tasks list fields', 'GET', 'task-list-create', query={'fields': 'id,title,status', 'expand': ''}),
+    BenchCase('task create', 'POST', 'task-list-create', prepare=new_title('task')),
+    BenchCase('task detail', 'GET', 'task-detail', args=['task_id']),
+    BenchCase('task update', 'PATCH', 'task-detail', args=['task_id'], data={'status': Status.IN_PROGRESS}),
+    BenchCase('task delete', 'DELETE', 'task-detail', args=['delete_id'], prepare=deleted_task),
+    BenchCase('tasks bulk create x10', 'POST', 'task-bulk', prepare=bulk_payload('task')),
+    BenchCase('tasks by day', 'GET', 'task-list-by-day', query={'day_of_week': 'понедельник'}),
+    BenchCase('my tasks', 'GET', 'my-tasks'),
+    BenchCase('task stats', 'GET', 'task-stats'),
+    BenchCase('tasks export', 'GET', 'task-export', limit=3),
+    BenchCase('subtasks list', 'GET', 'subtask-list-create'),
+    BenchCase('subtask create', 'POST', 'subtask-list-create', prepare=new_title('subtask')),
+    BenchCase('subtask detail', 'GET', 'subtask-detail', args=['subtask_id']),
+    BenchCase('subtasks bulk create x10', 'POST', 'subtask-bulk', prepare=bulk_payload('subtask')),
+    BenchCase('categories list', 'GET', 'category-list'),
+    BenchCase('category detail', 'GET', 'category-detail', args=['category_id']),
+    BenchCase('categories count_tasks', 'GET', 'category-count-tasks'),
+    BenchCase('login', 'POST', 'token_obtain_pair', prepare=login, limit=20),
+    BenchCase('token refresh', 'POST', 'token_refresh', prepare=refresh, limit=50),
+    BenchCase('logout', 'POST', 'logout', prepare=logout, limit=50),
+    BenchCase('register', 'POST', 'register', prepare=register, limit=20),
+    BenchCase('async tasks list', 'GET', 'async-task-list'),
+    BenchCase('async tasks list cursor', 'GET', 'async-task-list', query={'pagination': 'cursor', 'page_size': 50}),
+    BenchCase('async task detail', 'GET', 'async-task-detail', args=['task_id']),
+    BenchCase('async my tasks', 'GET', 'async-my-tasks'),
+    BenchCase('async subtasks list', 'GET', 'async-subtask-list'),
+    BenchCase('async subtask detail', 'GET', 'async-subtask-detail', args=['subtask_id']),
+    BenchCase('async categories list', 'GET', 'async-category-list'),
+    BenchCase('async category detail', 'GET', 'async-category-detail', args=['category_id']),
+    BenchCase('profiling report', 'GET', 'profiling'),
+    BenchCase('profiling metrics', 'GET', 'profiling-metrics'),
+]
+
+
+def percentile(ordered, q):
+    # Ближайший ранг по отсортированному списку
+    if not ordered:
+        return None
+    index = min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def consume(chunks):
+    for _ in chunks:
+        pass
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+class QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный замер всех эндпоинтов API на синтетических данных: p50/p95/p99, '
+        'запросов в секунду и SQL на запрос. Режимы: client (тестовый клиент, WSGI в процессе), '
+        'asgi (AsyncClient через ASGIHandler), wsgi (локальный сервер wsgiref по HTTP). '
+        'Данные генерируются один раз и переиспользуются при следующих запусках'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, help='Размер набора: 10k, 100k или 1m задач')
+        parser.add_argument('--tasks', type=int, default=1000, help='Сколько задач сгенерировать (без --scale)')
+        parser.add_argument('--subtasks-per-task', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора данных')
+        parser.add_argument('--prefix', default='bench_api', help='Префикс имен сгенерированных записей')
+        parser.add_argument('--mode', choices=MODES, default='client')
+        parser.add_argument('--requests', type=int, default=100, help='Запросов на сценарий')
+        parser.add_argument('--warmup', type=int, default=5, help='Запросов прогрева на сценарий')
+        parser.add_argument('--concurrency', type=int, default=1, help='Параллельных клиентов (только --mode wsgi)')
+        parser.add_argument('--only', help='Сценарии, в названии которых есть эта подстрока')
+        parser.add_argument('--output', help='Записать результаты в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего запуска для сравнения')
+        parser.add_argument('--cleanup', action='store_true', help='Удалить сгенерированные данные после замера')
+
+    def handle(self, *args, **options):
+        if options['concurrency'] > 1 and options['mode'] != 'wsgi':
+            raise CommandError('--concurrency поддерживается только в режиме wsgi')
+        if settings.DEBUG:
+            self.stderr.write('DEBUG = True: запросы пишутся в connection.queries и лог, цифры завышены')
+        profiling = PROFILING_MIDDLEWARE in settings.MIDDLEWARE
+        if not profiling:
+            self.stderr.write(f'{PROFILING_MIDDLEWARE} не подключен - SQL на запрос не считается')
+
+        tasks = SCALES[options['scale']] if options['scale'] else options['tasks']
+        dataset = self.ensure_dataset(tasks, options)
+        context = self.make_context(options['prefix'])
+        cases = [case for case in BENCH_CASES if not options['only'] or options['only'] in case.label]
+
+        results = []
+        with override_settings(ALLOWED_HOSTS=['*'], TASKS_PROFILING_SAMPLE_RATE=1):
+            with self.make_sender(options['mode'], options['concurrency']) as send:
+                for case in cases:
+                    result = self.run_case(case, context, send, options, profiling)
+                    results.append(result)
+                    self.write_result(result)
+
+        report = {'meta': self.get_meta(options, tasks, dataset), 'results': results}
+        if options['compare']:
+            self.compare(report, options['compare'])
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Результаты записаны в {options["output"]}')
+        if options['cleanup']:
+            self.cleanup(options['prefix'])
+
+    # --- данные ---
+
+    def ensure_dataset(self, tasks, options):
+        prefix = options['prefix']
+        if not User.objects.filter(username=f'{prefix}_user_0').exists():
+            started = time.perf_counter()
+            counts = seed_dataset(
+                users=max(5, tasks // 200), categories=50, tasks=tasks,
+                subtasks_per_task=options['subtasks_per_task'], seed=options['seed'], prefix=prefix,
+            )
+            self.stdout.write(f'Сгенерировано {counts} за {time.perf_counter() - started:.1f} с')
+        return {
+            'tasks': Task.objects.filter(title__contains=f' #{prefix}-').count(),
+            'subtasks': SubTask.objects.filter(task__title__contains=f' #{prefix}-').count(),
+        }
+
+    def make_context(self, prefix):
+        user = User.objects.get(username=f'{prefix}_user_0')
+        password = 'bench-pass-123'
+        user.set_password(password)
+        # Администратор - для эндпоинтов профилирования
+        user.is_staff = True
+        user.save(update_fields=['password', 'is_staff'])
+        task = Task.objects.filter(owner=user).order_by('id').first()
+        if task is None:
+            raise CommandError(f'У пользователя {user.username} нет задач')
+        category = Category.objects.filter(name__contains=f' {prefix} ').order_by('id').first()
+        deadline = (timezone.now() + timedelta(days=30)).isoformat()
+        return {
+            'run': f'{prefix} run {int(time.time())}',
+            'user': user,
+            'username': user.username,
+            'password': password,
+            'task_id': task.pk,
+            'subtask_id': SubTask.objects.filter(task=task).values_list('id', flat=True).first() or 0,
+            'category_id': category.pk,
+            'task_payload': {'deadline': deadline, 'categories': [category.pk]},
+            'subtask_payload': {'deadline': deadline, 'task': task.pk},
+        }
+
+    def cleanup(self, prefix):
+        # Каскадом удаляются задачи и подзадачи пользователей с префиксом; для 1m
+        # быстрее пересоздать БД
+        User.objects.filter(username__startswith=f'{prefix}_').delete()
+        Category.all_objects.filter(name__contains=f' {prefix} ').delete()
+        self.stdout.write('Сгенерированные данные удалены')
+
+    # --- отправка запросов ---
+
+    def make_sender(self, mode, concurrency):
+        return {'client': ClientSender, 'asgi': AsyncClientSender, 'wsgi': ServerSender}[mode](concurrency)
+
+    def run_case(self, case, context, send, options, profiling):
+        count = min(options['requests'], case.limit or options['requests'])
+        warmup = min(options['warmup'], count)
+        # Обновляется на каждом сценарии: access-токен живет 5 минут
+        context['access'] = str(AccessToken.for_user(context['user']))
+        requests = [case.build(context, index) for index in range(warmup + count)]
+
+        send(requests[:warmup])
+        get_profile_store().reset()
+        started = time.perf_counter()
+        responses = send(requests[warmup:])
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for _, latency in responses)
+        sampled, queries = get_profile_store().totals()
+        return {
+            'case': case.label,
+            'method': case.method,
+            'url_name': case.url_name,
+            'requests': count,
+            'errors': sum(1 for status, _ in responses if status >= 400),
+            'statuses': sorted({status for status, _ in responses}),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 3),
+            'p95_ms': round(percentile(latencies, 95) * 1000, 3),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 3),
+            'mean_ms': round(sum(latencies) / count * 1000, 3),
+            'rps': round(count / elapsed, 2),
+            'queries_per_request': round(queries / sampled, 2) if profiling and sampled else None,
+        }
+
+    def write_result(self, result):
+        queries = result['queries_per_request']
+        errors = f'  ошибок {result["errors"]} {result["statuses"]}' if result['errors'] else ''
+        self.stdout.write(
+            f'{result["case"]:<28} p50 {result["p50_ms"]:8.2f}  p95 {result["p95_ms"]:8.2f}  '
+            f'p99 {result["p99_ms"]:8.2f} мс  {result["rps"]:8.2f} зап/с  '
+            f'{"-" if queries is None else queries} SQL/запрос{errors}'
+        )
+
+    # --- отчет ---
+
+    def get_meta(self, options, tasks, dataset):
+        try:
+            commit = subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            commit = None
+        return {
+            'commit': commit,
+            'timestamp': timezone.now().isoformat(),
+            'mode': options['mode'],
+            'concurrency': options['concurrency'],
+            'scale': options['scale'] or tasks,
+            'dataset': dataset,
+            'requests_per_case': options['requests'],
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'python': platform.python_version(),
+            'django': django.get_version(),
+        }
+
+    def compare(self, report, path):
+        with open(path, encoding='utf-8') as file:
+            baseline = {result['case']: result for result in json.load(file)['results']}
+        self.stdout.write(f'Сравнение с {path} (отрицательное - быстрее):')
+        for result in report['results']:
+            base = baseline.get(result['case'])
+            if base is None:
+                continue
+            deltas = [
+                f'{key[:3]} {(result[key] - base[key]) / base[key] * 100:+6.1f}%' if base[key] else f'{key[:3]}    n/a'
+                for key in ('p50_ms', 'p95_ms', 'p99_ms')
+            ]
+            queries = ''
+            if result['queries_per_request'] != base['queries_per_request']:
+                queries = f'  SQL {base["queries_per_request"]} -> {result["queries_per_request"]}'
+            self.stdout.write(f'  {result["case"]:<28} {"  ".join(deltas)}{queries}')
+
+
+class ClientSender:
+    """
+    Тестовый клиент Django: запрос проходит весь WSGI-стек в этом же потоке
+    """
+
+    def __init__(self, concurrency):
+        self.client = Client()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+    def __call__(self, requests):
+        results = []
+        for method, path, body, headers in requests:
+            started = time.perf_counter()
+            response = self.client.generic(method, path, body, content_type='application/json', headers=headers)
+            if response.streaming:
+                consume(response.streaming_content)
+            results.append((response.status_code, time.perf_counter() - started))
+            # Cookie из ответов (login) не переносятся в следующие запросы
+            self.client.cookies.clear()
+        return results
+
+
+class AsyncClientSender(ClientSender):
+    """
+    AsyncClient: запрос проходит через ASGIHandler, синхронные вьюхи - через sync_to_async
+    """
+
+    def __init__(self, concurrency):
+        self.client = AsyncClient()
+
+    def __call__(self, requests):
+        return asyncio.run(self.send_all(requests))
+
+    async def send_all(self, requests):
+        results = []
+        for method, path, body, headers in requests:
+            started = time.perf_counter()
+            response = await self.client.generic(method, path, body, content_type='application/json', headers=headers)
+            if response.streaming:
+                if response.is_async:
+                    async for _ in response.streaming_content:
+                        pass
+                else:
+                    # Синхронный итератор читает из БД - только вне event loop
+                    await sync_to_async(consume)(response.streaming_content)
+            results.append((response.status_code, time.perf_counter() - started))
+            self.client.cookies.clear()
+        return results
+
+
+class ServerSender:
+    """
+    Локальный многопоточный WSGI-сервер (wsgiref) в фоновом потоке и
+    concurrency клиентов по HTTP/1.0 - новое соединение на запрос
+    """
+
+    def __init__(self, concurrency):
+        self.concurrency = concurrency
+
+    def __enter__(self):
+        self.server = make_server(
+            '127.0.0.1', 0, get_wsgi_application(), server_class=ThreadingWSGIServer, handler_class=QuietHandler
+        )
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.executor.shutdown()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def send(self, request):
+        method, path, body, headers = request
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=60)
+        try:
+            started = time.perf_counter()
+            conn.request(method, path, body=body or None, headers={'Content-Type': 'application/json', **headers})
+            response = conn.getresponse()
+            response.read()
+            return response.status, time.perf_counter() - started
+        finally:
+            conn.close()
+
+    def __call__(self, requests):
+        return list(self.executor.map(self.send, requests))
@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils.module_loading import import_string
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from src.tasks.authentication import get_user_cache
+from src.tasks.middlewares import JWTCookieMiddleware
+
+
+AUTHENTICATION_CLASSES = [
+    'rest_framework_simplejwt.authentication.JWTAuthentication',
+    'src.tasks.authentication.CachedJWTAuthentication',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет накладные расходы аутентификации на запрос: JWTCookieMiddleware '
+        'и проверка access-токена из cookie разными классами аутентификации'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000, help='Запросов на каждый класс')
+
+    def handle(self, *args, **options):
+        # Пользователь создается в транзакции и откатывается после замера
+        with transaction.atomic():
+            user = User.objects.create_user(username='bench_auth_user', password='bench-pass-123')
+            token = str(AccessToken.for_user(user))
+            for path in AUTHENTICATION_CLASSES:
+                self.bench(import_string(path)(), token, user, options['requests'])
+            transaction.set_rollback(True)
+        get_user_cache().clear()
+
+    def bench(self, authenticator, token, user, count):
+        factory = APIRequestFactory()
+        middleware = JWTCookieMiddleware(lambda request: request)
+
+        def authenticate():
+            django_request = factory.get('/')
+            django_request.COOKIES['access'] = token
+            request = Request(middleware(django_request), authenticators=[authenticator])
+            assert request.user.pk == user.pk
+
+        get_user_cache().clear()
+        authenticate()  # прогрев
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            for _ in range(count):
+                authenticate()
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{type(authenticator).__name__:<26} {elapsed / count * 1e6:8.1f} мкс/запрос  '
+            f'{len(captured.captured_queries) / count:.2f} SQL/запрос'
+        )
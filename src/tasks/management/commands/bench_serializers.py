@@ -0,0 +1,77 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from src.tasks.fastpath import FastJSONRenderer, ValuesSerializer, orjson
+from src.tasks.models import Task, SubTask
+from src.tasks.seeding import seed_dataset
+from src.tasks.serializers import TaskSerializer, SubTaskSerializer
+
+
+BENCH_CASES = [
+    (Task, TaskSerializer, {}),
+    (Task, TaskSerializer, {'fields': 'id,title,status', 'expand': ''}),
+    (SubTask, SubTaskSerializer, {}),
+    (SubTask, SubTaskSerializer, {'expand': 'task'}),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает сериализацию страницы списка задач/подзадач через сериализаторы DRF '
+        'и через ValuesSerializer + FastJSONRenderer; проверяет, что JSON совпадает побайтно'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=2000, help='Сколько задач сгенерировать')
+        parser.add_argument('--page-size', type=int, default=50, help='Записей на странице')
+        parser.add_argument('--repeat', type=int, default=200, help='Повторов на каждый вариант')
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write('orjson не установлен - FastJSONRenderer работает как JSONRenderer')
+        # Данные генерируются в транзакции и откатываются после замера
+        with transaction.atomic():
+            seed_dataset(tasks=options['tasks'], prefix='bench_ser')
+            user = User.objects.filter(username__startswith='bench_ser_').first()
+            for model, serializer_class, params in BENCH_CASES:
+                self.bench(model, serializer_class, params, user, options['page_size'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def bench(self, model, serializer_class, params, user, page_size, repeat):
+        request = Request(APIRequestFactory().get('/', params))
+        request.user = user
+        queryset = serializer_class.setup_eager_loading(model.objects.all(), request)
+        values_serializer = ValuesSerializer(serializer_class(context={'request': request}))
+
+        def drf():
+            page = list(queryset[:page_size])
+            return JSONRenderer().render(serializer_class(page, many=True, context={'request': request}).data)
+
+        def fast():
+            page = queryset.prefetch_related(None).values(*values_serializer.columns)[:page_size]
+            return FastJSONRenderer().render(values_serializer.serialize(page))
+
+        if drf() != fast():
+            raise CommandError(f'{serializer_class.__name__} {params}: JSON различается')
+
+        label = f'{serializer_class.__name__} {params or ""}'
+        self.stdout.write(label)
+        timings = {}
+        for name, func in (('DRF', drf), ('values', fast)):
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    func()
+                timings[name] = (time.perf_counter() - started) / repeat
+            self.stdout.write(
+                f'  {name:<8} {timings[name] * 1e3:8.2f} мс/страница  '
+                f'{len(captured.captured_queries) / repeat:.1f} SQL/страница'
+            )
+        self.stdout.write(f'  ускорение x{timings["DRF"] / timings["values"]:.1f}')
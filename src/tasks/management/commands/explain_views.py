@@ -0,0 +1,137 @@
+from collections import namedtuple
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from src.tasks.cache import CATEGORY_CACHE_NAMESPACE, bump_version
+from src.tasks.models import Task, SubTask
+from src.tasks.seeding import seed_dataset
+
+
+# object - какой объект подставить в id маршрута, allowed_scans - таблицы,
+# полный просмотр которых ожидаем (например, агрегат по всем категориям)
+ExplainCase = namedtuple('ExplainCase', 'url_name object params allowed_scans')
+
+EXPLAIN_CASES = [
+    ExplainCase('task-list-create', None, {}, ()),
+    ExplainCase('task-list-create', None, {'status': 'New'}, ()),
+    ExplainCase('task-list-create', None, {'ordering': 'created_at'}, ()),
+    ExplainCase('task-list-create', None, {'pagination': 'cursor'}, ()),
+    ExplainCase('task-detail', 'task', {}, ()),
+    ExplainCase('task-list-by-day', None, {'day_of_week': 'понедельник'}, ()),
+    ExplainCase('my-tasks', None, {}, ()),
+    ExplainCase('my-tasks', None, {'pagination': 'cursor'}, ()),
+    ExplainCase('task-stats', None, {'fresh': 'true'}, ()),
+    ExplainCase('subtask-list-create', None, {}, ()),
+    ExplainCase('subtask-list-create', None, {'pagination': 'cursor'}, ()),
+    ExplainCase('subtask-detail', 'subtask', {}, ()),
+    ExplainCase('category-list', None, {}, ()),
+    ExplainCase('category-count-tasks', None, {}, ('task_manager_category',)),
+]
+
+
+def explain_full_scans(sql):
+    """
+    Возвращает список таблиц, которые запрос читает полным просмотром
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            scans = []
+            for row in cursor.fetchall():
+                detail = row[-1]
+                if not detail.startswith('SCAN ') or 'USING' in detail:
+                    continue
+                table = detail.split()[1]
+                if table != 'CONSTANT':
+                    scans.append(table)
+            return scans
+        if connection.vendor == 'mysql':
+            cursor.execute(f'EXPLAIN {sql}')
+            columns = [column[0] for column in cursor.description]
+            rows = [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return [row['table'] for row in rows if row['type'] == 'ALL']
+    raise CommandError(f'EXPLAIN не поддерживается для СУБД {connection.vendor}')
+
+
+class Command(BaseCommand):
+    help = (
+        'Выполняет EXPLAIN для SQL, который генерируют API-вьюхи, на синтетических '
+        'данных и завершается с ошибкой, если какой-то запрос читает таблицу целиком'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=2000, help='Сколько задач сгенерировать')
+        parser.add_argument('--url-name', action='append', dest='url_names',
+                            help='Проверять только указанные маршруты (можно повторять)')
+        parser.add_argument('--ignore-table', action='append', dest='ignore_tables', default=[],
+                            help='Не считать ошибкой полный просмотр таблицы (можно повторять)')
+        parser.add_argument('--existing', action='store_true',
+                            help='Проверять на данных, уже лежащих в БД (например, из manage.py seed), без генерации')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        cases = EXPLAIN_CASES
+        if options['url_names']:
+            cases = [case for case in cases if case.url_name in options['url_names']]
+            if not cases:
+                raise CommandError('Нет проверок для указанных маршрутов')
+
+        # Данные генерируются в транзакции и откатываются после проверки.
+        # Версия кэша меняется до и после, чтобы ответы шли из БД и
+        # не остались в кэше после отката
+        bump_version(CATEGORY_CACHE_NAMESPACE)
+        try:
+            with transaction.atomic():
+                if options['existing']:
+                    user = User.objects.filter(tasks__isnull=False).order_by('id').first()
+                    if user is None:
+                        raise CommandError('В БД нет задач - запустите manage.py seed')
+                else:
+                    seed_dataset(tasks=options['tasks'], prefix='explain')
+                    user = User.objects.filter(username__startswith='explain_').first()
+                failures = self.check_cases(cases, user, set(options['ignore_tables']))
+                transaction.set_rollback(True)
+        finally:
+            bump_version(CATEGORY_CACHE_NAMESPACE)
+
+        if failures:
+            raise CommandError(f'Полный просмотр таблиц в {failures} запрос(ах)')
+        self.stdout.write(self.style.SUCCESS('Все запросы используют индексы'))
+
+    def check_cases(self, cases, user, ignore_tables):
+        client = APIClient()
+        client.force_authenticate(user=user)
+        objects = {
+            'task': Task.objects.first(),
+            'subtask': SubTask.objects.first(),
+        }
+
+        failures = 0
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for case in cases:
+                kwargs = {'id': objects[case.object].pk} if case.object else None
+                url = reverse(case.url_name, kwargs=kwargs)
+                with CaptureQueriesContext(connection) as captured:
+                    response = client.get(url, case.params)
+                if response.status_code != 200:
+                    raise CommandError(f'{url} {case.params}: ответ {response.status_code}')
+
+                allowed = ignore_tables | set(case.allowed_scans)
+                for query in captured.captured_queries:
+                    sql = query['sql']
+                    if not sql.lstrip().upper().startswith('SELECT'):
+                        continue
+                    scans = [table for table in explain_full_scans(sql) if table not in allowed]
+                    if scans:
+                        failures += 1
+                        self.stdout.write(self.style.ERROR(
+                            f'{case.url_name} {case.params}: полный просмотр {", ".join(scans)}\n    {sql}'
+                        ))
+                    elif self.verbosity > 1:
+                        self.stdout.write(f'{case.url_name} {case.params}: OK\n    {sql}')
+        return failures
@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from src.tasks.importing import FILE_FORMATS, ImportRowError, TaskImporter, read_records
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоковый импорт задач, подзадач и связей с категориями из NDJSON/CSV '
+        'пакетными вставками. Файлы обрабатываются в порядке: задачи, подзадачи, связи'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', help=(
+            'Файл задач: title, description, status, deadline, owner (имя пользователя) или owner_id, '
+            'categories (названия активных категорий через |)'
+        ))
+        parser.add_argument('--subtasks', help=(
+            'Файл подзадач: title, description, status, deadline, task, owner (имя пользователя) или owner_id'
+        ))
+        parser.add_argument('--links', help='Файл связей: task (название задачи), category (название категории)')
+        parser.add_argument('--file-format', choices=FILE_FORMATS,
+                            help='Формат файлов (по умолчанию по расширению: .csv или NDJSON); - читает stdin')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одной пачке вставки')
+        parser.add_argument('--owner', help='Владелец задач, у которых owner не указан')
+        parser.add_argument('--create-categories', action='store_true', help='Создавать отсутствующие категории')
+        parser.add_argument('--atomic', action='store_true',
+                            help='Весь импорт в одной транзакции (по умолчанию - транзакция на пачку)')
+
+    def handle(self, *args, **options):
+        files = [(kind, options[kind]) for kind in ('tasks', 'subtasks', 'links') if options[kind]]
+        if not files:
+            raise CommandError('Укажите хотя бы один из файлов --tasks, --subtasks, --links')
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size должен быть положительным')
+
+        try:
+            importer = TaskImporter(
+                batch_size=options['batch_size'],
+                create_categories=options['create_categories'],
+                default_owner=options['owner'],
+                atomic=options['atomic'],
+            )
+        except ImportRowError as exc:
+            raise CommandError(str(exc))
+
+        try:
+            for kind, path in files:
+                records = read_records(path, options['file_format'])
+                result = getattr(importer, f'import_{kind}')(records)
+                self.report(result)
+        except (OSError, IntegrityError) as exc:
+            raise CommandError(str(exc))
+        finally:
+            importer.finish()
+
+    def report(self, result):
+        style = self.style.SUCCESS if not result.error_count else self.style.WARNING
+        self.stdout.write(style(
+            f'{result.kind}: строк {result.rows}, создано {result.created}, пропущено (уже есть) {result.skipped}, '
+            f'ошибок {result.error_count} за {result.elapsed:.1f} с ({result.rows_per_second:.0f} строк/с)'
+        ))
+        for line_num, message in result.errors:
+            self.stderr.write(f'  строка {line_num}: {message}')
+        if result.error_count > len(result.errors):
+            self.stderr.write(f'  ... и еще {result.error_count - len(result.errors)}')
@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет истекшие OutstandingToken (и их записи BlacklistedToken) пачками, '
+        'не блокируя таблицы одним большим DELETE, как flushexpiredtokens'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Токенов в одной пачке удаления')
+        parser.add_argument('--sleep', type=float, default=0, help='Пауза между пачками, сек')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно')
+        parser.add_argument('--interval', type=float, default=3600, help='Пауза между проходами в режиме --loop, сек')
+
+    def prune(self, batch_size, sleep):
+        deleted = 0
+        cutoff = timezone.now()
+        while True:
+            ids = list(
+                OutstandingToken.objects.filter(expires_at__lte=cutoff)
+                .order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return deleted
+            with transaction.atomic():
+                # only('id'): связанные BlacklistedToken удаляются каскадом,
+                # сами токены целиком при этом не читаются
+                OutstandingToken.objects.filter(id__in=ids).only('id').delete()
+            deleted += len(ids)
+            if sleep:
+                time.sleep(sleep)
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = self.prune(options['batch_size'], options['sleep'])
+            self.stdout.write(self.style.SUCCESS(f'Удалено истекших токенов: {deleted}'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
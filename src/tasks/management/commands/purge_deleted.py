@@ -0,0 +1,47 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from src.tasks.models import Task, SubTask
+
+
+class Command(BaseCommand):
+    help = (
+        'Окончательно удаляет мягко удаленные задачи и подзадачи старше --older-than дней. '
+        'Удаление идет пачками по id, каждая пачка в своей транзакции'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=30, help='Удалять записи, удаленные больше N дней назад')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Записей в одной пачке удаления')
+        parser.add_argument('--sleep', type=float, default=0, help='Пауза между пачками, сек')
+
+    def purge(self, queryset, batch_size, sleep):
+        deleted = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            with transaction.atomic():
+                queryset.model.all_objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            if sleep:
+                time.sleep(sleep)
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['older_than'])
+        batch_size, sleep = options['batch_size'], options['sleep']
+
+        # Сначала подзадачи, чтобы каскад от задач не удалял их одним большим DELETE
+        subtasks = self.purge(
+            SubTask.all_objects.filter(
+                Q(is_deleted=True, deleted_at__lt=cutoff) | Q(task__is_deleted=True, task__deleted_at__lt=cutoff)
+            ),
+            batch_size, sleep,
+        )
+        tasks = self.purge(Task.all_objects.filter(is_deleted=True, deleted_at__lt=cutoff), batch_size, sleep)
+        self.stdout.write(self.style.SUCCESS(f'Удалено задач: {tasks}, подзадач: {subtasks}'))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from src.tasks.counters import reconcile
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики задач по категориям и по статусам пользователей и исправляет расхождения'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения, не исправлять')
+
+    def handle(self, *args, **options):
+        fixed = reconcile(dry_run=options['dry_run'])
+        verb = 'Расходится' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb}: категорий - {fixed["categories"]}, пар пользователь/статус - {fixed["owner_statuses"]}'
+        ))
@@ -0,0 +1,38 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db.models import Sum
+
+from src.tasks.stats import refresh_snapshots
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает снимки статистики /tasks/stats/ для пользователей с большим '
+        'количеством задач, для остальных статистика считается на лету'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-tasks', type=int, default=10000,
+                            help='Снимок строится для пользователей, у которых не меньше задач')
+        parser.add_argument('--user', action='append', dest='usernames',
+                            help='Пересчитать только для указанных пользователей (можно повторять)')
+        parser.add_argument('--loop', action='store_true', help='Пересчитывать постоянно')
+        parser.add_argument('--interval', type=float, default=300, help='Пауза между пересчетами в режиме --loop, сек')
+
+    def get_owners(self, options):
+        if options['usernames']:
+            return User.objects.filter(username__in=options['usernames'])
+        # Размер берется из счетчиков по статусам, без подсчета по таблице задач
+        return User.objects.annotate(
+            task_total=Sum('task_status_counters__task_count')
+        ).filter(task_total__gte=options['min_tasks'])
+
+    def handle(self, *args, **options):
+        while True:
+            refreshed = refresh_snapshots(self.get_owners(options).iterator())
+            self.stdout.write(self.style.SUCCESS(f'Обновлено снимков: {refreshed}'))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
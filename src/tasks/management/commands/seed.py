@@ -0,0 +1,84 @@
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from src.tasks.seeding import SeedConfig, generate_dataset
+
+
+SCALES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+class Command(BaseCommand):
+    help = (
+        'Генерирует реалистичный набор данных для нагрузочных проверок и EXPLAIN '
+        '(manage.py explain_views --existing): пользователи с неравномерным числом задач, '
+        'категории (часть мягко удалена), задачи с категориями, подзадачами, сроками и '
+        'статусами, распределенными по давности. Результат определяется --seed'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=SCALES, help='10k, 100k или 1m задач')
+        parser.add_argument('--tasks', type=int, default=10000, help='Сколько задач сгенерировать (без --scale)')
+        parser.add_argument('--users', type=int, help='Пользователей (по умолчанию задачи / 100)')
+        parser.add_argument('--categories', type=int, default=40)
+        parser.add_argument('--subtasks', type=float, default=3.0, help='Среднее число подзадач у задачи')
+        parser.add_argument('--deleted-categories', type=float, default=0.1, help='Доля мягко удаленных категорий')
+        parser.add_argument('--deleted-tasks', type=float, default=0.02, help='Доля мягко удаленных задач')
+        parser.add_argument('--days', type=int, default=365, help='За сколько дней созданы задачи')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--now', help='Дата ISO 8601, от которой отсчитываются даты (по умолчанию - сегодня)')
+        parser.add_argument('--prefix', default='seed', help='Префикс имен пользователей и названий')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Строк в одном INSERT')
+        parser.add_argument('--chunk-size', type=int, default=10000, help='Задач в одной транзакции')
+        parser.add_argument('--workers', type=int, default=1, help='Процессов для генерации и вставки')
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        tasks = SCALES[options['scale']] if options['scale'] else options['tasks']
+        if User.objects.filter(username=f'{options["prefix"]}_user_0').exists():
+            raise CommandError(f'Данные с префиксом {options["prefix"]} уже есть - укажите другой --prefix')
+        workers = options['workers']
+        if workers > 1 and connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            raise CommandError('Для SQLite в памяти --workers должен быть 1')
+        now = None
+        if options['now']:
+            try:
+                now = datetime.fromisoformat(options['now'])
+            except ValueError:
+                raise CommandError(f'--now: ожидается дата ISO 8601, например 2025-01-01, получено {options["now"]}')
+            if timezone.is_naive(now):
+                now = timezone.make_aware(now, dt_timezone.utc)
+
+        config = SeedConfig(
+            users=options['users'] or max(5, tasks // 100),
+            categories=options['categories'],
+            tasks=tasks,
+            subtasks_mean=options['subtasks'],
+            deleted_categories=options['deleted_categories'],
+            deleted_tasks=options['deleted_tasks'],
+            days=options['days'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            batch_size=options['batch_size'],
+            chunk_size=options['chunk_size'],
+            now=now,
+        )
+        started = time.perf_counter()
+
+        def progress(counts):
+            if self.verbosity >= 2:
+                self.stdout.write(f'  задач: {counts["tasks"]} из {tasks}, {time.perf_counter() - started:.1f} с')
+
+        counts = generate_dataset(config, workers=workers, progress=progress)
+        elapsed = time.perf_counter() - started
+        rows = sum(counts.values())
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано: пользователей - {counts["users"]}, категорий - {counts["categories"]}, '
+            f'задач - {counts.get("tasks", 0)}, связей с категориями - {counts.get("links", 0)}, '
+            f'подзадач - {counts.get("subtasks", 0)} за {elapsed:.1f} с ({rows / elapsed:.0f} строк/с), '
+            f'даты от {config.now.isoformat()}'
+        ))
@@ -0,0 +1,41 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from src.tasks.outbox import process_batch
+
+
+class Command(BaseCommand):
+    help = 'Отправляет письма из outbox пачками в пуле потоков, с повторными попытками'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=100, help='Писем за одну выборку')
+        parser.add_argument('--workers', type=int, default=4, help='Потоков отправки')
+        parser.add_argument('--max-attempts', type=int, default=5, help='Попыток до статуса failed')
+        parser.add_argument('--retry-delay', type=int, default=60,
+                            help='Задержка перед первой повторной попыткой, сек (дальше удваивается)')
+        parser.add_argument('--loop', action='store_true', help='Работать постоянно, а не до опустошения очереди')
+        parser.add_argument('--interval', type=float, default=5, help='Пауза при пустой очереди в режиме --loop, сек')
+
+    def handle(self, *args, **options):
+        for option in ('batch_size', 'workers', 'max_attempts'):
+            if options[option] < 1:
+                raise CommandError(f'--{option.replace("_", "-")} должен быть не меньше 1')
+        total_sent = total_failed = 0
+        while True:
+            sent, failed = process_batch(
+                batch_size=options['batch_size'],
+                workers=options['workers'],
+                max_attempts=options['max_attempts'],
+                retry_delay=options['retry_delay'],
+            )
+            total_sent += sent
+            total_failed += failed
+            if sent or failed:
+                self.stdout.write(f'Отправлено: {sent}, ошибок: {failed}')
+                continue
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Всего отправлено: {total_sent}, ошибок: {total_failed}'))
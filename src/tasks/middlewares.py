@@ -1,16 +1,170 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
 from rest_framework_simplejwt.tokens import AccessToken
 from django.conf import settings
 from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from .profiling import RequestProfile, get_profile_store, should_sample
+
 
 class JWTCookieMiddleware:
+    # Работает и под WSGI, и под ASGI без переключения в поток
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        self.set_authorization(request)
+        response = self.get_response(request)
+        return response
+
+    async def __acall__(self, request):
+        self.set_authorization(request)
+        return await self.get_response(request)
+
+    def set_authorization(self, request):
         if 'access' in request.COOKIES:
             token = request.COOKIES.get('access')
             request.META['HTTP_AUTHORIZATION'] = f'Bearer {token}'
 
-        response = self.get_response(request)
-        return response
\ No newline at end of file
+
+class ProfilingMiddleware:
+    """
+    Время ответа каждого запроса по имени маршрута, а для доли запросов
+    TASKS_PROFILING_SAMPLE_RATE еще число SQL, время в БД, время сериализации
+    (Python во вьюхе без SQL плюс рендеринг) и повторяющиеся запросы.
+    Агрегаты в памяти процесса: /api/tasks/profiling/ и /api/tasks/profiling/metrics/
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.store = get_profile_store()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Синхронные хуки Django под ASGI вызывал бы через поток
+            self.process_view = self.aprocess_view
+            self.process_template_response = self.aprocess_template_response
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        profile = request._tasks_profile = RequestProfile() if should_sample() else None
+        if profile is None:
+            response = self.get_response(request)
+        else:
+            with profile.capture():
+                response = self.get_response(request)
+        self.finish(request, response, profile, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        profile = request._tasks_profile = RequestProfile() if should_sample() else None
+        if profile is None:
+            response = await self.get_response(request)
+        else:
+            # execute_wrapper ставится на соединения того потока, в котором
+            # sync_to_async(thread_sensitive=True) выполняет ORM этого запроса
+            capture = await sync_to_async(profile.capture)()
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(capture.close)()
+        self.finish(request, response, profile, started)
+        return response
+
+    def finish(self, request, response, profile, started):
+        if not response.streaming:
+            self.record(request, response, profile, started)
+            return
+        # Тело StreamingHttpResponse (экспорт) читается уже после выхода из
+        # middleware, и SQL с сериализацией идут во время итерации: замер
+        # продолжается по каждой порции, а запись - когда тело прочитано
+        if profile is not None:
+            profile.finish_view(time.perf_counter())
+        content = response.streaming_content
+        if response.is_async:
+            response.streaming_content = self.aiterate(request, response, content, profile, started)
+        else:
+            response.streaming_content = self.iterate(request, response, content, profile, started)
+
+    def iterate(self, request, response, content, profile, started):
+        try:
+            while True:
+                if profile is None:
+                    chunk = next(content, None)
+                else:
+                    # Порции может читать другой поток (ASGI), поэтому
+                    # execute_wrapper ставится на каждую порцию
+                    chunk_started, db_time = time.perf_counter(), profile.db_time
+                    with profile.capture():
+                        chunk = next(content, None)
+                    profile.render_time += time.perf_counter() - chunk_started - (profile.db_time - db_time)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            self.record(request, response, profile, started)
+
+    async def aiterate(self, request, response, content, profile, started):
+        capture = await sync_to_async(profile.capture)() if profile is not None else None
+        try:
+            while True:
+                chunk_started = time.perf_counter()
+                db_time = profile.db_time if profile is not None else 0.0
+                chunk = await anext(content, None)
+                if profile is not None:
+                    profile.render_time += time.perf_counter() - chunk_started - (profile.db_time - db_time)
+                if chunk is None:
+                    return
+                yield chunk
+        finally:
+            if capture is not None:
+                await sync_to_async(capture.close)()
+            self.record(request, response, profile, started)
+
+    def record(self, request, response, profile, started):
+        finished = time.perf_counter()
+        serialize_time = 0.0
+        if profile is not None:
+            profile.finish_view(finished)
+            serialize_time = profile.view_python_time + profile.render_time
+        match = request.resolver_match
+        endpoint = match.view_name if match is not None else 'unresolved'
+        self.store.record(endpoint, finished - started, response.status_code, profile, serialize_time)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = getattr(request, '_tasks_profile', None)
+        if profile is not None:
+            profile.start_view(time.perf_counter())
+
+    def process_template_response(self, request, response):
+        # DRF Response рендерится сразу после этого хука
+        profile = getattr(request, '_tasks_profile', None)
+        if profile is not None:
+            render_started = profile.finish_view(time.perf_counter())
+
+            def record_render(rendered):
+                profile.render_time = time.perf_counter() - render_started
+            response.add_post_render_callback(record_render)
+        return response
+
+    # В async-режиме атрибуты экземпляра process_* указывают на эти обертки,
+    # поэтому синхронные версии вызываются через класс
+    async def aprocess_view(self, request, view_func, view_args, view_kwargs):
+        return ProfilingMiddleware.process_view(self, request, view_func, view_args, view_kwargs)
+
+    async def aprocess_template_response(self, request, response):
+        return ProfilingMiddleware.process_template_response(self, request, response)
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractIsoWeekDay
+
+import src.tasks.models
+
+
+BACKFILL_BATCH_SIZE = 10000
+
+
+def backfill_created_weekday(apps, schema_editor):
+    # Заполняем день недели одним UPDATE на диапазон id, чтобы не держать
+    # долгую блокировку всей таблицы. ExtractIsoWeekDay учитывает TIME_ZONE.
+    Task = apps.get_model('tasks', 'Task')
+    queryset = Task.objects.using(schema_editor.connection.alias)
+    last_id = queryset.order_by('-id').values_list('id', flat=True).first() or 0
+    for start in range(0, last_id + 1, BACKFILL_BATCH_SIZE):
+        queryset.filter(id__gte=start, id__lt=start + BACKFILL_BATCH_SIZE).update(
+            created_weekday=ExtractIsoWeekDay('created_at')
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0007_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='task',
+            name='created_weekday',
+            field=src.tasks.models.WeekdayField(null=True, source='created_at'),
+        ),
+        migrations.RunPython(backfill_created_weekday, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='task',
+            name='created_weekday',
+            field=src.tasks.models.WeekdayField(source='created_at'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['created_weekday', '-created_at'], name='task_weekday_created_idx'),
+        ),
+    ]
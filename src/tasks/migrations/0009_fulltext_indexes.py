@@ -0,0 +1,40 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:40
+
+from django.db import migrations
+
+
+# FULLTEXT-индексы есть только в MySQL, на остальных СУБД поиск идет
+# через InMemorySearchBackend (см. src/tasks/search.py)
+FULLTEXT_INDEXES = [
+    ('task_manager_task', 'task_fulltext_idx'),
+    ('task_manager_subtask', 'subtask_fulltext_idx'),
+]
+
+
+def create_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    for table, name in FULLTEXT_INDEXES:
+        schema_editor.execute(
+            f'CREATE FULLTEXT INDEX {quote(name)} ON {quote(table)} ({quote("title")}, {quote("description")})'
+        )
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'mysql':
+        return
+    quote = schema_editor.quote_name
+    for table, name in FULLTEXT_INDEXES:
+        schema_editor.execute(f'DROP INDEX {quote(name)} ON {quote(table)}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0008_task_created_weekday'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_fulltext_indexes, drop_fulltext_indexes),
+    ]
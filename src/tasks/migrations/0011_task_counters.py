@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:15
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def fill_counters(apps, schema_editor):
+    # Начальные значения счетчиков двумя агрегатами по существующим задачам
+    alias = schema_editor.connection.alias
+    Task = apps.get_model('tasks', 'Task')
+    CategoryTaskCounter = apps.get_model('tasks', 'CategoryTaskCounter')
+    OwnerStatusTaskCounter = apps.get_model('tasks', 'OwnerStatusTaskCounter')
+    TaskCategory = Task.categories.through
+
+    categories = TaskCategory.objects.using(alias).values('category_id').annotate(n=Count('id'))
+    CategoryTaskCounter.objects.using(alias).bulk_create(
+        [CategoryTaskCounter(category_id=row['category_id'], task_count=row['n']) for row in categories],
+        batch_size=1000,
+    )
+    owner_statuses = Task.objects.using(alias).order_by().values('owner_id', 'status').annotate(n=Count('id'))
+    OwnerStatusTaskCounter.objects.using(alias).bulk_create(
+        [OwnerStatusTaskCounter(owner_id=row['owner_id'], status=row['status'], task_count=row['n'])
+         for row in owner_statuses],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0010_email_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryTaskCounter',
+            fields=[
+                ('category', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_counter', serialize=False, to='tasks.category')),
+                ('task_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'task_manager_category_task_counter',
+            },
+        ),
+        migrations.CreateModel(
+            name='OwnerStatusTaskCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('New', 'New'), ('In progress', 'In progress'), ('Pending', 'Pending'), ('Blocked', 'Blocked'), ('Done', 'Done')], max_length=20)),
+                ('task_count', models.IntegerField(default=0)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='task_status_counters', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'db_table': 'task_manager_owner_status_counter',
+                'constraints': [models.UniqueConstraint(fields=('owner', 'status'), name='owner_status_counter_unique')],
+            },
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('tasks', '0011_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TaskStatsSnapshot',
+            fields=[
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='task_stats_snapshot', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('data', models.JSONField()),
+                ('refreshed_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'task_manager_task_stats_snapshot',
+            },
+        ),
+    ]
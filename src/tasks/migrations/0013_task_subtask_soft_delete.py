@@ -0,0 +1,93 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:25
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0012_task_stats_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subtask',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='subtask',
+            name='is_deleted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='is_deleted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['is_deleted', '-created_at', '-id'], name='subtask_active_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['task', 'is_deleted', '-created_at'], name='subtask_task_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subtask',
+            index=models.Index(fields=['is_deleted', 'deleted_at'], name='subtask_deleted_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['is_deleted', '-created_at', '-id'], name='task_active_created_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'is_deleted', '-created_at'], name='task_owner_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['status', 'is_deleted', 'deadline'], name='task_status_active_dl_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['created_weekday', 'is_deleted', '-created_at'], name='task_weekday_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['is_deleted', 'deleted_at'], name='task_deleted_at_idx'),
+        ),
+        # Старые индексы удаляются после создания новых: MySQL не дает удалить
+        # индекс, на который опирается внешний ключ owner/task, пока нет замены
+        migrations.RemoveIndex(
+            model_name='subtask',
+            name='subtask_created_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='subtask',
+            name='subtask_task_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_created_id_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_owner_created_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_status_deadline_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='task',
+            name='task_weekday_created_idx',
+        ),
+    ]
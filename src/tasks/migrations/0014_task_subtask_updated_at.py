@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_updated_at(apps, schema_editor):
+    # AddField заполнил updated_at временем миграции, для существующих
+    # записей разумнее считать последним изменением создание
+    for model_name in ('Task', 'SubTask'):
+        apps.get_model('tasks', model_name).objects.update(updated_at=models.F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tasks', '0013_task_subtask_soft_delete'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='subtask',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddField(
+            model_name='task',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='task',
+            index=models.Index(fields=['owner', 'is_deleted', 'updated_at'], name='task_owner_active_upd_idx'),
+        ),
+    ]
@@ -0,0 +1,292 @@
+import inspect
+
+from asgiref.sync import sync_to_async
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.template.response import SimpleTemplateResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+
+from .cache import make_etag, not_modified, validator_headers
+from .fastpath import FastJSONRenderer, get_values_serializer
+from .pagination import KeysetPagination
+
+
+class OptimizedQuerysetMixin:
+    """
+    Миксин для вьюх: применяет к queryset подгрузку связей и набор полей,
+    которые объявил сериализатор (select_related / prefetch_related / only).
+
+    Подключается в filter_queryset, поэтому работает и для вьюх
+    с собственным get_queryset, и для get_object.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            queryset = serializer_class.setup_eager_loading(queryset, self.request)
+        return queryset
+
+
+class SelectablePaginationMixin:
+    """
+    Миксин для списковых вьюх: позволяет выбрать курсорную пагинацию
+    для конкретного запроса через ?pagination=cursor (или передав ?cursor=)
+    """
+    keyset_pagination_class = KeysetPagination
+    pagination_mode_query_param = 'pagination'
+    keyset_pagination_mode = 'cursor'
+
+    def use_keyset_pagination(self):
+        params = self.request.query_params
+        return (
+            params.get(self.pagination_mode_query_param) == self.keyset_pagination_mode
+            or self.keyset_pagination_class.cursor_query_param in params
+        )
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator') and self.use_keyset_pagination():
+            self._paginator = self.keyset_pagination_class()
+        return super().paginator
+
+
+class ValuesListMixin:
+    """
+    Миксин для списковых вьюх: GET собирается из строк .values() через
+    ValuesSerializer (см. fastpath.py), без создания моделей и обхода полей DRF,
+    и рендерится FastJSONRenderer. Ответ побайтно тот же, что у сериализатора.
+    Если сериализатор не поддерживается или TASKS_FAST_LIST_SERIALIZATION = False,
+    работает обычный list()
+    """
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = get_values_serializer(self.get_serializer_class(), request)
+        if values_serializer is None:
+            return super().list(request, *args, **kwargs)
+
+        # only()/prefetch_related из setup_eager_loading заменяются колонками
+        # и запросами ValuesSerializer
+        queryset = self.filter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None).values(*values_serializer.columns)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.serialize(page))
+        return Response(values_serializer.serialize(queryset))
+
+
+class ConditionalGetMixin:
+    """
+    Миксин для GET-вьюх: ETag и Last-Modified по дешевому запросу состояния
+    ресурса (get_resource_state), без основного запроса и сериализации.
+    Если клиентская копия актуальна (If-None-Match / If-Modified-Since),
+    отвечает 304. Состояние читается до основного запроса, поэтому при
+    параллельном изменении ETag окажется старше данных, но не новее
+    """
+
+    def get_resource_state(self):
+        """
+        Кортеж (версия, время последнего изменения) или None, если
+        состояние неизвестно и ответ строится обычным путем
+        """
+        raise NotImplementedError
+
+    def get(self, request, *args, **kwargs):
+        state = self.get_resource_state()
+        if state is None:
+            return super().get(request, *args, **kwargs)
+        headers, response = conditional_response(request, state)
+        if response is not None:
+            return response
+        return add_validators(super().get(request, *args, **kwargs), headers)
+
+
+def conditional_response(request, state):
+    """
+    Заголовки ETag/Last-Modified для состояния ресурса и ответ 304,
+    если клиентская копия актуальна (иначе None)
+    """
+    version, last_modified = state
+    # Ответ зависит от параметров запроса и, для my_tasks, от пользователя
+    etag = make_etag(request.user.pk, request.build_absolute_uri(), version)
+    headers = validator_headers(etag, last_modified)
+    if not_modified(request, etag, last_modified):
+        return headers, Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return headers, None
+
+
+def add_validators(response, headers):
+    if response.status_code == status.HTTP_200_OK:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+LIST_STATE = {'count': Count('pk'), 'last_modified': Max('updated_at')}
+
+
+def list_state(queryset):
+    """
+    Состояние списка: число записей и последнее updated_at. Удаление из
+    списка меняет число, любое изменение или добавление - updated_at
+    """
+    return format_list_state(queryset.order_by().aggregate(**LIST_STATE))
+
+
+async def alist_state(queryset):
+    return format_list_state(await queryset.order_by().aaggregate(**LIST_STATE))
+
+
+def format_list_state(state):
+    last_modified = state['last_modified']
+    return f'{state["count"]}:{last_modified.isoformat() if last_modified else ""}', last_modified
+
+
+class AsyncAPIMixin:
+    """
+    Миксин для вьюх только для чтения с async GET под ASGI. APIView.dispatch
+    в DRF синхронный, поэтому dispatch здесь повторяет его с await:
+    аутентификация через aauthenticate() (у CachedJWTAuthentication без
+    перехода в поток при попадании в кэш), права, троттлинг и обработка
+    исключений - как в DRF. queryset, сериализатор, фильтры и пагинация
+    берутся у синхронной вьюхи, от которой наследуется async-вариант.
+
+    Ответ рендерится здесь же и отдается обычным HttpResponse - иначе Django
+    рендерил бы Response через sync_to_async. Browsable API не подключается:
+    его формы обращаются к БД синхронно. Под WSGI Django выполняет такую
+    вьюху через async_to_sync
+    """
+    http_method_names = ['get', 'head', 'options']
+    renderer_classes = [FastJSONRenderer]
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await self.ainitial(request, *args, **kwargs)
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.render_response(self.response)
+
+    async def ainitial(self, request, *args, **kwargs):
+        self.format_kwarg = self.get_format_suffix(**kwargs)
+        request.accepted_renderer, request.accepted_media_type = self.perform_content_negotiation(request)
+        request.version, request.versioning_scheme = self.determine_version(request, *args, **kwargs)
+        await self.aperform_authentication(request)
+        self.check_permissions(request)
+        self.check_throttles(request)
+
+    async def aperform_authentication(self, request):
+        # То же, что Request._authenticate, но с aauthenticate(), если он есть
+        for authenticator in request.authenticators:
+            try:
+                if hasattr(authenticator, 'aauthenticate'):
+                    user_auth_tuple = await authenticator.aauthenticate(request)
+                else:
+                    user_auth_tuple = await sync_to_async(authenticator.authenticate)(request)
+            except exceptions.APIException:
+                request._not_authenticated()
+                raise
+            if user_auth_tuple is not None:
+                request._authenticator = authenticator
+                request.user, request.auth = user_auth_tuple
+                return
+        request._not_authenticated()
+
+    def render_response(self, response):
+        if not isinstance(response, SimpleTemplateResponse):
+            return response
+        response.render()
+        rendered = HttpResponse(response.content, status=response.status_code)
+        for name, value in response.items():
+            rendered[name] = value
+        return rendered
+
+    async def get(self, request, *args, **kwargs):
+        state = await self.aget_resource_state()
+        if state is None:
+            return await self.aread(request, *args, **kwargs)
+        headers, response = conditional_response(request, state)
+        if response is not None:
+            return response
+        return add_validators(await self.aread(request, *args, **kwargs), headers)
+
+    async def aget_resource_state(self):
+        """Как ConditionalGetMixin.get_resource_state; None - без ETag"""
+        return None
+
+    async def aread(self, request, *args, **kwargs):
+        raise NotImplementedError
+
+    async def afilter_queryset(self, queryset):
+        # Индекс в памяти может строиться синхронно (SQLite в памяти,
+        # TASKS_SEARCH_INDEX_BACKGROUND = False), поэтому с ?search= фильтры
+        # выполняются в потоке
+        params = self.request.query_params
+        search_params = [backend.search_param for backend in self.filter_backends if hasattr(backend, 'search_param')]
+        if any(params.get(name, '').strip() for name in search_params):
+            return await sync_to_async(self.filter_queryset)(queryset)
+        return self.filter_queryset(queryset)
+
+
+class AsyncListMixin(AsyncAPIMixin):
+    """
+    Async-список: строки .values() через ValuesSerializer и пагинатор
+    с apaginate_queryset (COUNT через acount(), страница через async for).
+    Если быстрый путь недоступен, синхронный list() выполняется в потоке
+    """
+
+    async def aread(self, request, *args, **kwargs):
+        values_serializer = get_values_serializer(self.get_serializer_class(), request)
+        if values_serializer is None:
+            return await sync_to_async(self.list)(request, *args, **kwargs)
+
+        queryset = await self.afilter_queryset(self.get_queryset())
+        queryset = queryset.prefetch_related(None).values(*values_serializer.columns)
+        paginator = self.paginator
+        page = None
+        if paginator is not None:
+            if hasattr(paginator, 'apaginate_queryset'):
+                page = await paginator.apaginate_queryset(queryset, request, view=self)
+            else:
+                page = await sync_to_async(paginator.paginate_queryset)(queryset, request, view=self)
+        if page is not None:
+            return self.get_paginated_response(await values_serializer.aserialize(page))
+        return Response(await values_serializer.aserialize(queryset))
+
+
+class AsyncRetrieveMixin(AsyncAPIMixin):
+    """
+    Async-детальная вьюха: объект вместе с prefetch_related читается через
+    afirst() (в Django это один переход в поток), проверяются права на объект,
+    сериализатор отдает уже загруженные данные без запросов
+    """
+
+    async def aread(self, request, *args, **kwargs):
+        instance = await self.aget_object()
+        return Response(self.get_serializer(instance).data)
+
+    async def aget_object(self):
+        queryset = await self.afilter_queryset(self.get_queryset())
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        instance = await queryset.filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}).afirst()
+        if instance is None:
+            raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
+        self.check_object_permissions(self.request, instance)
+        return instance
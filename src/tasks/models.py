@@ -11,12 +11,157 @@ class Status(models.TextChoices):
     DONE = 'Done', 'Done'
 
 
+class WeekdayField(models.PositiveSmallIntegerField):
+    """
+    Хранимый день недели (1 - понедельник ... 7 - воскресенье) для даты из поля source.
+    Считается при каждом сохранении (в том числе в bulk_create) в часовом поясе
+    проекта, чтобы фильтр по дню недели шел по индексу, а не через функцию от даты.
+    Поле должно быть объявлено после source, тогда значение source уже заполнено.
+    """
+
+    def __init__(self, *args, source=None, **kwargs):
+        self.source = source
+        kwargs.setdefault('editable', False)
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs['source'] = self.source
+        if kwargs.get('editable') is False:
+            del kwargs['editable']
+        return name, path, args, kwargs
+
+    def pre_save(self, model_instance, add):
+        value = getattr(model_instance, self.source)
+        weekday = None
+        if value is not None:
+            if settings.USE_TZ and timezone.is_aware(value):
+                value = timezone.localtime(value)
+            weekday = value.isoweekday()
+        setattr(model_instance, self.attname, weekday)
+        return weekday
+
+
+class TrackedFieldsMixin:
+    """
+    Запоминает значения полей в момент загрузки из БД (и после каждого save),
+    чтобы сигналы и остальной код могли узнать предыдущие значения без
+    повторного SELECT. Снимок хранится на самом экземпляре, поэтому
+    корректен для параллельных, вложенных и асинхронных сохранений.
+
+    QuerySet.update() и bulk_update() сигналов не отправляют и снимок не
+    обновляют - после них нужно вызвать reset_tracked_fields().
+    """
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {
+            name: value for name, value in zip(field_names, values)
+            if value is not models.DEFERRED
+        }
+        return instance
+
+    def _tracked_attname(self, field_name):
+        return self._meta.get_field(field_name).attname
+
+    def get_previous(self, field_name, default=None):
+        """
+        Значение поля на момент загрузки или последнего сохранения
+        """
+        loaded = getattr(self, '_loaded_values', {})
+        return loaded.get(self._tracked_attname(field_name), default)
+
+    def has_changed(self, field_name):
+        """
+        Изменилось ли поле; если исходное значение неизвестно (новый объект
+        или поле не загружалось), считаем, что изменилось
+        """
+        attname = self._tracked_attname(field_name)
+        if attname in self.get_deferred_fields():
+            # Поле не загружалось и не присваивалось
+            return False
+        loaded = getattr(self, '_loaded_values', {})
+        if self._state.adding or attname not in loaded:
+            return True
+        return loaded[attname] != getattr(self, attname)
+
+    @property
+    def changed_fields(self):
+        return {field.name for field in self._meta.concrete_fields if self.has_changed(field.name)}
+
+    def reset_tracked_fields(self, field_names=None):
+        """
+        Делает текущие значения полей исходными
+        """
+        deferred = self.get_deferred_fields()
+        if field_names is None:
+            fields = self._meta.concrete_fields
+        else:
+            fields = [self._meta.get_field(name) for name in field_names]
+        loaded = self.__dict__.setdefault('_loaded_values', {})
+        for field in fields:
+            if field.concrete and field.attname not in deferred:
+                loaded[field.attname] = getattr(self, field.attname)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Сигналы post_save уже отработали и видели старые значения
+        self.reset_tracked_fields(kwargs.get('update_fields'))
+
+    def refresh_from_db(self, *args, **kwargs):
+        super().refresh_from_db(*args, **kwargs)
+        fields = kwargs.get('fields', args[1] if len(args) > 1 else None)
+        self.reset_tracked_fields(fields)
+
+
 # Менеджер для мягкого удаления
+def related_ordering(model):
+    """
+    Порядок строк связи "многие" в ответах: ordering модели, а без него - pk,
+    чтобы prefetch_related и быстрый путь (fastpath.py) не зависели от того,
+    в каком порядке строки вернула БД
+    """
+    return model._meta.ordering or (model._meta.pk.name,)
+
+
 class ActiveCategoryManager(models.Manager):
     def get_queryset(self):
         return super().get_queryset().filter(is_deleted=False)
 
 
+# Value(False) дает условие "is_deleted = false": для is_deleted=False Django
+# генерирует "NOT is_deleted", а по такому выражению индекс не используется
+NOT_DELETED = models.Value(False)
+
+
+class ActiveTaskManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=NOT_DELETED)
+
+
+class ActiveSubTaskManager(models.Manager):
+    # Подзадачи удаленной задачи не помечаются по отдельности, поэтому
+    # удаление задачи - один UPDATE, а фильтр учитывает и саму задачу
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=NOT_DELETED, task__is_deleted=NOT_DELETED)
+
+
+class SoftDeleteMixin:
+    """
+    delete() помечает запись удаленной; строки физически удаляет
+    manage.py purge_deleted. QuerySet.delete() по-прежнему удаляет сразу
+    """
+
+    def delete(self, *args, **kwargs):
+        self.is_deleted = True
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['is_deleted', 'deleted_at', 'updated_at'])
+
+    def hard_delete(self, *args, **kwargs):
+        return super().delete(*args, **kwargs)
+
+
 class Category(models.Model):
 
     name = models.CharField(max_length=200, unique=True)
@@ -39,9 +184,12 @@ class Category(models.Model):
         db_table = 'task_manager_category'
         verbose_name = 'Category'
         verbose_name_plural = 'Categories'
+        indexes = [
+            models.Index(fields=['is_deleted'], name='category_is_deleted_idx'),
+        ]
 
 
-class Task(models.Model):
+class Task(SoftDeleteMixin, TrackedFieldsMixin, models.Model):
 
     title = models.CharField(
         max_length=200,
@@ -61,6 +209,15 @@ class Task(models.Model):
     )
     deadline = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    created_weekday = WeekdayField(source='created_at')
+    # Меняется и при изменении подзадач и категорий задачи (см. touch_tasks),
+    # по нему строятся ETag и Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveTaskManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.title
@@ -71,9 +228,38 @@ class Task(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Task'
         verbose_name_plural = 'Tasks'
+        # is_deleted входит во все индексы выборок менеджера objects: частичных
+        # индексов (WHERE is_deleted = 0) в MySQL нет
+        indexes = [
+            # Ключ курсорной пагинации
+            models.Index(fields=['is_deleted', '-created_at', '-id'], name='task_active_created_id_idx'),
+            # Задачи пользователя (my_tasks)
+            models.Index(fields=['owner', 'is_deleted', '-created_at'], name='task_owner_active_created_idx'),
+            # Фильтры ?status= и ?deadline=
+            models.Index(fields=['status', 'is_deleted', 'deadline'], name='task_status_active_dl_idx'),
+            # Задачи по дню недели
+            models.Index(fields=['created_weekday', 'is_deleted', '-created_at'], name='task_weekday_active_idx'),
+            # Очистка удаленных (purge_deleted)
+            models.Index(fields=['is_deleted', 'deleted_at'], name='task_deleted_at_idx'),
+            # Условные GET для my_tasks: COUNT и MAX(updated_at) только по индексу
+            models.Index(fields=['owner', 'is_deleted', 'updated_at'], name='task_owner_active_upd_idx'),
+        ]
 
 
-class SubTask(models.Model):
+def touch_tasks(task_ids):
+    """
+    Обновляет updated_at задач, у которых изменились подзадачи или категории:
+    они входят в представление задачи. Одним UPDATE, без сигналов
+    """
+    if not isinstance(task_ids, models.QuerySet):
+        # QuerySet уходит в UPDATE подзапросом, остальное - списком id
+        task_ids = set(task_ids)
+        if not task_ids:
+            return
+    Task.all_objects.filter(pk__in=task_ids).update(updated_at=timezone.now())
+
+
+class SubTask(SoftDeleteMixin, TrackedFieldsMixin, models.Model):
 
     title = models.CharField(max_length=200, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -96,6 +282,12 @@ class SubTask(models.Model):
     )
     deadline = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    is_deleted = models.BooleanField(default=False)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ActiveSubTaskManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.title
@@ -105,4 +297,112 @@ class SubTask(models.Model):
         db_table = 'task_manager_subtask'
         ordering = ['-created_at']
         verbose_name = 'SubTask'
-        verbose_name_plural = 'SubTasks'
\ No newline at end of file
+        verbose_name_plural = 'SubTasks'
+        indexes = [
+            # Ключ курсорной пагинации
+            models.Index(fields=['is_deleted', '-created_at', '-id'], name='subtask_active_created_id_idx'),
+            # Подзадачи задачи (детальная страница задачи)
+            models.Index(fields=['task', 'is_deleted', '-created_at'], name='subtask_task_active_idx'),
+            # Очистка удаленных (purge_deleted)
+            models.Index(fields=['is_deleted', 'deleted_at'], name='subtask_deleted_at_idx'),
+        ]
+
+
+class OutboxStatus(models.TextChoices):
+    PENDING = 'pending', 'Pending'
+    SENT = 'sent', 'Sent'
+    FAILED = 'failed', 'Failed'
+
+
+class EmailOutbox(models.Model):
+    """
+    Исходящие письма: пишутся в той же транзакции, что и изменение данных,
+    а отправляются фоновым воркером (manage.py send_outbox)
+    """
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    status = models.CharField(
+        max_length=10,
+        choices=OutboxStatus.choices,
+        default=OutboxStatus.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'{self.recipient}: {self.subject}'
+
+    class Meta:
+
+        db_table = 'task_manager_email_outbox'
+        verbose_name = 'Email outbox message'
+        verbose_name_plural = 'Email outbox'
+        indexes = [
+            # Выборка писем, которые пора отправлять
+            models.Index(fields=['status', 'next_attempt_at'], name='outbox_status_next_idx'),
+        ]
+
+
+class CategoryTaskCounter(models.Model):
+    """
+    Количество задач в категории. Поддерживается сигналами (см. counters.py),
+    расхождения исправляет manage.py reconcile_counters
+    """
+
+    category = models.OneToOneField(
+        Category,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='task_counter'
+    )
+    task_count = models.IntegerField(default=0)
+
+    class Meta:
+
+        db_table = 'task_manager_category_task_counter'
+
+
+class OwnerStatusTaskCounter(models.Model):
+    """
+    Количество задач пользователя в каждом статусе
+    """
+
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='task_status_counters'
+    )
+    status = models.CharField(max_length=20, choices=Status.choices)
+    task_count = models.IntegerField(default=0)
+
+    class Meta:
+
+        db_table = 'task_manager_owner_status_counter'
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'status'], name='owner_status_counter_unique'),
+        ]
+
+
+class TaskStatsSnapshot(models.Model):
+    """
+    Готовая статистика задач пользователя для /tasks/stats/. Пересчитывается
+    периодически командой manage.py refresh_task_stats
+    """
+
+    owner = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='task_stats_snapshot'
+    )
+    data = models.JSONField()
+    refreshed_at = models.DateTimeField()
+
+    class Meta:
+
+        db_table = 'task_manager_task_stats_snapshot'
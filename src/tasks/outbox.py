@@ -0,0 +1,111 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import EmailOutbox, OutboxStatus
+
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_email(recipient, subject, body):
+    """
+    Кладет письмо в outbox. Вызывается внутри транзакции, которая меняет данные,
+    поэтому письмо появится только если изменение зафиксировано.
+    """
+    return EmailOutbox.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+def claim_batch(batch_size, lease):
+    """
+    Забирает пачку писем, которые пора отправлять. Пока письмо в работе,
+    его next_attempt_at сдвигается на lease вперед, поэтому другие воркеры его
+    не возьмут, а если воркер упадет - письмо снова станет доступно.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        queryset = EmailOutbox.objects.filter(
+            status=OutboxStatus.PENDING, next_attempt_at__lte=now
+        ).order_by('next_attempt_at', 'id')
+        if connection.features.has_select_for_update_skip_locked:
+            queryset = queryset.select_for_update(skip_locked=True)
+        messages = list(queryset[:batch_size])
+        if messages:
+            ids = [message.id for message in messages]
+            EmailOutbox.objects.filter(id__in=ids).update(next_attempt_at=now + lease)
+    return messages
+
+
+def send_chunk(messages):
+    """
+    Отправляет письма через одно соединение с почтовым сервером.
+    Возвращает список пар (id письма, текст ошибки или None).
+    """
+    results = []
+    try:
+        with get_connection(fail_silently=False) as mail_connection:
+            for message in messages:
+                email = EmailMessage(
+                    message.subject,
+                    message.body,
+                    settings.DEFAULT_FROM_EMAIL,
+                    [message.recipient],
+                    connection=mail_connection,
+                )
+                try:
+                    email.send()
+                except Exception as exc:
+                    results.append((message.id, repr(exc)))
+                else:
+                    results.append((message.id, None))
+    except Exception as exc:
+        # Не удалось даже подключиться - ошибка у всех оставшихся писем
+        done = {message_id for message_id, _ in results}
+        results.extend((message.id, repr(exc)) for message in messages if message.id not in done)
+    return results
+
+
+def process_batch(batch_size=100, workers=4, max_attempts=5, retry_delay=60, lease=300):
+    """
+    Отправляет одну пачку писем пулом потоков и записывает результат.
+    Повторные попытки - с экспоненциальной задержкой, после max_attempts письмо
+    помечается как failed. Возвращает (отправлено, ошибок).
+    """
+    messages = claim_batch(batch_size, timedelta(seconds=lease))
+    if not messages:
+        return 0, 0
+
+    chunks = [messages[i::workers] for i in range(workers) if messages[i::workers]]
+    with ThreadPoolExecutor(max_workers=len(chunks)) as executor:
+        results = [result for chunk_results in executor.map(send_chunk, chunks) for result in chunk_results]
+
+    by_id = {message.id: message for message in messages}
+    now = timezone.now()
+    sent_ids = [message_id for message_id, error in results if error is None]
+    if sent_ids:
+        EmailOutbox.objects.filter(id__in=sent_ids).update(
+            status=OutboxStatus.SENT, sent_at=now, last_error='', attempts=F('attempts') + 1
+        )
+
+    failed = 0
+    for message_id, error in results:
+        if error is None:
+            continue
+        failed += 1
+        attempts = by_id[message_id].attempts + 1
+        update = {'attempts': attempts, 'last_error': error}
+        if attempts >= max_attempts:
+            update['status'] = OutboxStatus.FAILED
+        else:
+            update['next_attempt_at'] = now + timedelta(seconds=retry_delay * 2 ** (attempts - 1))
+        EmailOutbox.objects.filter(id=message_id).update(**update)
+        logger.warning('Email %s to %s failed (attempt %s): %s',
+                       message_id, by_id[message_id].recipient, attempts, error)
+
+    return len(sent_ids), failed
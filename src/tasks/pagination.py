@@ -1,6 +1,154 @@
-from rest_framework.pagination import CursorPagination, PageNumberPagination
+from datetime import datetime
 
-class StandardResultsSetPagination(PageNumberPagination):
+from django.core.paginator import InvalidPage
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import Cursor, CursorPagination, PageNumberPagination
+
+
+async def afetch(queryset):
+    return [row async for row in queryset]
+
+
+def keyset_queryset(queryset, position=None, ascending=False):
+    """
+    queryset в порядке ключа (created_at, id) - по убыванию или по возрастанию -
+    начиная сразу после позиции position = (created_at, id)
+    """
+    if ascending:
+        queryset = queryset.order_by('created_at', 'id')
+    else:
+        queryset = queryset.order_by('-created_at', '-id')
+    if position is None:
+        return queryset
+
+    created_at, pk = position
+    # Условие по created_at вынесено отдельно, чтобы СУБД могла
+    # использовать диапазон по индексу, а id разрешает совпадения
+    if ascending:
+        return queryset.filter(created_at__gte=created_at).filter(Q(created_at__gt=created_at) | Q(id__gt=pk))
+    return queryset.filter(created_at__lte=created_at).filter(Q(created_at__lt=created_at) | Q(id__lt=pk))
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """
+    PageNumberPagination, которую можно вызывать из async-вьюх:
+    apaginate_queryset считает записи через acount() и читает страницу
+    через async for. Ответ тот же, что у paginate_queryset
+    """
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        paginator = self.django_paginator_class(queryset, page_size)
+        # count у Paginator - cached_property: подставленное значение не пересчитывается
+        paginator.count = await queryset.acount()
+        page_number = self.get_page_number(request, paginator)
+        try:
+            number = paginator.validate_number(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        bottom = (number - 1) * paginator.per_page
+        rows = await afetch(queryset[bottom:bottom + paginator.per_page])
+        self.page = paginator._get_page(rows, number, paginator)
+
+        if paginator.num_pages > 1 and self.template is not None:
+            self.display_page_controls = True
+        return list(self.page)
+
+
+class StandardResultsSetPagination(AsyncPageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 50
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Курсорная (keyset) пагинация по паре (created_at, id).
+
+    Позиция в курсоре - это значения ключа последней записи страницы, поэтому
+    нет ни OFFSET, ни COUNT(*), а новые записи не сдвигают уже выданные страницы.
+    Опирается на составные индексы (created_at, id) у Task и SubTask.
+    """
+    page_size = 5
+    page_size_query_param = 'page_size'
+    max_page_size = 50
+    ordering = ('-created_at', '-id')
+    position_separator = '|'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        queryset = self.page_queryset(queryset, request)
+        if queryset is None:
+            return None
+        return self.set_page(await afetch(queryset))
+
+    def page_queryset(self, queryset, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = self.cursor.reverse if self.cursor else False
+        position = None
+        if self.cursor is not None and self.cursor.position is not None:
+            position = self.decode_position(self.cursor.position)
+        queryset = keyset_queryset(queryset, position, ascending=reverse)
+
+        # Берем на одну запись больше, чтобы узнать, есть ли следующая страница
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, results):
+        reverse = self.cursor.reverse if self.cursor else False
+        has_more = len(results) > self.page_size
+        self.page = results[:self.page_size]
+
+        if reverse:
+            self.page.reverse()
+            self.has_previous = has_more
+            self.has_next = self.cursor is not None
+        else:
+            self.has_next = has_more
+            self.has_previous = self.cursor is not None
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        position = self.encode_position(self.page[-1])
+        return self.encode_cursor(Cursor(offset=0, reverse=False, position=position))
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        position = self.encode_position(self.page[0])
+        return self.encode_cursor(Cursor(offset=0, reverse=True, position=position))
+
+    def encode_position(self, instance):
+        if isinstance(instance, dict):
+            created_at, pk = instance['created_at'], instance['id']
+        else:
+            created_at, pk = instance.created_at, instance.pk
+        return f'{created_at.isoformat()}{self.position_separator}{pk}'
+
+    def decode_position(self, position):
+        try:
+            created_at, pk = position.rsplit(self.position_separator, 1)
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
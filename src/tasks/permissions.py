@@ -10,4 +10,5 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        return obj.owner == request.user
\ No newline at end of file
+        # Сравниваем по id, чтобы не подгружать владельца отдельным запросом
+        return obj.owner_id == request.user.pk
\ No newline at end of file
@@ -0,0 +1,237 @@
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+
+# Границы гистограммы времени ответа, сек
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+_in_list_re = re.compile(r'\bIN \((?:%s|\?)(?:, (?:%s|\?))*\)', re.IGNORECASE)
+_number_re = re.compile(r'\b\d+\b')
+_string_re = re.compile(r"'(?:[^']|'')*'")
+_space_re = re.compile(r'\s+')
+
+
+def fingerprint(sql):
+    """
+    Нормализованный текст запроса: параметры, числа, строки и списки IN
+    заменяются на ?, чтобы одинаковые по форме запросы совпадали
+    """
+    sql = _string_re.sub('?', sql)
+    sql = _number_re.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    sql = _in_list_re.sub('IN (...)', sql)
+    return _space_re.sub(' ', sql).strip()
+
+
+class RequestProfile:
+    """
+    Замеры одного запроса: вызывается как execute_wrapper соединения и
+    считает запросы, их время и повторы по отпечаткам SQL
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.fingerprints = Counter()
+        self.view_started = None
+        self.view_db_time = 0.0
+        self.view_python_time = 0.0
+        self.render_time = 0.0
+
+    def start_view(self, now):
+        self.view_started = now
+        self.view_db_time = self.db_time
+
+    def finish_view(self, now):
+        # Время вьюхи без SQL; считается один раз - при возврате ответа из вьюхи
+        if self.view_started is not None:
+            self.view_python_time = (now - self.view_started) - (self.db_time - self.view_db_time)
+            self.view_started = None
+        return now
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.fingerprints[sql] += 1
+
+    def capture(self):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(self))
+        return stack
+
+    def duplicates(self):
+        # Повторы считаются по нормализованному SQL, а нормализуются только
+        # запросы, выполненные больше одного раза по исходному тексту
+        counts = Counter()
+        for sql, count in self.fingerprints.items():
+            counts[fingerprint(sql)] += count
+        return {sql: count for sql, count in counts.items() if count > 1}
+
+
+class EndpointStats:
+
+    max_fingerprints = 50
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.sampled = 0
+        self.queries = 0
+        self.max_queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.duplicate_queries = 0
+        self.duplicates = Counter()
+
+    def add_request(self, elapsed, status_code):
+        self.requests += 1
+        if status_code >= 500:
+            self.errors += 1
+        self.total_time += elapsed
+        self.max_time = max(self.max_time, elapsed)
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.buckets[index] += 1
+
+    def add_profile(self, profile, serialize_time):
+        self.sampled += 1
+        self.queries += profile.queries
+        self.max_queries = max(self.max_queries, profile.queries)
+        self.db_time += profile.db_time
+        self.serialize_time += serialize_time
+        for sql, count in profile.duplicates().items():
+            # Лишние выполнения: первое не считается
+            self.duplicate_queries += count - 1
+            self.duplicates[sql] += count - 1
+        if len(self.duplicates) > self.max_fingerprints * 2:
+            self.duplicates = Counter(dict(self.duplicates.most_common(self.max_fingerprints)))
+
+    def as_dict(self, top=10):
+        sampled = self.sampled or 1
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'avg_time_ms': round(self.total_time / (self.requests or 1) * 1000, 3),
+            'max_time_ms': round(self.max_time * 1000, 3),
+            'sampled': self.sampled,
+            'avg_queries': round(self.queries / sampled, 2),
+            'max_queries': self.max_queries,
+            'avg_db_time_ms': round(self.db_time / sampled * 1000, 3),
+            'avg_serialize_time_ms': round(self.serialize_time / sampled * 1000, 3),
+            'duplicate_queries': self.duplicate_queries,
+            'top_duplicates': [
+                {'sql': sql, 'count': count} for sql, count in self.duplicates.most_common(top)
+            ],
+        }
+
+
+class ProfileStore:
+    """
+    Агрегаты по имени маршрута в памяти процесса. У каждого воркера
+    свои цифры - Prometheus собирает их с каждого процесса отдельно
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._endpoints = {}
+        self.started_at = timezone.now()
+
+    def record(self, endpoint, elapsed, status_code, profile=None, serialize_time=0.0):
+        with self._lock:
+            stats = self._endpoints.get(endpoint)
+            if stats is None:
+                stats = self._endpoints[endpoint] = EndpointStats()
+            stats.add_request(elapsed, status_code)
+            if profile is not None:
+                stats.add_profile(profile, serialize_time)
+
+    def snapshot(self, top=10):
+        with self._lock:
+            return {endpoint: stats.as_dict(top) for endpoint, stats in sorted(self._endpoints.items())}
+
+    def totals(self):
+        # (число профилированных запросов, число SQL в них) по всем маршрутам
+        with self._lock:
+            stats = self._endpoints.values()
+            return sum(item.sampled for item in stats), sum(item.queries for item in stats)
+
+    def reset(self):
+        with self._lock:
+            self._endpoints.clear()
+            self.started_at = timezone.now()
+
+    def prometheus(self):
+        """
+        Текст в формате экспозиции Prometheus (text/plain; version=0.0.4)
+        """
+        lines = []
+
+        def metric(name, kind, help_text):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            endpoints = sorted(self._endpoints.items())
+            metric('tasks_http_requests_total', 'counter', 'Requests by URL name')
+            for endpoint, stats in endpoints:
+                lines.append(f'tasks_http_requests_total{{endpoint="{endpoint}"}} {stats.requests}')
+            metric('tasks_http_errors_total', 'counter', 'Responses with status >= 500')
+            for endpoint, stats in endpoints:
+                lines.append(f'tasks_http_errors_total{{endpoint="{endpoint}"}} {stats.errors}')
+            metric('tasks_http_request_duration_seconds', 'histogram', 'Request latency')
+            for endpoint, stats in endpoints:
+                for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                    lines.append(
+                        f'tasks_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}'
+                    )
+                lines.append(
+                    f'tasks_http_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {stats.requests}'
+                )
+                lines.append(f'tasks_http_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats.total_time:.6f}')
+                lines.append(f'tasks_http_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats.requests}')
+            for name, attr, help_text in (
+                ('tasks_profiled_requests_total', 'sampled', 'Requests sampled for DB profiling'),
+                ('tasks_db_queries_total', 'queries', 'SQL queries in sampled requests'),
+                ('tasks_db_duplicate_queries_total', 'duplicate_queries',
+                 'Repeated executions of the same SQL fingerprint in sampled requests'),
+            ):
+                metric(name, 'counter', help_text)
+                for endpoint, stats in endpoints:
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {getattr(stats, attr)}')
+            for name, attr, help_text in (
+                ('tasks_db_time_seconds_total', 'db_time', 'SQL time in sampled requests'),
+                ('tasks_serialize_time_seconds_total', 'serialize_time',
+                 'Python time in views outside SQL plus rendering, sampled requests'),
+            ):
+                metric(name, 'counter', help_text)
+                for endpoint, stats in endpoints:
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} {getattr(stats, attr):.6f}')
+        return '\n'.join(lines) + '\n'
+
+
+_store = ProfileStore()
+
+
+def get_profile_store():
+    return _store
+
+
+def should_sample():
+    rate = getattr(settings, 'TASKS_PROFILING_SAMPLE_RATE', 0)
+    return rate >= 1 or (rate > 0 and random.random() < rate)
@@ -0,0 +1,351 @@
+import logging
+import math
+import re
+import threading
+from bisect import bisect_left
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connection, connections
+from django.db.models import BooleanField, Case, F, FloatField, Func, IntegerField, Value, When
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+from .models import Task, SubTask
+
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Поля, по которым ищем, и их вес в ранжировании
+SEARCH_FIELDS = {
+    Task: {'title': 2.0, 'description': 1.0},
+    SubTask: {'title': 2.0, 'description': 1.0},
+}
+
+
+def tokenize(text):
+    if not text:
+        return []
+    return [token.lower() for token in TOKEN_RE.findall(text)]
+
+
+class BaseSearchBackend:
+    """
+    Интерфейс поискового бэкенда: отбирает и ранжирует записи queryset по запросу
+    и при необходимости поддерживает свой индекс в актуальном состоянии
+    """
+
+    def search(self, queryset, query):
+        """
+        Отфильтрованный и отсортированный по релевантности queryset
+        или None, если индекс еще не готов (тогда ищет обычный SearchFilter)
+        """
+        raise NotImplementedError
+
+    def index_instance(self, instance):
+        pass
+
+    def remove_instance(self, instance):
+        pass
+
+    def reset(self):
+        pass
+
+
+class MatchAgainst(Func):
+    """
+    MATCH (col, ...) AGAINST (query IN BOOLEAN MODE) для MySQL FULLTEXT-индексов
+    """
+
+    def __init__(self, *columns, query, output_field):
+        super().__init__(*[F(column) for column in columns], Value(query), output_field=output_field)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        *columns, query = self.get_source_expressions()
+        column_sqls, params = [], []
+        for column in columns:
+            sql, column_params = compiler.compile(column)
+            column_sqls.append(sql)
+            params.extend(column_params)
+        query_sql, query_params = compiler.compile(query)
+        return f"MATCH ({', '.join(column_sqls)}) AGAINST ({query_sql} IN BOOLEAN MODE)", params + query_params
+
+
+class InlineIn(Func):
+    """
+    column IN (1, 2, ...) с целыми числами прямо в тексте SQL: список id
+    из индекса может быть длиннее лимита параметров запроса SQLite
+    """
+
+    def __init__(self, column, values):
+        super().__init__(F(column), output_field=BooleanField())
+        self.values = [int(value) for value in values]
+
+    def as_sql(self, compiler, connection, **extra_context):
+        column_sql, params = compiler.compile(self.get_source_expressions()[0])
+        return f"{column_sql} IN ({', '.join(map(str, self.values))})", params
+
+
+class MySQLFullTextBackend(BaseSearchBackend):
+    """
+    Поиск через FULLTEXT-индексы MySQL (см. миграцию с индексами *_fulltext_idx).
+    Каждое слово запроса обязательно и ищется по префиксу: "+слово*".
+    """
+
+    def build_query(self, query):
+        return ' '.join(f'+{token}*' for token in tokenize(query))
+
+    def search(self, queryset, query):
+        boolean_query = self.build_query(query)
+        if not boolean_query:
+            return queryset.none()
+        columns = list(SEARCH_FIELDS[queryset.model])
+        return queryset.filter(
+            MatchAgainst(*columns, query=boolean_query, output_field=BooleanField())
+        ).annotate(
+            search_rank=MatchAgainst(*columns, query=boolean_query, output_field=FloatField())
+        ).order_by('-search_rank', *(queryset.query.order_by or queryset.model._meta.ordering))
+
+
+class InvertedIndex:
+    """
+    Инвертированный индекс одной модели: токен -> {pk: взвешенная частота}
+    """
+
+    def __init__(self, model, fields):
+        self.model = model
+        self.fields = fields
+        self.postings = defaultdict(dict)
+        self.documents = {}
+        self._sorted_tokens = None
+        self.built = False
+
+    def build(self):
+        queryset = self.model._default_manager.values_list('pk', *self.fields)
+        for pk, *values in queryset.iterator(chunk_size=2000):
+            self.add(pk, dict(zip(self.fields, values)))
+        self.built = True
+
+    def add(self, pk, values):
+        self.remove(pk)
+        weights = Counter()
+        for field, weight in self.fields.items():
+            for token in tokenize(values.get(field)):
+                weights[token] += weight
+        for token, weight in weights.items():
+            if token not in self.postings:
+                self._sorted_tokens = None
+            self.postings[token][pk] = weight
+        self.documents[pk] = weights
+
+    def remove(self, pk):
+        for token in self.documents.pop(pk, ()):
+            postings = self.postings[token]
+            postings.pop(pk, None)
+            if not postings:
+                del self.postings[token]
+                self._sorted_tokens = None
+
+    def expand_prefix(self, prefix):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self.postings)
+        tokens = self._sorted_tokens
+        position = bisect_left(tokens, prefix)
+        while position < len(tokens) and tokens[position].startswith(prefix):
+            yield tokens[position]
+            position += 1
+
+    def search(self, terms):
+        # Все слова обязательны, каждое ищется по префиксу; ранг - сумма tf * idf
+        total = len(self.documents) or 1
+        scores = None
+        for term in terms:
+            term_scores = defaultdict(float)
+            for token in self.expand_prefix(term):
+                postings = self.postings[token]
+                idf = math.log(1 + total / len(postings))
+                for pk, weight in postings.items():
+                    term_scores[pk] += weight * idf
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {pk: score + term_scores[pk] for pk, score in scores.items() if pk in term_scores}
+            if not scores:
+                return []
+        return sorted(scores, key=lambda pk: (-scores[pk], -pk))
+
+
+class InMemorySearchBackend(BaseSearchBackend):
+    """
+    Инвертированный индекс в памяти процесса - для SQLite и тестов.
+    Индекс строится в фоновом потоке при первом поиске (или заранее через
+    build_indexes()); пока он не готов, search() возвращает None и работает
+    обычный поиск LIKE. Дальше индекс обновляется из сигналов post_save/post_delete,
+    изменения во время построения перечитываются после него. С SQLite в памяти
+    или TASKS_SEARCH_INDEX_BACKGROUND = False индекс строится сразу в потоке запроса.
+    Индекс свой у каждого процесса, поэтому для нескольких воркеров нужен MySQL-бэкенд.
+
+    В результат попадают все найденные записи; по релевантности упорядочены
+    первые ranked_results из них, остальные идут за ними в порядке queryset
+    """
+    ranked_results = 200
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._indexes = {}
+        # Модели, индекс которых строится, -> id записей, измененных за это время
+        self._dirty = {}
+        self._generation = 0
+
+    def build_in_background(self):
+        if not getattr(settings, 'TASKS_SEARCH_INDEX_BACKGROUND', True):
+            return False
+        # Базу SQLite в памяти другой поток не видит
+        return not (connection.vendor == 'sqlite' and connection.is_in_memory_db())
+
+    def get_index(self, model):
+        with self._lock:
+            index = self._indexes.get(model)
+            if index is not None or model in self._dirty:
+                return index
+            self._dirty[model] = set()
+            generation = self._generation
+        if not self.build_in_background():
+            return self.build_index(model, generation)
+        threading.Thread(
+            target=self.build_index_in_thread, args=(model, generation),
+            name=f'search-index-{model._meta.model_name}', daemon=True,
+        ).start()
+        return None
+
+    def build_indexes(self):
+        for model in SEARCH_FIELDS:
+            with self._lock:
+                self._dirty.setdefault(model, set())
+                generation = self._generation
+            self.build_index(model, generation)
+
+    def build_index_in_thread(self, model, generation):
+        try:
+            self.build_index(model, generation)
+        except Exception:
+            logger.exception('Не удалось построить поисковый индекс %s', model._meta.label)
+            with self._lock:
+                if generation == self._generation:
+                    # Следующий поиск попробует снова
+                    self._dirty.pop(model, None)
+        finally:
+            connections.close_all()
+
+    def build_index(self, model, generation):
+        index = InvertedIndex(model, SEARCH_FIELDS[model])
+        index.build()
+        with self._lock:
+            if generation != self._generation:
+                # После reset() индекс строится заново
+                return None
+            dirty = list(self._dirty.pop(model, ()))
+            fields = list(index.fields)
+            for start in range(0, len(dirty), 500):
+                chunk = dirty[start:start + 500]
+                rows = model._default_manager.filter(pk__in=chunk).values_list('pk', *fields)
+                found = {pk: dict(zip(fields, values)) for pk, *values in rows}
+                for pk in chunk:
+                    if pk in found:
+                        index.add(pk, found[pk])
+                    else:
+                        index.remove(pk)
+            self._indexes[model] = index
+            return index
+
+    def search(self, queryset, query):
+        terms = tokenize(query)
+        if not terms:
+            return queryset.none()
+        index = self.get_index(queryset.model)
+        if index is None:
+            return None
+        with self._lock:
+            ranked = index.search(terms)
+        if not ranked:
+            return queryset.none()
+        rank = Case(
+            *[When(pk=pk, then=Value(position)) for position, pk in enumerate(ranked[:self.ranked_results])],
+            default=Value(self.ranked_results),
+            output_field=IntegerField(),
+        )
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        return queryset.filter(InlineIn('pk', ranked)).annotate(search_rank=rank).order_by('search_rank', *ordering)
+
+    def index_instance(self, instance):
+        model = type(instance)
+        with self._lock:
+            if model in self._dirty:
+                # Индекс строится - запись перечитается после построения
+                self._dirty[model].add(instance.pk)
+                return
+            index = self._indexes.get(model)
+            if index is None:
+                # Индекс еще не строился - он прочитает запись сам при первом поиске
+                return
+            fields = list(index.fields)
+            if set(fields) & instance.get_deferred_fields():
+                values = model._base_manager.filter(pk=instance.pk).values(*fields).first() or {}
+            else:
+                values = {field: getattr(instance, field) for field in fields}
+            index.add(instance.pk, values)
+
+    def remove_instance(self, instance):
+        model = type(instance)
+        with self._lock:
+            if model in self._dirty:
+                self._dirty[model].add(instance.pk)
+            index = self._indexes.get(model)
+            if index is not None:
+                index.remove(instance.pk)
+
+    def reset(self):
+        with self._lock:
+            self._indexes.clear()
+            self._dirty.clear()
+            self._generation += 1
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_search_backend():
+    """
+    Бэкенд из настройки TASKS_SEARCH_BACKEND, по умолчанию - по типу СУБД
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                path = getattr(settings, 'TASKS_SEARCH_BACKEND', None)
+                if path:
+                    _backend = import_string(path)()
+                elif connection.vendor == 'mysql':
+                    _backend = MySQLFullTextBackend()
+                else:
+                    _backend = InMemorySearchBackend()
+    return _backend
+
+
+class FullTextSearchFilter(filters.SearchFilter):
+    """
+    Фильтр ?search= через полнотекстовый бэкенд вместо LIKE '%term%'
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '')
+        if not query.strip():
+            return queryset
+        results = get_search_backend().search(queryset, query)
+        if results is None:
+            # Индекс еще строится - обычный поиск LIKE по search_fields
+            return super().filter_queryset(request, queryset, view)
+        return results
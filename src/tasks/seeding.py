@@ -0,0 +1,271 @@
+import math
+import multiprocessing
+import random
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, transaction
+from django.utils import timezone
+
+from .bulk import bulk_create_with_ids
+from .cache import CATEGORY_CACHE_NAMESPACE, invalidate
+from .counters import reconcile
+from .models import Task, SubTask, Category, Status
+from .search import get_search_backend
+
+
+# --- реалистичный набор для нагрузочных проверок (manage.py seed) ---
+
+# Доли статусов у задач, еще не выполненных к текущему моменту
+OPEN_STATUS_WEIGHTS = {
+    Status.NEW: 40,
+    Status.IN_PROGRESS: 35,
+    Status.PENDING: 15,
+    Status.BLOCKED: 10,
+}
+# Сколько категорий у задачи: 0, 1, 2, 3, 4
+CATEGORIES_PER_TASK_WEIGHTS = (10, 40, 30, 15, 5)
+
+VERBS = (
+    'Prepare', 'Review', 'Fix', 'Update', 'Write', 'Plan', 'Test', 'Deploy', 'Refactor', 'Discuss',
+    'Migrate', 'Document', 'Design', 'Check', 'Clean up', 'Optimize', 'Schedule', 'Approve',
+)
+NOUNS = (
+    'report', 'presentation', 'invoice', 'release', 'database', 'meeting', 'budget', 'contract',
+    'dashboard', 'backlog', 'API', 'newsletter', 'roadmap', 'onboarding', 'deployment', 'survey',
+    'migration', 'search', 'billing', 'analytics', 'checklist', 'campaign', 'server', 'website',
+)
+WORDS = NOUNS + (
+    'customer', 'team', 'quarter', 'draft', 'final', 'version', 'feedback', 'data', 'process',
+    'issue', 'deadline', 'review', 'notes', 'summary', 'client', 'request', 'priority', 'update',
+)
+CATEGORY_NAMES = (
+    'Work', 'Personal', 'Urgent', 'Finance', 'Marketing', 'Development', 'Design', 'Support',
+    'Sales', 'Research', 'HR', 'Operations', 'Legal', 'Infrastructure', 'Education', 'Health',
+)
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Отключает auto_now/auto_now_add у полей моделей, чтобы bulk_create
+    записал заданные даты. Меняет поля на уровне процесса - только для
+    команд генерации данных, не для обработки запросов
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def zipf_cum_weights(count, exponent=1.0):
+    # Накопленные веса для rng.choices: несколько популярных значений и длинный хвост
+    total, cum_weights = 0.0, []
+    for rank in range(count):
+        total += 1 / (rank + 1) ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+def poisson(rng, mean):
+    # Алгоритм Кнута; средние здесь небольшие
+    limit, k, p = math.exp(-mean), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+class SeedConfig:
+    """
+    Параметры генерации. Одинаковые параметры, seed и now дают одинаковые данные:
+    у каждой пачки задач свой генератор, зависящий только от seed и номера
+    пачки, поэтому результат не зависит от числа процессов (кроме порядка id).
+    Даты отсчитываются от now, по умолчанию - от начала текущих суток, поэтому
+    для повторяемого набора now нужно передать явно (manage.py seed --now)
+    """
+
+    def __init__(self, users=100, categories=40, tasks=10000, subtasks_mean=3.0, deleted_categories=0.1,
+                 deleted_tasks=0.02, days=365, seed=0, prefix='seed', batch_size=1000, chunk_size=10000, now=None):
+        self.users = users
+        self.categories = categories
+        self.tasks = tasks
+        self.subtasks_mean = subtasks_mean
+        self.deleted_categories = deleted_categories
+        self.deleted_tasks = deleted_tasks
+        self.days = days
+        self.seed = seed
+        self.prefix = prefix
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.now = now or timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def rng(self, *parts):
+        return random.Random(':'.join(map(str, (self.seed, self.prefix, *parts))))
+
+    def chunks(self):
+        for index, start in enumerate(range(0, self.tasks, self.chunk_size)):
+            yield index, start, min(start + self.chunk_size, self.tasks)
+
+
+def seed_users_and_categories(config):
+    """
+    Пользователи и категории (часть категорий мягко удалена).
+    Возвращает (id пользователей, id категорий) в порядке популярности
+    """
+    rng = config.rng('base')
+    password = make_password(None)
+    users = []
+    for i in range(config.users):
+        username = f'{config.prefix}_user_{i}'
+        users.append(User(
+            username=username, email=f'{username}@example.com', password=password,
+            date_joined=config.now - timedelta(days=config.days + rng.randint(0, 365)),
+        ))
+    owners = bulk_create_with_ids(User, users, config.batch_size, key='username')
+
+    categories = []
+    for i in range(config.categories):
+        deleted = rng.random() < config.deleted_categories
+        categories.append(Category(
+            name=f'{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]} {config.prefix} {i}',
+            is_deleted=deleted,
+            deleted_at=config.now - timedelta(days=rng.uniform(0, config.days)) if deleted else None,
+        ))
+    categories = bulk_create_with_ids(Category, categories, config.batch_size, key='name')
+    return [owner.pk for owner in owners], [category.pk for category in categories]
+
+
+def build_task_chunk(config, index, start, stop, owner_ids, category_ids):
+    rng = config.rng('tasks', index)
+    owner_weights = zipf_cum_weights(len(owner_ids), 0.8)
+    category_weights = zipf_cum_weights(len(category_ids), 1.1)
+    statuses, status_weights = zip(*OPEN_STATUS_WEIGHTS.items())
+    tasks, links, subtasks = [], [], []
+
+    for i in range(start, stop):
+        # Свежих задач больше, по выходным их создают реже
+        age = min(rng.expovariate(3 / config.days), config.days)
+        created_at = config.now - timedelta(days=age)
+        if created_at.weekday() >= 5 and rng.random() < 0.7:
+            created_at -= timedelta(days=created_at.weekday() - rng.randint(0, 4))
+        updated_at = min(created_at + timedelta(days=rng.uniform(0, min(age, 30))), config.now)
+        # Чем старше задача, тем вероятнее, что она выполнена
+        done = rng.random() < 0.15 + 0.75 * age / config.days
+        status = Status.DONE if done else rng.choices(statuses, status_weights)[0]
+        deadline = None if rng.random() < 0.2 else created_at + timedelta(days=rng.randint(1, 60))
+        deleted = rng.random() < config.deleted_tasks
+        task = Task(
+            title=f'{rng.choice(VERBS)} {rng.choice(NOUNS)} #{config.prefix}-{i}',
+            description=' '.join(rng.choices(WORDS, k=rng.randint(0, 40))).capitalize(),
+            owner_id=rng.choices(owner_ids, cum_weights=owner_weights)[0],
+            status=status,
+            deadline=deadline,
+            created_at=created_at,
+            updated_at=updated_at,
+            is_deleted=deleted,
+            deleted_at=updated_at if deleted else None,
+        )
+        count = rng.choices(range(len(CATEGORIES_PER_TASK_WEIGHTS)), CATEGORIES_PER_TASK_WEIGHTS)[0]
+        task_categories = set(rng.choices(category_ids, cum_weights=category_weights, k=count))
+        tasks.append((task, sorted(task_categories)))
+
+        for j in range(poisson(rng, config.subtasks_mean)):
+            subtask_created = min(created_at + timedelta(hours=rng.uniform(0, 72)), updated_at)
+            subtasks.append((len(tasks) - 1, SubTask(
+                title=f'{task.title} / {rng.choice(VERBS).lower()} {rng.choice(WORDS)} {j}',
+                description=' '.join(rng.choices(WORDS, k=rng.randint(0, 15))).capitalize(),
+                # Подзадачи чаще у владельца задачи, иногда у коллег
+                owner_id=task.owner_id if rng.random() < 0.8 else rng.choices(owner_ids, cum_weights=owner_weights)[0],
+                status=Status.DONE if done else rng.choices(statuses, status_weights)[0],
+                deadline=deadline,
+                created_at=subtask_created,
+                updated_at=subtask_created,
+            )))
+    return tasks, subtasks
+
+
+def seed_task_chunk(config, index, start, stop, owner_ids, category_ids):
+    """
+    Генерирует и вставляет задачи [start, stop) с категориями и подзадачами
+    в одной транзакции. Может выполняться в отдельном процессе
+    """
+    tasks, subtasks = build_task_chunk(config, index, start, stop, owner_ids, category_ids)
+    through = Task.categories.through
+    with explicit_timestamps(Task, SubTask), transaction.atomic():
+        created = bulk_create_with_ids(Task, [task for task, _ in tasks], config.batch_size)
+        links = [
+            through(task_id=task.pk, category_id=category_id)
+            for task, (_, task_categories) in zip(created, tasks)
+            for category_id in task_categories
+        ]
+        through.objects.bulk_create(links, batch_size=config.batch_size)
+        for task_index, subtask in subtasks:
+            subtask.task_id = created[task_index].pk
+        SubTask._base_manager.bulk_create([subtask for _, subtask in subtasks], batch_size=config.batch_size)
+    return {'tasks': len(tasks), 'links': len(links), 'subtasks': len(subtasks)}
+
+
+def _init_seed_worker():
+    # Для способа запуска spawn; при fork Django уже настроен
+    django.setup()
+
+
+def _seed_task_chunk(args):
+    return seed_task_chunk(*args)
+
+
+def generate_dataset(config, workers=1, progress=None):
+    """
+    Генерирует набор по SeedConfig: пачки задач вставляются в этом процессе
+    или параллельно в workers процессах. Счетчики пересчитываются в конце
+    (reconcile), кэш категорий и поисковый индекс сбрасываются.
+    progress(counts) вызывается после каждой пачки
+    """
+    owner_ids, category_ids = seed_users_and_categories(config)
+    totals = Counter(users=len(owner_ids), categories=len(category_ids))
+    jobs = [(config, index, start, stop, owner_ids, category_ids) for index, start, stop in config.chunks()]
+
+    if workers > 1 and len(jobs) > 1:
+        # Соединения родителя не должны достаться дочерним процессам
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=_init_seed_worker) as pool:
+            for counts in pool.imap_unordered(_seed_task_chunk, jobs):
+                totals.update(counts)
+                if progress is not None:
+                    progress(totals)
+    else:
+        for job in jobs:
+            totals.update(seed_task_chunk(*job))
+            if progress is not None:
+                progress(totals)
+
+    reconcile()
+    invalidate(CATEGORY_CACHE_NAMESPACE)
+    get_search_backend().reset()
+    return dict(totals)
+
+
+def seed_dataset(users=5, categories=20, tasks=1000, subtasks_per_task=3, batch_size=1000, seed=0, prefix='seed'):
+    """
+    Небольшой набор для команд замеров (explain_views, bench_api, bench_serializers):
+    generate_dataset без мягко удаленных записей в одном процессе.
+    Возвращает словарь с количеством созданных записей
+    """
+    config = SeedConfig(
+        users=users, categories=categories, tasks=tasks, subtasks_mean=subtasks_per_task,
+        deleted_categories=0, deleted_tasks=0, seed=seed, prefix=prefix, batch_size=batch_size,
+    )
+    return generate_dataset(config)
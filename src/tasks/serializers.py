@@ -1,31 +1,237 @@
 from rest_framework import serializers
-from .models import Task, SubTask, Category
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.permissions import SAFE_METHODS
+from .models import Task, SubTask, Category, SoftDeleteMixin, related_ordering
 from django.utils import timezone
 from django.contrib.auth.models import User
 from django.contrib.auth.password_validation import validate_password
 from rest_framework.validators import UniqueValidator
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from .bulk import PreloadedPrimaryKeyRelatedField
+from .tokens import AcceleratedRefreshToken
 
 
-class SubTaskSerializer(serializers.ModelSerializer):
+# Служебные поля мягкого удаления в API не отдаются и не принимаются
+SOFT_DELETE_FIELDS = ('is_deleted', 'deleted_at')
+
+
+def unique_title_kwargs(model):
+    # Название уникально и среди мягко удаленных записей: валидатор по
+    # умолчанию смотрит в менеджер objects и пропустил бы дубль до БД
+    return {'title': {'validators': [UniqueValidator(queryset=model.all_objects.all())]}}
+
+
+class EagerLoadingMixin:
+    """
+    Миксин для сериализаторов: описывает, какие связи и поля модели
+    нужны для сериализации, чтобы вьюхи подгружали их заранее
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+    # Вложенные объекты, которые можно развернуть или свернуть до id
+    # через ?expand= (см. DynamicFieldsMixin): имя поля -> сериализатор
+    expandable_fields = {}
+    default_expand = ()
+    # Поля модели, нужные всегда, даже если их нет в ?fields=
+    required_model_fields = ()
+
+    @classmethod
+    def get_model_field_map(cls):
+        # Соответствие "поле сериализатора -> конкретное поле модели"
+        cached = cls.__dict__.get('_model_field_map')
+        if cached is not None:
+            return cached
+
+        model = cls.Meta.model
+        field_map = {}
+        for name, field in cls().fields.items():
+            if field.source == '*' or '.' in field.source:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                field_map[name] = model_field.name
+
+        cls._model_field_map = field_map
+        return field_map
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        # Без DynamicFieldsMixin сериализатор всегда отдает все поля
+        return None
+
+    @classmethod
+    def get_expanded_fields(cls, request):
+        return set(cls.default_expand)
+
+    @classmethod
+    def get_only_fields(cls, requested=None, expanded=()):
+        field_map = cls.get_model_field_map()
+        model = cls.Meta.model
+        names = {model._meta.pk.name, *cls.required_model_fields}
+        if issubclass(model, SoftDeleteMixin):
+            # is_deleted читают обработчики post_save (signals.py): без него
+            # каждое сохранение догружает поле отдельным SELECT
+            names.add('is_deleted')
+        for name, model_name in field_map.items():
+            if requested is not None and name not in requested:
+                continue
+            names.add(model_name)
+            if name in expanded and name in cls.expandable_fields:
+                # Развернутый внешний ключ читается через select_related
+                nested = cls.expandable_fields[name]
+                names.update(f'{model_name}__{related}' for related in nested.get_only_fields())
+        return tuple(sorted(names))
+
+    @classmethod
+    def get_related_queryset(cls, lookup):
+        # Явный порядок: у Category нет ordering, и без него порядок строк
+        # prefetch зависит от БД (тот же порядок у fastpath.ManyRelation)
+        related_model = cls.Meta.model._meta.get_field(lookup).related_model
+        return related_model._default_manager.order_by(*related_ordering(related_model))
+
+    @classmethod
+    def get_compact_prefetch(cls, lookup):
+        # Свернутая связь отдается списком id - остальные колонки не читаем
+        related_model = cls.Meta.model._meta.get_field(lookup).related_model
+        return Prefetch(lookup, queryset=cls.get_related_queryset(lookup).only(related_model._meta.pk.name))
+
+    @classmethod
+    def get_prefetch_related(cls, request=None):
+        return cls.prefetch_related_fields
+
+    @classmethod
+    def get_prefetch(cls, lookup, collapsed=()):
+        if not isinstance(lookup, str):
+            return lookup
+        if lookup in collapsed:
+            return cls.get_compact_prefetch(lookup)
+        return Prefetch(lookup, queryset=cls.get_related_queryset(lookup))
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, request=None):
+        requested = cls.get_requested_fields(request)
+        expanded = cls.get_expanded_fields(request)
+        collapsed = set(cls.expandable_fields) - expanded
+        field_map = cls.get_model_field_map()
+
+        def is_requested(lookup):
+            name = getattr(lookup, 'prefetch_through', lookup).split('__')[0]
+            return requested is None or name in requested
+
+        queryset = queryset.only(*cls.get_only_fields(requested, expanded))
+        select_related = [lookup for lookup in cls.select_related_fields if is_requested(lookup)]
+        select_related += [field_map[name] for name in expanded if name in field_map and is_requested(name)]
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        prefetch_related = [
+            cls.get_prefetch(lookup, collapsed) for lookup in cls.get_prefetch_related(request) if is_requested(lookup)
+        ]
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related)
+        return queryset
+
+
+class DynamicFieldsMixin:
+    """
+    Миксин для сериализаторов: позволяет клиенту выбрать поля ответа
+    через ?fields=id,title,status и развернуть вложенные объекты через
+    ?expand=categories (только для безопасных методов). Поля из
+    expandable_fields, не перечисленные в ?expand=, отдаются как id;
+    пустой ?expand= сворачивает все
+    """
+    fields_query_param = 'fields'
+    expand_query_param = 'expand'
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return None
+        value = request.query_params.get(cls.fields_query_param)
+        if not value:
+            return None
+        return {name.strip() for name in value.split(',') if name.strip()}
+
+    @classmethod
+    def get_expanded_fields(cls, request):
+        if request is None or request.method not in SAFE_METHODS:
+            return set(cls.default_expand)
+        value = request.query_params.get(cls.expand_query_param)
+        if value is None:
+            return set(cls.default_expand)
+        return {name.strip() for name in value.split(',')} & set(cls.expandable_fields)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        requested = self.get_requested_fields(request)
+        if requested is not None:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+        expanded = self.get_expanded_fields(request)
+        # Заменяем только поля, для которых запрос отличается от умолчания
+        for name in (expanded ^ set(self.default_expand)) & set(self.fields):
+            self.fields[name] = self.get_expandable_field(name, name in expanded)
+
+    def get_expandable_field(self, name, expand):
+        model_field = self.Meta.model._meta.get_field(name)
+        many = model_field.many_to_many or model_field.one_to_many
+        if expand:
+            return self.expandable_fields[name](many=many, read_only=True)
+        return serializers.PrimaryKeyRelatedField(many=many, read_only=True)
+
+
+class TaskBriefSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    Краткое представление задачи для ?expand=task в списке подзадач
+    """
+
+    class Meta:
+        model = Task
+        fields = ('id', 'title', 'status')
+
+
+class SubTaskSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
 
+    expandable_fields = {'task': TaskBriefSerializer}
+    # Ключ курсорной пагинации
+    required_model_fields = ('created_at',)
+
     class Meta:
         model = SubTask
-        fields = '__all__'
+        exclude = SOFT_DELETE_FIELDS
+        extra_kwargs = unique_title_kwargs(SubTask)
 
 
 class SubTaskCreateSerializer(serializers.ModelSerializer):
 
     created_at = serializers.DateTimeField(read_only=True)
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
+    task = PreloadedPrimaryKeyRelatedField(queryset=Task.objects.all())
 
     class Meta:
         model = SubTask
-        fields = '__all__'\
+        exclude = SOFT_DELETE_FIELDS
+        extra_kwargs = unique_title_kwargs(SubTask)
+
+
+class SubTaskBulkSerializer(SubTaskCreateSerializer):
+    """
+    Сериализатор элемента пакетной операции: уникальность названия
+    проверяет BulkWriter одним запросом на весь список
+    """
+
+    class Meta(SubTaskCreateSerializer.Meta):
+        extra_kwargs = {'title': {'validators': []}}
 
 
-class CategorySerializer(serializers.ModelSerializer):
+class CategorySerializer(EagerLoadingMixin, serializers.ModelSerializer):
 
     class Meta:
         model = Category
@@ -39,19 +245,26 @@ class CategorySerializer(serializers.ModelSerializer):
         return value
 
 
-class TaskSerializer(serializers.ModelSerializer):
+class TaskSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
 
     categories = CategorySerializer(many=True, read_only=True)
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
 
+    prefetch_related_fields = ('categories',)
+    expandable_fields = {'categories': CategorySerializer}
+    default_expand = ('categories',)
+    # Ключ курсорной пагинации
+    required_model_fields = ('created_at',)
+
     class Meta:
         model = Task
-        fields = '__all__'\
+        exclude = SOFT_DELETE_FIELDS
+        extra_kwargs = unique_title_kwargs(Task)
 
 
 class TaskCreateSerializer(serializers.ModelSerializer):
 
-    categories = serializers.PrimaryKeyRelatedField(
+    categories = PreloadedPrimaryKeyRelatedField(
         many=True,
         queryset=Category.objects.all(),
         allow_empty=True,
@@ -62,7 +275,8 @@ class TaskCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Task
-        fields = '__all__'
+        exclude = SOFT_DELETE_FIELDS
+        extra_kwargs = unique_title_kwargs(Task)
 
     def validate_deadline(self, value):
         # Проверка, что дата дедлайна не в прошлом
@@ -71,15 +285,81 @@ class TaskCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class TaskDetailSerializer(serializers.ModelSerializer):
+class TaskBulkSerializer(TaskCreateSerializer):
+    """
+    Сериализатор элемента пакетной операции: уникальность названия
+    проверяет BulkWriter одним запросом на весь список
+    """
+
+    class Meta(TaskCreateSerializer.Meta):
+        extra_kwargs = {'title': {'validators': []}}
+
+
+class TaskDetailSerializer(DynamicFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
 
     subtasks = SubTaskSerializer(many=True, read_only=True)
     categories = CategorySerializer(many=True, read_only=True)
     owner = serializers.PrimaryKeyRelatedField(read_only=True)
 
+    prefetch_related_fields = ('categories', 'subtasks')
+    expandable_fields = {'categories': CategorySerializer}
+    default_expand = ('categories',)
+    subtasks_limit_query_param = 'subtasks_limit'
+    limited_subtasks_attr = 'limited_subtasks'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get('request')
+        if 'subtasks' in self.fields and self.get_subtasks_limit(request) is not None:
+            # Срез в Prefetch работает только с to_attr, читаем подзадачи оттуда
+            self.fields['subtasks'] = SubTaskSerializer(
+                many=True, read_only=True, source=self.limited_subtasks_attr
+            )
+
+    @classmethod
+    def get_subtasks_limit(cls, request):
+        # ?subtasks_limit=N ограничивает число отдаваемых подзадач
+        value = request.query_params.get(cls.subtasks_limit_query_param) if request else None
+        if value in (None, ''):
+            return None
+        try:
+            limit = int(value)
+        except ValueError:
+            limit = -1
+        if limit < 0:
+            raise serializers.ValidationError(
+                {cls.subtasks_limit_query_param: "Должно быть неотрицательным целым числом"}
+            )
+        return limit
+
+    @classmethod
+    def get_prefetch_related(cls, request=None):
+        limit = cls.get_subtasks_limit(request)
+        if limit is None:
+            return cls.prefetch_related_fields
+        subtasks = SubTask.objects.order_by('-created_at', '-id')[:limit]
+        return ('categories', Prefetch('subtasks', queryset=subtasks, to_attr=cls.limited_subtasks_attr))
+
     class Meta:
         model = Task
-        fields = '__all__'
+        exclude = SOFT_DELETE_FIELDS
+        extra_kwargs = unique_title_kwargs(Task)
+
+
+class TaskExportSerializer(EagerLoadingMixin, serializers.ModelSerializer):
+    """
+    Задача со всеми подзадачами для потоковой выгрузки /tasks/export/
+    """
+
+    subtasks = SubTaskSerializer(many=True, read_only=True)
+    categories = CategorySerializer(many=True, read_only=True)
+    owner = serializers.PrimaryKeyRelatedField(read_only=True)
+
+    prefetch_related_fields = ('categories', 'subtasks')
+
+    class Meta:
+        model = Task
+        exclude = SOFT_DELETE_FIELDS
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -120,4 +400,18 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         )
         user.set_password(validated_data['password'])
         user.save()
-        return user
\ No newline at end of file
+        return user
+
+
+class AcceleratedTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    Обновление токенов с проверкой отзыва по индексу в памяти (см. tokens.py)
+    """
+    token_class = AcceleratedRefreshToken
+
+    def validate(self, attrs):
+        try:
+            return super().validate(attrs)
+        except User.DoesNotExist:
+            # Пользователь удален после выдачи токена - 401, а не 500
+            raise AuthenticationFailed(self.error_messages['no_active_account'], 'no_active_account')
@@ -1,27 +1,37 @@
-from django.db.models.signals import pre_save, post_save
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
+from django.contrib.auth import get_user_model
 from django.dispatch import receiver
-from django.core.mail import send_mail
-from .models import Task
-from django.conf import settings
-import threading
-
-# для безопасного хранения данных между сигналами в одном потоке
-_thread_locals = threading.local()
-
-@receiver(pre_save, sender=Task)
-def store_old_status(sender, instance, **kwargs):
-    """
-    Сохраняем старый статус задачи перед её сохранением
-    """
-    if instance.pk:
-        # Если объект существует в базе, получаем его старый статус
-        try:
-            old_instance = Task.objects.get(pk=instance.pk)
-            _thread_locals.old_status = old_instance.status
-        except Task.DoesNotExist:
-            _thread_locals.old_status = None
-    else:
-        _thread_locals.old_status = None
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken
+from .models import Task, SubTask, Category, touch_tasks
+from .cache import CATEGORY_CACHE_NAMESPACE, invalidate
+from .authentication import invalidate_user
+from .search import get_search_backend
+from .tokens import BLACKLIST_CACHE_NAMESPACE
+from .outbox import enqueue_email
+from .bulk import post_bulk_create, post_bulk_update, bulk_m2m_changed
+from .counters import TaskCategory, adjust_category_counts, adjust_owner_status_counts, category_ids_for_tasks
+
+
+def notify_status_change(task):
+    """
+    Ставит в outbox email-уведомление о смене статуса задачи
+    """
+    old_status = task.get_previous('status')
+    # Проверяем, что задача принадлежит кому-то
+    if task.owner and task.owner.email:
+        subject = f"The status of your task '{task.title}' has changed"
+        message = f"Hello, {task.owner.username}!\n\n" \
+                  f"The status of your task '{task.title}' has been updated.\n" \
+                  f"Previous status: {old_status}\n" \
+                  f"New status: {task.status}\n\n" \
+                  f"Best regards,\nThe Task Manager Team"
+
+        # Письмо уходит через outbox: запрос не ждет почтовый сервер,
+        # отправляет воркер manage.py send_outbox
+        enqueue_email(task.owner.email, subject, message)
 
 
 @receiver(post_save, sender=Task)
@@ -33,26 +43,253 @@ def task_status_changed(sender, instance, created, **kwargs):
     if created:
         return
 
-    # Получаем старый статус, который мы сохранили в pre_save
-    old_status = getattr(_thread_locals, 'old_status', None)
-
-    # Проверяем, изменился ли статус
-    if old_status != instance.status:
-        # Проверяем, что задача принадлежит кому-то
-        if instance.owner and instance.owner.email:
-            subject = f"The status of your task '{instance.title}' has changed"
-            message = f"Hello, {instance.owner.username}!\n\n" \
-                      f"The status of your task '{instance.title}' has been updated.\n" \
-                      f"Previous status: {old_status}\n" \
-                      f"New status: {instance.status}\n\n" \
-                      f"Best regards,\nThe Task Manager Team"
-
-            # Отправляем email-уведомление
-            send_mail(
-                subject,
-                message,
-                settings.DEFAULT_FROM_EMAIL,
-                [instance.owner.email],
-                fail_silently=False,
-            )
-            print(f"Email notification has been sent to user {instance.owner.username}")
\ No newline at end of file
+    # Старый статус берем из снимка полей, сделанного при загрузке задачи
+    if instance.has_changed('status'):
+        notify_status_change(instance)
+
+
+@receiver(post_bulk_update, sender=Task)
+def bulk_task_status_changed(sender, instances, fields, **kwargs):
+    if 'status' not in fields:
+        return
+    for task in instances:
+        if task.has_changed('status'):
+            notify_status_change(task)
+
+
+@receiver(post_save, sender=Task)
+@receiver(post_save, sender=SubTask)
+def update_search_index(sender, instance, **kwargs):
+    """
+    Инкрементально обновляет поисковый индекс после сохранения задачи/подзадачи
+    """
+    if instance.is_deleted:
+        get_search_backend().remove_instance(instance)
+    else:
+        get_search_backend().index_instance(instance)
+
+
+@receiver(post_delete, sender=Task)
+@receiver(post_delete, sender=SubTask)
+def remove_from_search_index(sender, instance, **kwargs):
+    get_search_backend().remove_instance(instance)
+
+
+@receiver(post_bulk_create, sender=Task)
+@receiver(post_bulk_create, sender=SubTask)
+@receiver(post_bulk_update, sender=Task)
+@receiver(post_bulk_update, sender=SubTask)
+def update_search_index_bulk(sender, instances, **kwargs):
+    # Сигнал отправляется внутри транзакции пачки: индекс в памяти
+    # обновляется, только если она зафиксирована
+    def index():
+        backend = get_search_backend()
+        for instance in instances:
+            backend.index_instance(instance)
+    transaction.on_commit(index)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_delete, sender=Task)
+def invalidate_category_cache(sender, **kwargs):
+    """
+    Сбрасывает кэш списка категорий и count_tasks. Мягкое удаление
+    категории идет через save(), удаление задачи меняет счетчики
+    """
+    invalidate(CATEGORY_CACHE_NAMESPACE)
+
+
+@receiver(post_save, sender=Task)
+def invalidate_category_cache_soft_delete(sender, instance, created, **kwargs):
+    if not created and was_deleted(instance) != instance.is_deleted:
+        invalidate(CATEGORY_CACHE_NAMESPACE)
+
+
+@receiver(m2m_changed, sender=Task.categories.through)
+def invalidate_category_cache_m2m(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidate(CATEGORY_CACHE_NAMESPACE)
+
+
+@receiver(post_bulk_create, sender=Task)
+@receiver(post_bulk_update, sender=Task)
+def invalidate_category_cache_bulk(sender, **kwargs):
+    # Пакетные операции пишут строки M2M напрямую, без m2m_changed
+    invalidate(CATEGORY_CACHE_NAMESPACE)
+
+
+def was_deleted(task):
+    # Задачи загружаются через менеджер objects, поэтому если is_deleted
+    # не загружалось (only()), задача была активной
+    return task.get_previous('is_deleted', False)
+
+
+def previous_owner_status(task):
+    owner_id, status = task.get_previous('owner'), task.get_previous('status')
+    if owner_id is None or status is None:
+        # Исходные значения неизвестны - расхождение исправит reconcile_counters
+        return None
+    return owner_id, status
+
+
+@receiver(post_save, sender=Task)
+def update_owner_status_counter(sender, instance, created, raw=False, **kwargs):
+    """
+    Счетчики задач пользователя по статусам и задач в категориях.
+    Мягко удаленные задачи не считаются
+    """
+    if raw:
+        return
+    if created:
+        if not instance.is_deleted:
+            adjust_owner_status_counts({(instance.owner_id, instance.status): 1})
+        return
+
+    deleted_before, deleted_now = was_deleted(instance), instance.is_deleted
+    if deleted_before != deleted_now:
+        # Удаление или восстановление: задача выпадает из счетчиков или возвращается
+        delta = -1 if deleted_now else 1
+        owner_status = (previous_owner_status(instance) if deleted_now else None) or (instance.owner_id, instance.status)
+        adjust_owner_status_counts({owner_status: delta})
+        categories = category_ids_for_tasks([instance.pk])
+        adjust_category_counts({pk: delta * count for pk, count in categories.items()})
+        return
+    if deleted_now or not (instance.has_changed('owner') or instance.has_changed('status')):
+        return
+    previous = previous_owner_status(instance)
+    current = (instance.owner_id, instance.status)
+    if previous is not None and previous != current:
+        adjust_owner_status_counts({previous: -1, current: 1})
+
+
+@receiver(pre_delete, sender=Task)
+def remember_task_categories(sender, instance, **kwargs):
+    # Строки M2M удаляются каскадно без m2m_changed, запоминаем категории заранее.
+    # Мягко удаленная задача из счетчиков уже вычтена
+    if not was_deleted(instance):
+        instance._counter_category_ids = category_ids_for_tasks([instance.pk])
+
+
+@receiver(post_delete, sender=Task)
+def update_counters_on_delete(sender, instance, **kwargs):
+    if was_deleted(instance):
+        return
+    owner_status = previous_owner_status(instance) or (instance.owner_id, instance.status)
+    adjust_owner_status_counts({owner_status: -1})
+    categories = getattr(instance, '_counter_category_ids', {})
+    adjust_category_counts({pk: -count for pk, count in categories.items()})
+
+
+@receiver(m2m_changed, sender=Task.categories.through)
+def update_category_counter_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Счетчик задач в категориях при изменении task.categories / category.tasks.
+    Удаляемые строки считаются до удаления: pk_set в remove может содержать
+    несвязанные объекты, а в clear он пустой
+    """
+    if action == 'post_add':
+        if reverse:
+            adjust_category_counts({instance.pk: len(pk_set)})
+        else:
+            adjust_category_counts(dict.fromkeys(pk_set, 1))
+    elif action in ('pre_remove', 'pre_clear'):
+        own, other = ('category_id', 'task_id') if reverse else ('task_id', 'category_id')
+        rows = TaskCategory.objects.filter(**{own: instance.pk})
+        if action == 'pre_remove':
+            rows = rows.filter(**{f'{other}__in': pk_set})
+        removed = Counter(rows.values_list('category_id', flat=True))
+        adjust_category_counts({pk: -count for pk, count in removed.items()})
+
+
+@receiver(post_bulk_create, sender=Task)
+def update_owner_status_counter_bulk_create(sender, instances, **kwargs):
+    adjust_owner_status_counts(Counter((task.owner_id, task.status) for task in instances))
+
+
+@receiver(post_bulk_update, sender=Task)
+def update_owner_status_counter_bulk_update(sender, instances, fields, **kwargs):
+    if not {'owner', 'status'} & set(fields):
+        return
+    deltas = Counter()
+    for task in instances:
+        previous = previous_owner_status(task)
+        current = (task.owner_id, task.status)
+        if previous is not None and previous != current:
+            deltas[previous] -= 1
+            deltas[current] += 1
+    adjust_owner_status_counts(deltas)
+
+
+@receiver(bulk_m2m_changed, sender=Task)
+def update_category_counter_bulk(sender, field, removed, added, **kwargs):
+    if field != 'categories':
+        return
+    deltas = Counter(category_id for _, category_id in added)
+    deltas.subtract(category_id for _, category_id in removed)
+    adjust_category_counts(deltas)
+
+
+@receiver(post_save, sender=SubTask)
+def touch_task_on_subtask_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Подзадачи входят в представление задачи, поэтому их изменение
+    (и мягкое удаление) обновляет updated_at задачи
+    """
+    if raw:
+        return
+    task_ids = [instance.task_id]
+    if not created and instance.has_changed('task'):
+        task_ids.append(instance.get_previous('task'))
+    touch_tasks(task_id for task_id in task_ids if task_id is not None)
+
+
+@receiver(post_delete, sender=SubTask)
+def touch_task_on_subtask_delete(sender, instance, **kwargs):
+    # Мягко удаленная подзадача уже обновила задачу при удалении
+    if not instance.is_deleted:
+        touch_tasks([instance.task_id])
+
+
+@receiver(post_bulk_create, sender=SubTask)
+@receiver(post_bulk_update, sender=SubTask)
+def touch_tasks_on_subtask_bulk(sender, instances, fields=(), **kwargs):
+    task_ids = {subtask.task_id for subtask in instances}
+    if 'task' in fields:
+        task_ids.update(subtask.get_previous('task') for subtask in instances)
+    touch_tasks(task_id for task_id in task_ids if task_id is not None)
+
+
+@receiver(m2m_changed, sender=Task.categories.through)
+def touch_tasks_on_categories_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            touch_tasks([instance.pk])
+    elif action in ('post_add', 'post_remove'):
+        touch_tasks(pk_set)
+    elif action == 'pre_clear':
+        touch_tasks(TaskCategory.objects.filter(category_id=instance.pk).values('task_id'))
+
+
+@receiver(post_save, sender=Category)
+@receiver(pre_delete, sender=Category)
+def touch_tasks_on_category_change(sender, instance, created=False, raw=False, **kwargs):
+    # Переименование и удаление категории меняют представление ее задач
+    if not created and not raw:
+        touch_tasks(TaskCategory.objects.filter(category_id=instance.pk).values('task_id'))
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_cached_user(sender, instance, **kwargs):
+    """
+    Сбрасывает пользователя в кэше аутентификации: смена пароля,
+    отключение и удаление должны действовать со следующего запроса
+    """
+    invalidate_user(instance)
+
+
+@receiver(post_save, sender=BlacklistedToken)
+def invalidate_blacklist_index(sender, **kwargs):
+    # Индексы отозванных токенов в других процессах дочитают БД после смены версии
+    invalidate(BLACKLIST_CACHE_NAMESPACE)
@@ -0,0 +1,100 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Task, SubTask, Status, TaskStatsSnapshot
+
+
+def completion_ratio(done, total):
+    return round(done / total, 4) if total else None
+
+
+def compute_task_stats(owner, now=None, tasks_limit=100):
+    """
+    Статистика задач пользователя: каждая метрика - один сгруппированный запрос.
+    tasks - доля выполненных подзадач по последним tasks_limit задачам с подзадачами
+    """
+    now = now or timezone.now()
+    tasks = Task.objects.filter(owner=owner).order_by()
+
+    by_status = dict.fromkeys(Status.values, 0)
+    overdue = 0
+    status_rows = tasks.values('status').annotate(
+        total=Count('id'),
+        overdue=Count('id', filter=Q(deadline__lt=now)),
+    )
+    for row in status_rows:
+        by_status[row['status']] = row['total']
+        if row['status'] != Status.DONE:
+            overdue += row['overdue']
+
+    by_weekday = dict.fromkeys(range(1, 8), 0)
+    for weekday, count in tasks.values('created_weekday').annotate(n=Count('id')).values_list('created_weekday', 'n'):
+        by_weekday[weekday] = count
+
+    subtasks = SubTask.objects.filter(task__owner=owner).aggregate(
+        total=Count('id'),
+        done=Count('id', filter=Q(status=Status.DONE)),
+    )
+
+    # Подсчет через связь не использует менеджер SubTask.objects
+    active_subtasks = Q(subtasks__is_deleted=False)
+    per_task = tasks.annotate(
+        subtasks_total=Count('subtasks', filter=active_subtasks),
+        subtasks_done=Count('subtasks', filter=active_subtasks & Q(subtasks__status=Status.DONE)),
+    ).filter(subtasks_total__gt=0).order_by('-created_at', '-id').values(
+        'id', 'title', 'subtasks_total', 'subtasks_done'
+    )[:tasks_limit]
+
+    return {
+        'total': sum(by_status.values()),
+        'by_status': by_status,
+        'overdue': overdue,
+        'by_weekday': [{'weekday': weekday, 'count': count} for weekday, count in by_weekday.items()],
+        'subtasks': {
+            'total': subtasks['total'],
+            'done': subtasks['done'],
+            'completion_ratio': completion_ratio(subtasks['done'], subtasks['total']),
+        },
+        'tasks': [
+            {**row, 'completion_ratio': completion_ratio(row['subtasks_done'], row['subtasks_total'])}
+            for row in per_task
+        ],
+    }
+
+
+def get_task_stats(owner, fresh=False, tasks_limit=None):
+    """
+    Статистика из снимка, если он есть и не старше TASKS_STATS_SNAPSHOT_MAX_AGE,
+    иначе считается на лету. Возвращает (данные, время расчета, источник)
+    """
+    default_limit = getattr(settings, 'TASKS_STATS_TASKS_LIMIT', 100)
+    if not fresh and tasks_limit in (None, default_limit):
+        max_age = timedelta(seconds=getattr(settings, 'TASKS_STATS_SNAPSHOT_MAX_AGE', 900))
+        snapshot = TaskStatsSnapshot.objects.filter(
+            owner=owner, refreshed_at__gte=timezone.now() - max_age
+        ).first()
+        if snapshot is not None:
+            return snapshot.data, snapshot.refreshed_at, 'snapshot'
+    now = timezone.now()
+    limit = default_limit if tasks_limit is None else tasks_limit
+    return compute_task_stats(owner, now=now, tasks_limit=limit), now, 'live'
+
+
+def refresh_snapshots(owners):
+    """
+    Пересчитывает снимки статистики для пользователей owners.
+    Возвращает количество обновленных снимков
+    """
+    tasks_limit = getattr(settings, 'TASKS_STATS_TASKS_LIMIT', 100)
+    refreshed = 0
+    for owner in owners:
+        now = timezone.now()
+        TaskStatsSnapshot.objects.update_or_create(
+            owner=owner,
+            defaults={'data': compute_task_stats(owner, now=now, tasks_limit=tasks_limit), 'refreshed_at': now},
+        )
+        refreshed += 1
+    return refreshed
@@ -1,3 +1,1466 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+from .models import (
+    Task, SubTask, Category, EmailOutbox, OutboxStatus, CategoryTaskCounter, OwnerStatusTaskCounter,
+    TaskStatsSnapshot,
+)
+from .outbox import enqueue_email, process_batch
+from .bulk import post_bulk_update
+from .search import InMemorySearchBackend, get_search_backend
+from .tokens import BLACKLIST_CACHE_NAMESPACE, AcceleratedRefreshToken, BlacklistIndex, get_blacklist_index
+from .authentication import get_user_cache, user_namespace
+from .counters import owner_status_counts, reconcile
+from .fastpath import FastJSONRenderer, ValuesSerializer
+from .logs import JSONFormatter, QueuedFileHandler, SamplingFilter
+from .seeding import SeedConfig, build_task_chunk, generate_dataset
+from .profiling import RequestProfile, fingerprint, get_profile_store
+from .cache import CATEGORY_CACHE_NAMESPACE, LRUCache, RedisBackend, bump_version, get_version, reset_cache
+
+
+class QueryCountTestMixin:
+    """
+    Общие данные для тестов: пользователь, категории и набор задач с подзадачами
+    """
+    tasks_count = 30
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='owner', email='owner@example.com', password='secret-pass-123')
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        for i in range(cls.tasks_count):
+            task = Task.objects.create(title=f'Task {i}', description='Description', owner=cls.user)
+            task.categories.set(cls.categories)
+            SubTask.objects.create(title=f'SubTask {i}', task=task, owner=cls.user)
+
+    def setUp(self):
+        reset_cache()
+        self.client.force_authenticate(user=self.user)
+
+    def assertConstantQueries(self, url, expected, page_sizes=(1, 5, 20, 50), **params):
+        # Количество запросов не должно зависеть от размера страницы
+        for page_size in page_sizes:
+            with self.subTest(page_size=page_size):
+                with self.assertNumQueries(expected):
+                    response = self.client.get(url, {'page_size': page_size, **params})
+                self.assertEqual(response.status_code, 200)
+
+
+class ListQueryCountTests(QueryCountTestMixin, APITestCase):
+
+    def test_task_list(self):
+        # COUNT + страница задач + категории одним запросом
+        self.assertConstantQueries(reverse('task-list-create'), 3)
+
+    def test_task_list_by_day(self):
+        self.assertConstantQueries(reverse('task-list-by-day'), 3)
+
+    def test_current_user_tasks(self):
+        # + состояние списка для ETag
+        self.assertConstantQueries(reverse('my-tasks'), 4)
+
+    def test_subtask_list(self):
+        self.assertConstantQueries(reverse('subtask-list-create'), 2)
+
+    def test_category_list(self):
+        self.assertConstantQueries(reverse('category-list'), 2)
+
+    def test_task_list_contains_categories(self):
+        response = self.client.get(reverse('task-list-create'), {'page_size': 50})
+        for item in response.data['results']:
+            self.assertEqual(len(item['categories']), len(self.categories))
+
+    def test_task_list_sparse_fields(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('task-list-create'), {'fields': 'id,title,status', 'page_size': 50})
+        self.assertEqual(set(response.data['results'][0]), {'id', 'title', 'status'})
+        # Без категорий: COUNT + страница, и description в SELECT не попадает
+        self.assertEqual(len(captured.captured_queries), 2)
+        self.assertNotIn('"description"', captured.captured_queries[1]['sql'])
+
+    def test_task_list_collapsed_categories(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('task-list-create'), {'fields': 'id,categories', 'expand': ''})
+        expected = sorted(category.id for category in self.categories)
+        self.assertEqual(sorted(response.data['results'][0]['categories']), expected)
+        self.assertNotIn('"name"', captured.captured_queries[-1]['sql'])
+
+    def test_subtask_list_expand_task(self):
+        self.assertConstantQueries(reverse('subtask-list-create'), 2, expand='task')
+        response = self.client.get(reverse('subtask-list-create'), {'fields': 'title,task', 'expand': 'task'})
+        item = response.data['results'][0]
+        self.assertEqual(set(item), {'title', 'task'})
+        self.assertEqual(set(item['task']), {'id', 'title', 'status'})
+
+    def test_sparse_fields_with_cursor_pagination(self):
+        # created_at читается всегда: курсор строится без догрузки отложенного поля
+        url = reverse('my-tasks')
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'fields': 'id', 'pagination': 'cursor'})
+        with self.assertNumQueries(2):
+            self.client.get(response.data['next'])
+
+
+class TaskDetailQueryCountTests(QueryCountTestMixin, APITestCase):
+    tasks_count = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.task = Task.objects.get(title='Task 0')
+        for i in range(20):
+            SubTask.objects.create(title=f'Extra {i}', task=cls.task, owner=cls.user)
+        cls.url = reverse('task-detail', kwargs={'id': cls.task.id})
+
+    def test_detail_constant_queries(self):
+        # updated_at для ETag + задача + категории + подзадачи
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.data['subtasks']), 21)
+        self.assertEqual(len(response.data['categories']), len(self.categories))
+
+    def test_fields_skip_relations(self):
+        with self.assertNumQueries(2):
+            response = self.client.get(self.url, {'fields': 'id,title'})
+        self.assertEqual(set(response.data), {'id', 'title'})
+
+    def test_subtasks_limit(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(self.url, {'subtasks_limit': 5})
+        self.assertEqual(len(response.data['subtasks']), 5)
+
+    def test_invalid_subtasks_limit(self):
+        response = self.client.get(self.url, {'subtasks_limit': 'abc'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_owner_update_without_owner_query(self):
+        # задача + категории + подзадачи, UPDATE в точке сохранения и повторное
+        # чтение связей для ответа; is_deleted для сигналов не догружается
+        with self.assertNumQueries(8):
+            response = self.client.patch(self.url, {'description': 'Updated'})
+        self.assertEqual(response.status_code, 200)
+        self.task.refresh_from_db()
+        self.assertEqual(self.task.description, 'Updated')
+
+
+class KeysetPaginationTests(QueryCountTestMixin, APITestCase):
+    tasks_count = 12
+
+    def walk(self, url, link_name='next', **params):
+        seen = []
+        response = self.client.get(url, {'pagination': 'cursor', 'page_size': 5, **params})
+        while True:
+            self.assertEqual(response.status_code, 200)
+            seen.extend(item['id'] for item in response.data['results'])
+            link = response.data[link_name]
+            if link is None:
+                return seen, response
+            response = self.client.get(link)
+
+    def test_walks_all_tasks_in_order(self):
+        seen, _ = self.walk(reverse('task-list-create'))
+        expected = list(Task.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_no_count_query(self):
+        # Страница задач + категории, без COUNT(*) по странице; у my_tasks
+        # есть COUNT задач пользователя по индексу - это состояние для ETag
+        self.assertConstantQueries(reverse('task-list-create'), 2, pagination='cursor')
+        self.assertConstantQueries(reverse('subtask-list-create'), 1, pagination='cursor')
+        self.assertConstantQueries(reverse('my-tasks'), 3, pagination='cursor')
+
+    def test_stable_under_inserts(self):
+        url = reverse('task-list-create')
+        first = self.client.get(url, {'pagination': 'cursor', 'page_size': 5})
+        Task.objects.create(title='Inserted later', owner=self.user)
+        second = self.client.get(first.data['next'])
+        first_ids = [item['id'] for item in first.data['results']]
+        second_ids = [item['id'] for item in second.data['results']]
+        expected = list(Task.objects.exclude(title='Inserted later')
+                        .order_by('-created_at', '-id').values_list('id', flat=True)[:10])
+        self.assertEqual(first_ids + second_ids, expected)
+
+    def test_previous_link(self):
+        url = reverse('subtask-list-create')
+        first = self.client.get(url, {'pagination': 'cursor', 'page_size': 5})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('task-list-create'), {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ExplainViewsCommandTests(TestCase):
+
+    def test_views_use_indexes(self):
+        out = StringIO()
+        call_command('explain_views', stdout=out)
+        self.assertIn('Все запросы используют индексы', out.getvalue())
+
+    def test_detects_full_scan(self):
+        from .management.commands.explain_views import explain_full_scans
+        sql = "SELECT id FROM task_manager_task WHERE description = 'x'"
+        self.assertEqual(explain_full_scans(sql), ['task_manager_task'])
+
+
+class CreatedWeekdayTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='owner', password='secret-pass-123')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def create_task(self, title, created_at):
+        task = Task.objects.create(title=title, owner=self.user)
+        task.created_at = created_at
+        task.save()
+        return task
+
+    def test_weekday_in_project_timezone(self):
+        # 2024-01-01 23:30 UTC - понедельник, но в Токио уже вторник
+        created_at = datetime(2024, 1, 1, 23, 30, tzinfo=dt_timezone.utc)
+        self.assertEqual(self.create_task('UTC', created_at).created_weekday, 1)
+        with self.settings(TIME_ZONE='Asia/Tokyo'):
+            self.assertEqual(self.create_task('Tokyo', created_at).created_weekday, 2)
+
+    def test_filter_by_day(self):
+        monday = self.create_task('Monday', datetime(2024, 1, 1, 12, tzinfo=dt_timezone.utc))
+        self.create_task('Sunday', datetime(2024, 1, 7, 12, tzinfo=dt_timezone.utc))
+        response = self.client.get(reverse('task-list-by-day'), {'day_of_week': 'Понедельник'})
+        self.assertEqual([item['id'] for item in response.data['results']], [monday.id])
+
+
+class FullTextSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='owner', password='secret-pass-123')
+        cls.presentation = Task.objects.create(
+            title='Prepare presentation', description='Slides for the meeting', owner=cls.user
+        )
+        cls.report = Task.objects.create(
+            title='Write report', description='Summary of the presentation', owner=cls.user
+        )
+        SubTask.objects.create(title='Gather information', task=cls.presentation, owner=cls.user)
+
+    def setUp(self):
+        get_search_backend().reset()
+        self.client.force_authenticate(user=self.user)
+
+    def search(self, url_name, query):
+        response = self.client.get(reverse(url_name), {'search': query})
+        return [item['title'] for item in response.data['results']]
+
+    def test_prefix_and_ranking(self):
+        # Совпадение в названии весит больше, чем в описании
+        self.assertEqual(self.search('task-list-create', 'presen'), ['Prepare presentation', 'Write report'])
+        self.assertEqual(self.search('task-list-create', 'presentation slid'), ['Prepare presentation'])
+        self.assertEqual(self.search('task-list-create', 'missing'), [])
+
+    def test_incremental_updates(self):
+        self.search('task-list-create', 'anything')
+        task = Task.objects.create(title='Budget review', owner=self.user)
+        self.assertEqual(self.search('task-list-create', 'budg'), ['Budget review'])
+        task.title = 'Quarterly planning'
+        task.save()
+        self.assertEqual(self.search('task-list-create', 'budg'), [])
+        self.assertEqual(self.search('task-list-create', 'quarter'), ['Quarterly planning'])
+        task.delete()
+        self.assertEqual(self.search('task-list-create', 'quarter'), [])
+
+    def test_subtask_search(self):
+        self.assertEqual(self.search('subtask-list-create', 'info'), ['Gather information'])
+
+    def test_all_matches_returned(self):
+        Task.objects.bulk_create([Task(title=f'Bulk presentation {i}', owner=self.user) for i in range(1200)])
+        response = self.client.get(reverse('task-list-create'), {'search': 'presentation', 'page': 24, 'page_size': 50})
+        self.assertEqual(response.data['count'], 1202)
+        self.assertEqual(len(response.data['results']), 50)
+
+    def test_ranking_beyond_ranked_results(self):
+        with mock.patch.object(InMemorySearchBackend, 'ranked_results', 1):
+            self.assertEqual(self.search('task-list-create', 'presen'), ['Prepare presentation', 'Write report'])
+
+    @override_settings(TASKS_SEARCH_INDEX_BACKGROUND=True)
+    def test_background_build(self):
+        backend = get_search_backend()
+        with mock.patch.object(InMemorySearchBackend, 'build_in_background', return_value=True), \
+                mock.patch('src.tasks.search.threading.Thread') as thread:
+            # Пока индекс строится, работает LIKE по search_fields: ищет и середину слова
+            self.assertEqual(sorted(self.search('task-list-create', 'esentat')),
+                             ['Prepare presentation', 'Write report'])
+        self.assertEqual(thread.call_count, 1)
+        # Изменение во время построения перечитывается после него
+        Task.objects.create(title='Late presentation', owner=self.user)
+        backend.build_index(*thread.call_args.kwargs['args'])
+        self.assertEqual(self.search('task-list-create', 'esentat'), [])
+        self.assertIn('Late presentation', self.search('task-list-create', 'presen'))
+
+
+class EmailOutboxTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='owner', email='owner@example.com', password='secret-pass-123')
+        cls.task = Task.objects.create(title='Task', owner=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_status_change_goes_to_outbox(self):
+        url = reverse('task-detail', kwargs={'id': self.task.id})
+        response = self.client.patch(url, {'status': 'Done'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(mail.outbox), 0)
+        message = EmailOutbox.objects.get()
+        self.assertEqual(message.recipient, 'owner@example.com')
+        self.assertIn('New status: Done', message.body)
+
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 1)
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxStatus.SENT)
+
+    def test_send_outbox_rejects_invalid_options(self):
+        for options in ({'workers': 0}, {'batch_size': 0}, {'batch_size': -5}):
+            with self.subTest(**options), self.assertRaises(CommandError):
+                call_command('send_outbox', stdout=StringIO(), **options)
+
+    def test_failed_send_is_retried_later(self):
+        message = enqueue_email('owner@example.com', 'Subject', 'Body')
+        with mock.patch('django.core.mail.EmailMessage.send', side_effect=OSError('SMTP down')):
+            self.assertEqual(process_batch(max_attempts=2), (0, 1))
+        message.refresh_from_db()
+        self.assertEqual(message.status, OutboxStatus.PENDING)
+        self.assertEqual(message.attempts, 1)
+        self.assertGreater(message.next_attempt_at, timezone.now())
+        # До next_attempt_at письмо повторно не берется
+        self.assertEqual(process_batch(), (0, 0))
+
+
+class TrackedFieldsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='owner', email='owner@example.com', password='secret-pass-123')
+        cls.task_id = Task.objects.create(title='Task', owner=cls.user).id
+
+    def test_save_without_extra_select(self):
+        task = Task.objects.get(id=self.task_id)
+        task.description = 'Changed'
+        # Только UPDATE, без повторного чтения старого статуса
+        with self.assertNumQueries(1):
+            task.save()
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_previous_values(self):
+        task = Task.objects.get(id=self.task_id)
+        self.assertFalse(task.has_changed('status'))
+        task.status = 'Done'
+        self.assertTrue(task.has_changed('status'))
+        self.assertEqual(task.get_previous('status'), 'New')
+        self.assertEqual(task.changed_fields, {'status'})
+        task.save()
+        self.assertFalse(task.has_changed('status'))
+        self.assertEqual(task.get_previous('status'), 'Done')
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_instances_track_independently(self):
+        first = Task.objects.get(id=self.task_id)
+        second = Task.objects.get(id=self.task_id)
+        first.status = 'Blocked'
+        first.save()
+        second.status = 'Done'
+        second.save()
+        previous = [message.body.split('Previous status: ')[1].split('\n')[0]
+                    for message in EmailOutbox.objects.order_by('id')]
+        self.assertEqual(previous, ['New', 'New'])
+
+    def test_deferred_fields(self):
+        task = Task.objects.only('id', 'title').get(id=self.task_id)
+        self.assertFalse(task.has_changed('status'))
+        self.assertEqual(task.status, 'New')
+        self.assertEqual(task.get_previous('status'), 'New')
+
+
+class BulkEndpointTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='owner', email='owner@example.com', password='secret-pass-123')
+        cls.other = User.objects.create_user(username='other', password='secret-pass-123')
+        cls.categories = [Category.objects.create(name=f'Category {i}') for i in range(3)]
+        cls.existing = Task.objects.create(title='Existing', owner=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def payload(self, count):
+        category_ids = [category.id for category in self.categories]
+        return [{'title': f'Bulk {i}', 'categories': category_ids[:i % 3 + 1]} for i in range(count)]
+
+    def test_bulk_create_constant_queries(self):
+        url = reverse('task-bulk')
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.post(url, self.payload(40), format='json')
+        self.assertEqual(response.status_code, 201)
+        # категории + проверка названий + вставка задач + вставка связей;
+        # запросы к счетчикам зависят от числа категорий, а не задач
+        queries = [
+            query['sql'] for query in captured.captured_queries
+            if 'SAVEPOINT' not in query['sql'] and '_counter' not in query['sql']
+        ]
+        self.assertEqual(len(queries), 4)
+        self.assertEqual(Task.objects.filter(title__startswith='Bulk').count(), 40)
+        created = Task.objects.get(title='Bulk 2')
+        self.assertEqual(created.owner, self.user)
+        self.assertEqual(created.categories.count(), 3)
+        self.assertEqual(response.data['results'][2], {'index': 2, 'status': 'created', 'id': created.id})
+
+    def test_atomic_mode_rejects_everything(self):
+        payload = self.payload(3) + [{'title': 'Existing'}, {'title': 'Bulk 0'}, {'title': 'Bad', 'categories': [999]}]
+        response = self.client.post(reverse('task-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 400)
+        statuses = [result['status'] for result in response.data['results']]
+        self.assertEqual(statuses, ['skipped'] * 3 + ['error'] * 3)
+        self.assertFalse(Task.objects.filter(title__startswith='Bulk').exists())
+
+    def test_partial_mode(self):
+        payload = self.payload(2) + [{'title': 'Existing'}, {'title': 'Bulk 0'}]
+        response = self.client.post(reverse('task-bulk') + '?mode=partial&batch_size=1', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']],
+                         ['created', 'created', 'error', 'error'])
+        self.assertIn('title', response.data['results'][2]['errors'])
+
+    def test_duplicate_title_message_matches_single_create(self):
+        single = self.client.post(reverse('task-list-create'), {'title': 'Existing'}, format='json')
+        self.assertEqual(single.status_code, 400)
+        bulk = self.client.post(reverse('task-bulk') + '?mode=partial', [{'title': 'Existing'}], format='json')
+        self.assertEqual(bulk.data['results'][0]['errors'], single.data)
+
+    def test_bulk_update(self):
+        foreign = Task.objects.create(title='Foreign', owner=self.other)
+        payload = [
+            {'id': self.existing.id, 'status': 'Done', 'categories': [self.categories[0].id]},
+            {'id': foreign.id, 'status': 'Done'},
+            {'id': 999999, 'status': 'Done'},
+        ]
+        response = self.client.patch(reverse('task-bulk') + '?mode=partial', payload, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], ['updated', 'error', 'error'])
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.status, 'Done')
+        self.assertEqual(list(self.existing.categories.all()), [self.categories[0]])
+        foreign.refresh_from_db()
+        self.assertEqual(foreign.status, 'New')
+        # Письмо о смене статуса уходит и при пакетном обновлении
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_bulk_update_rollback_drops_outbox(self):
+        # Ошибка БД после записи письма откатывает письмо вместе с задачами
+        def fail(**kwargs):
+            raise IntegrityError('boom')
+        post_bulk_update.connect(fail, sender=Task, weak=False)
+        self.addCleanup(post_bulk_update.disconnect, fail, sender=Task)
+        payload = [{'id': self.existing.id, 'status': 'Done'}]
+        response = self.client.patch(reverse('task-bulk'), payload, format='json')
+        self.assertEqual(response.data['results'][0]['status'], 'error')
+        self.assertEqual(EmailOutbox.objects.count(), 0)
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.status, 'New')
+
+    def test_bulk_subtasks(self):
+        payload = [{'title': f'Sub {i}', 'task': self.existing.id} for i in range(5)]
+        response = self.client.post(reverse('subtask-bulk'), payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.existing.subtasks.count(), 5)
+
+
+class CategoryCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='cache_user', password='secret-pass-123')
+        cls.category = Category.objects.create(name='Cached')
+        cls.task = Task.objects.create(title='Cached task', owner=cls.user)
+
+    def setUp(self):
+        reset_cache()
+        self.client.force_authenticate(user=self.user)
+
+    def test_list_is_cached_and_invalidated(self):
+        url = reverse('category-list')
+        first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+
+        version = get_version(CATEGORY_CACHE_NAMESPACE)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.delete()
+        self.assertNotEqual(get_version(CATEGORY_CACHE_NAMESPACE), version)
+        self.assertEqual(self.client.get(url).data['count'], 0)
+
+    def test_count_tasks_invalidated_by_m2m(self):
+        url = reverse('category-count-tasks')
+        self.assertEqual(self.client.get(url).data[0]['task_count'], 0)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.task.categories.add(self.category)
+        self.assertEqual(self.client.get(url).data[0]['task_count'], 1)
+
+    def test_if_none_match(self):
+        url = reverse('category-count-tasks')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(name='Another')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_lru_eviction_and_ttl(self):
+        cache = LRUCache(max_entries=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        with mock.patch('src.tasks.cache.time.monotonic', return_value=time.monotonic() + 10):
+            cache.set('d', 4, timeout=5)
+        self.assertEqual(cache.get('d'), 4)
+        with mock.patch('src.tasks.cache.time.monotonic', return_value=time.monotonic() + 20):
+            self.assertIsNone(cache.get('d'))
+
+    def test_redis_backend_with_stand_in(self):
+        backend = RedisBackend()
+        backend.set('data', [{'id': 1}])
+        backend.set('version', 5)
+        self.assertEqual(backend.get('data'), [{'id': 1}])
+        self.assertEqual(backend.incr('version'), 6)
+        self.assertEqual(backend.get('version'), 6)
+
+
+class TaskCounterTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='counter_user', password='secret-pass-123')
+        cls.categories = [Category.objects.create(name=f'Counted {i}') for i in range(2)]
+
+    def setUp(self):
+        reset_cache()
+        self.client.force_authenticate(user=self.user)
+
+    def category_counts(self):
+        return dict(CategoryTaskCounter.objects.values_list('category_id', 'task_count'))
+
+    def test_counters_follow_changes(self):
+        first, second = self.categories
+        task = Task.objects.create(title='Counted task', owner=self.user)
+        task.categories.set([first, second])
+        self.assertEqual(self.category_counts(), {first.id: 1, second.id: 1})
+        self.assertEqual(owner_status_counts(self.user), {'New': 1})
+
+        task.categories.remove(second, second)
+        second.tasks.add(task)
+        first.tasks.clear()
+        self.assertEqual(self.category_counts(), {first.id: 0, second.id: 1})
+
+        task.status = 'Done'
+        task.save()
+        self.assertEqual(owner_status_counts(self.user), {'Done': 1})
+
+        task.delete()
+        self.assertEqual(self.category_counts(), {first.id: 0, second.id: 0})
+        self.assertEqual(owner_status_counts(self.user), {})
+
+    def test_bulk_endpoints_update_counters(self):
+        first, second = self.categories
+        payload = [{'title': f'Counted bulk {i}', 'categories': [first.id]} for i in range(3)]
+        response = self.client.post(reverse('task-bulk'), payload, format='json')
+        ids = [result['id'] for result in response.data['results']]
+        self.assertEqual(self.category_counts(), {first.id: 3})
+
+        payload = [{'id': ids[0], 'status': 'Done', 'categories': [second.id]}]
+        self.client.patch(reverse('task-bulk'), payload, format='json')
+        self.assertEqual(self.category_counts(), {first.id: 2, second.id: 1})
+        self.assertEqual(owner_status_counts(self.user), {'New': 2, 'Done': 1})
+
+    def test_count_tasks_reads_counters(self):
+        task = Task.objects.create(title='Counted task', owner=self.user)
+        task.categories.add(self.categories[0])
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('category-count-tasks'))
+        self.assertEqual({row['name']: row['task_count'] for row in response.data},
+                         {'Counted 0': 1, 'Counted 1': 0})
+
+    def test_reconcile_repairs_drift(self):
+        task = Task.objects.create(title='Counted task', owner=self.user)
+        task.categories.add(self.categories[0])
+        CategoryTaskCounter.objects.update(task_count=10)
+        OwnerStatusTaskCounter.objects.all().delete()
+
+        out = StringIO()
+        call_command('reconcile_counters', stdout=out)
+        self.assertIn('категорий - 1, пар пользователь/статус - 1', out.getvalue())
+        self.assertEqual(self.category_counts(), {self.categories[0].id: 1})
+        self.assertEqual(owner_status_counts(self.user), {'New': 1})
+
+
+class TaskStatsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='stats_user', password='secret-pass-123')
+        other = User.objects.create_user(username='stats_other', password='secret-pass-123')
+        past = timezone.now() - timedelta(days=1)
+        cls.task = Task.objects.create(title='Stats overdue', owner=cls.user, deadline=past)
+        Task.objects.create(title='Stats done', owner=cls.user, status='Done', deadline=past)
+        Task.objects.create(title='Stats foreign', owner=other, deadline=past)
+        SubTask.objects.create(title='Stats sub 1', task=cls.task, owner=cls.user, status='Done')
+        SubTask.objects.create(title='Stats sub 2', task=cls.task, owner=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def test_live_stats(self):
+        with self.assertNumQueries(4):
+            response = self.client.get(reverse('task-stats'), {'fresh': 'true'})
+        self.assertEqual(response.status_code, 200)
+        data = response.data
+        self.assertEqual(data['source'], 'live')
+        self.assertEqual(data['total'], 2)
+        self.assertEqual(data['by_status']['New'], 1)
+        self.assertEqual(data['by_status']['Done'], 1)
+        self.assertEqual(data['overdue'], 1)
+        self.assertEqual(sum(row['count'] for row in data['by_weekday']), 2)
+        self.assertEqual(data['subtasks'], {'total': 2, 'done': 1, 'completion_ratio': 0.5})
+        self.assertEqual(data['tasks'], [{
+            'id': self.task.id, 'title': 'Stats overdue',
+            'subtasks_total': 2, 'subtasks_done': 1, 'completion_ratio': 0.5,
+        }])
+
+    def test_snapshot(self):
+        call_command('refresh_task_stats', min_tasks=2, stdout=StringIO())
+        self.assertEqual(TaskStatsSnapshot.objects.count(), 1)
+        live = self.client.get(reverse('task-stats'), {'fresh': 'true'}).data
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('task-stats'))
+        self.assertEqual(response.data['source'], 'snapshot')
+        for key in ('by_status', 'overdue', 'by_weekday', 'subtasks', 'tasks'):
+            self.assertEqual(response.data[key], live[key])
+
+    def test_invalid_tasks_limit(self):
+        response = self.client.get(reverse('task-stats'), {'tasks_limit': 'many'})
+        self.assertEqual(response.status_code, 400)
+
+
+@override_settings(TASKS_EXPORT_CHUNK_SIZE=2)
+class TaskExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='export_user', password='secret-pass-123')
+        category = Category.objects.create(name='Export')
+        for i in range(5):
+            task = Task.objects.create(title=f'Export {i}', owner=cls.user, status='Done' if i % 2 else 'New')
+            task.categories.add(category)
+            for j in range(i % 3):
+                SubTask.objects.create(title=f'Export {i}.{j}', task=task, owner=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('task-export'), params)
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        # Пачки по 2 задачи по ключу (created_at, id): задачи, категории и подзадачи на каждую пачку
+        with self.assertNumQueries(3 * 3):
+            body = self.export()
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([row['title'] for row in rows], [f'Export {i}' for i in reversed(range(5))])
+        first = next(row for row in rows if row['title'] == 'Export 2')
+        self.assertEqual([subtask['title'] for subtask in first['subtasks']], ['Export 2.1', 'Export 2.0'])
+        self.assertEqual(first['categories'][0]['name'], 'Export')
+
+    def test_filters_and_csv(self):
+        body = self.export(file_format='csv', status='Done')
+        rows = list(csv.DictReader(StringIO(body)))
+        # Export 1 (одна подзадача) и Export 3 (без подзадач)
+        self.assertEqual([(row['title'], row['subtask_title']) for row in rows],
+                         [('Export 3', ''), ('Export 1', 'Export 1.0')])
+        self.assertEqual(rows[0]['categories'], 'Export')
+
+    def test_ascending_ordering(self):
+        rows = [json.loads(line) for line in self.export(ordering='created_at').splitlines()]
+        self.assertEqual([row['title'] for row in rows], [f'Export {i}' for i in range(5)])
+
+    def test_search_keeps_created_order(self):
+        # Export 1 релевантнее остальных, но выгрузка идет по created_at, а не по рангу
+        task = Task.objects.get(title='Export 1')
+        task.description = 'Export export export'
+        task.save()
+        ranked = self.client.get(reverse('task-list-create'), {'search': 'export'}).data['results']
+        self.assertEqual(ranked[0]['title'], 'Export 1')
+        for params, expected in (({}, reversed(range(5))), ({'ordering': 'created_at'}, range(5))):
+            with self.subTest(**params):
+                rows = [json.loads(line) for line in self.export(search='export', **params).splitlines()]
+                self.assertEqual([row['title'] for row in rows], [f'Export {i}' for i in expected])
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('task-export'), {'file_format': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+
+class ImportTasksCommandTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='importer', password='secret-pass-123')
+        cls.category = Category.objects.create(name='Imported')
+
+    def write(self, name, content):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, name)
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_import_tasks_subtasks_and_links(self):
+        tasks = self.write('tasks.csv', (
+            'title,description,status,deadline,owner,categories\n'
+            'Import 1,First,New,2030-01-01T10:00:00,importer,Imported|Fresh\n'
+            'Import 2,,Done,,importer,\n'
+            'Import 3,,Unknown,,importer,\n'
+            'Import 4,,New,,nobody,\n'
+        ))
+        subtasks = self.write('subtasks.ndjson', '\n'.join(json.dumps(row) for row in [
+            {'title': 'Import 1.1', 'task': 'Import 1'},
+            {'title': 'Import 2.1', 'task': 'Import 2', 'status': 'Done'},
+            {'title': 'Import X.1', 'task': 'Missing'},
+        ]) + '\nnot json\n')
+        links = self.write('links.csv', 'task,category\nImport 2,Imported\nImport 1,Imported\n')
+
+        out, err = StringIO(), StringIO()
+        call_command('import_tasks', tasks=tasks, subtasks=subtasks, links=links, batch_size=2,
+                     create_categories=True, stdout=out, stderr=err)
+
+        self.assertIn('tasks: строк 4, создано 2, пропущено (уже есть) 0, ошибок 2', out.getvalue())
+        self.assertIn('subtasks: строк 4, создано 2, пропущено (уже есть) 0, ошибок 2', out.getvalue())
+        self.assertIn('links: строк 2, создано 1, пропущено (уже есть) 1, ошибок 0', out.getvalue())
+        self.assertIn('строк/с', out.getvalue())
+        self.assertIn('неизвестный статус Unknown', err.getvalue())
+
+        task = Task.objects.get(title='Import 1')
+        self.assertEqual(task.owner, self.user)
+        self.assertEqual(sorted(task.categories.values_list('name', flat=True)), ['Fresh', 'Imported'])
+        self.assertEqual(task.subtasks.get().owner, self.user)
+        self.assertEqual(owner_status_counts(self.user), {'New': 1, 'Done': 1})
+        self.assertEqual(CategoryTaskCounter.objects.get(category=self.category).task_count, 2)
+
+    def test_existing_titles_are_skipped(self):
+        Task.objects.create(title='Import 1', owner=self.user)
+        tasks = self.write('tasks.ndjson', json.dumps({'title': 'Import 1', 'owner': self.user.id}) + '\n')
+        out = StringIO()
+        call_command('import_tasks', tasks=tasks, stdout=out)
+        self.assertIn('создано 0, пропущено (уже есть) 1', out.getvalue())
+
+    def test_owner_id_column_and_deleted_categories(self):
+        Category.objects.create(name='Archived').delete()
+        # В колонке owner - имя пользователя, id передается в owner_id
+        tasks = self.write('tasks.csv', (
+            'title,owner,owner_id,categories\n'
+            f'Import 1,,{self.user.id},Imported\n'
+            f'Import 2,{self.user.id},,\n'
+            f'Import 3,,{self.user.id},Archived\n'
+        ))
+        links = self.write('links.csv', 'task,category\nImport 1,Archived\n')
+        out, err = StringIO(), StringIO()
+        call_command('import_tasks', tasks=tasks, links=links, create_categories=True, stdout=out, stderr=err)
+        self.assertIn('tasks: строк 3, создано 1, пропущено (уже есть) 0, ошибок 2', out.getvalue())
+        self.assertIn('links: строк 1, создано 0, пропущено (уже есть) 0, ошибок 1', out.getvalue())
+        self.assertIn(f'пользователь {self.user.id} не найден', err.getvalue())
+        self.assertIn('категории удалены: Archived', err.getvalue())
+        self.assertEqual(Task.objects.get(title='Import 1').owner, self.user)
+        self.assertEqual(Category.all_objects.filter(name='Archived').count(), 1)
+
+    def test_invalid_row_does_not_reserve_title(self):
+        # Строка с ошибкой не должна занимать название: следующая строка с тем же названием создается
+        tasks = self.write('tasks.csv', 'title,status,owner\nImport 1,Unknown,importer\nImport 1,New,importer\n')
+        subtasks = self.write('subtasks.csv', 'title,task\nImport 1.1,Missing\nImport 1.1,Import 1\n')
+        out = StringIO()
+        call_command('import_tasks', tasks=tasks, subtasks=subtasks, stdout=out, stderr=StringIO())
+        self.assertIn('tasks: строк 2, создано 1, пропущено (уже есть) 0, ошибок 1', out.getvalue())
+        self.assertIn('subtasks: строк 2, создано 1, пропущено (уже есть) 0, ошибок 1', out.getvalue())
+        self.assertEqual(Task.objects.get(title='Import 1').status, 'New')
+
+
+class CachedJWTAuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='jwt_user', password='secret-pass-123')
+
+    def setUp(self):
+        reset_cache()
+        get_user_cache().clear()
+        token = AccessToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('category-count-tasks')
+        # Ответ count_tasks берется из кэша, поэтому остаются только запросы аутентификации
+        self.client.get(self.url)
+
+    def test_user_is_cached(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deactivation_invalidates_cache(self):
+        self.user.is_active = False
+        self.user.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    def test_version_bump_from_other_process(self):
+        # Сигнал в другом процессе меняет только версию в общем кэше
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        bump_version(user_namespace(self.user.pk))
+        self.assertEqual(self.client.get(self.url).status_code, 401)
+
+    def test_update_without_signals_expires(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        later = time.monotonic() + settings.TASKS_AUTH_USER_CACHE_TIMEOUT + 1
+        with mock.patch('src.tasks.cache.time.monotonic', return_value=later):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 401)
+
+    def test_bench_auth_command(self):
+        out = StringIO()
+        call_command('bench_auth', requests=5, stdout=out)
+        self.assertIn('CachedJWTAuthentication', out.getvalue())
+        self.assertIn('0.00 SQL/запрос', out.getvalue())
+
+
+class TokenBlacklistTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='refresh_user', password='secret-pass-123')
+
+    def setUp(self):
+        get_blacklist_index().reset()
+
+    def test_rotation_blacklists_old_token(self):
+        refresh = RefreshToken.for_user(self.user)
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(BlacklistedToken.objects.filter(token__jti=refresh['jti']).exists())
+        self.assertTrue(OutstandingToken.objects.filter(jti=RefreshToken(response.data['refresh'])['jti']).exists())
+
+        # Отозванный в этом процессе токен уже в индексе: повторная проверка без БД
+        with self.assertNumQueries(0):
+            response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+
+    def test_sync_after_version_change(self):
+        index = get_blacklist_index()
+        index.contains('warm-up')
+        with self.assertNumQueries(0):
+            index.contains('missing')
+        # Другой процесс сменил версию - дочитываются только новые строки по id
+        bump_version(BLACKLIST_CACHE_NAMESPACE)
+        with CaptureQueriesContext(connection) as captured:
+            index.contains('missing')
+        self.assertEqual(len(captured.captured_queries), 1)
+        self.assertIn('"token_blacklist_blacklistedtoken"."id" >', captured.captured_queries[0]['sql'])
+
+    def test_zero_interval_reads_every_check(self):
+        index = BlacklistIndex(sync_interval=0)
+        index.contains('warm-up')
+        with self.assertNumQueries(1):
+            index.contains('missing')
+
+    def test_refresh_for_deleted_user(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.user.delete()
+        response = self.client.post(reverse('token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response.data['detail'].code, 'no_active_account')
+
+    def test_index_sees_tokens_blacklisted_elsewhere(self):
+        refresh = RefreshToken.for_user(self.user)
+        self.assertFalse(get_blacklist_index().contains(refresh['jti']))
+        # Запись из другого потока - напрямую через модели simplejwt; версия
+        # в TASKS_CACHE меняется после фиксации транзакции
+        with self.captureOnCommitCallbacks(execute=True):
+            refresh.blacklist()
+        self.assertTrue(get_blacklist_index().contains(refresh['jti']))
+
+    def test_prune_tokens(self):
+        expired = RefreshToken.for_user(self.user)
+        expired.blacklist()
+        OutstandingToken.objects.filter(jti=expired['jti']).update(expires_at=timezone.now() - timedelta(days=1))
+        alive = RefreshToken.for_user(self.user)
+
+        out = StringIO()
+        call_command('prune_tokens', batch_size=1, stdout=out)
+        self.assertIn('Удалено истекших токенов: 1', out.getvalue())
+        self.assertEqual(list(OutstandingToken.objects.values_list('jti', flat=True)), [alive['jti']])
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+class DeletedUserTokenTests(TransactionTestCase):
+    """
+    Внешний ключ проверяется при фиксации транзакции, поэтому нужен
+    TransactionTestCase: в TestCase INSERT с удаленным пользователем не упадет
+    """
+
+    def test_outstand_without_user(self):
+        user = User.objects.create_user(username='gone_user', password='secret-pass-123')
+        refresh = AcceleratedRefreshToken.for_user(user)
+        OutstandingToken.objects.all().delete()
+        user.delete()
+        token, created = refresh.outstand()
+        self.assertTrue(created)
+        self.assertIsNone(token.user_id)
+        self.assertEqual(refresh.outstand(), (token, False))
+
+
+class SoftDeleteTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='soft_user', password='secret-pass-123')
+        cls.category = Category.objects.create(name='Soft category')
+
+    def setUp(self):
+        reset_cache()
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(title='Soft task', owner=self.user)
+        self.task.categories.add(self.category)
+        self.subtask = SubTask.objects.create(title='Soft subtask', task=self.task, owner=self.user)
+
+    def test_delete_hides_task_and_subtasks(self):
+        response = self.client.delete(reverse('task-detail', args=[self.task.id]))
+        self.assertEqual(response.status_code, 204)
+
+        self.assertFalse(Task.objects.filter(id=self.task.id).exists())
+        self.assertFalse(SubTask.objects.filter(id=self.subtask.id).exists())
+        self.assertTrue(Task.all_objects.get(id=self.task.id).is_deleted)
+        self.assertEqual(self.client.get(reverse('task-detail', args=[self.task.id])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('subtask-detail', args=[self.subtask.id])).status_code, 404)
+
+        self.assertEqual(owner_status_counts(self.user), {})
+        self.assertEqual(CategoryTaskCounter.objects.get(category=self.category).task_count, 0)
+
+    def test_deleted_title_cannot_be_reused(self):
+        self.task.delete()
+        response = self.client.post(reverse('task-list-create'), {'title': 'Soft task'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('title', response.data)
+
+    def test_purge_removes_old_tombstones(self):
+        fresh = Task.objects.create(title='Fresh tombstone', owner=self.user)
+        fresh.delete()
+        self.task.delete()
+        Task.all_objects.filter(id=self.task.id).update(deleted_at=timezone.now() - timedelta(days=31))
+
+        out = StringIO()
+        call_command('purge_deleted', batch_size=1, stdout=out)
+        self.assertIn('Удалено задач: 1, подзадач: 1', out.getvalue())
+        self.assertEqual(list(Task.all_objects.values_list('title', flat=True)), ['Fresh tombstone'])
+        self.assertFalse(SubTask.all_objects.exists())
+        self.assertEqual(owner_status_counts(self.user), {})
+
+
+@override_settings(TASKS_FAST_LIST_SERIALIZATION=True)
+class FastListSerializationTests(APITestCase):
+    """
+    Быстрый путь списков должен давать тот же JSON, что сериализаторы DRF
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='fast_user', password='secret-pass-123')
+        categories = [Category.objects.create(name=name) for name in ('Работа', 'Дом "и" сад', 'Удаленная')]
+        categories[2].delete()
+        for i in range(7):
+            task = Task.objects.create(
+                title=f'Задача {i}   «кавычки» \\ \t',
+                description=None if i % 2 else f'Описание\n{i}   \x01',
+                owner=cls.user,
+                status='Done' if i % 3 else 'New',
+                deadline=timezone.now() + timedelta(days=i, microseconds=123) if i % 2 else None,
+            )
+            task.categories.set(categories[:i % 4])
+            for j in range(i % 3):
+                SubTask.objects.create(title=f'Подзадача {i}.{j}', task=task, owner=cls.user)
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+
+    def assertSameAsSerializer(self, url, params):
+        with override_settings(TASKS_FAST_LIST_SERIALIZATION=False):
+            expected = JSONRenderer().render(self.client.get(url, params).data)
+        with mock.patch.object(ValuesSerializer, 'serialize', autospec=True,
+                               side_effect=ValuesSerializer.serialize) as serialize:
+            response = self.client.get(url, params)
+        self.assertTrue(serialize.called)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, expected)
+
+    def test_lists_match_serializers(self):
+        cases = [
+            ('task-list-create', {}),
+            ('task-list-create', {'page_size': 50, 'ordering': 'created_at'}),
+            ('task-list-create', {'fields': 'title,categories,deadline'}),
+            ('task-list-create', {'expand': ''}),
+            ('task-list-create', {'pagination': 'cursor', 'fields': 'id'}),
+            ('task-list-create', {'search': 'задача'}),
+            ('my-tasks', {'page_size': 50}),
+            ('task-list-by-day', {'page_size': 50}),
+            ('subtask-list-create', {'page_size': 50}),
+            ('subtask-list-create', {'expand': 'task', 'pagination': 'cursor'}),
+        ]
+        for url_name, params in cases:
+            with self.subTest(url_name=url_name, **params):
+                self.assertSameAsSerializer(reverse(url_name), params)
+
+    def test_related_rows_ordered(self):
+        # У Category нет ordering: и prefetch DRF, и быстрый путь сортируют явно
+        for fast in (True, False):
+            with self.subTest(fast=fast), override_settings(TASKS_FAST_LIST_SERIALIZATION=fast):
+                with CaptureQueriesContext(connection) as captured:
+                    self.client.get(reverse('task-list-create'))
+                related = [query['sql'] for query in captured.captured_queries
+                           if 'FROM "task_manager_category"' in query['sql']]
+                self.assertEqual(len(related), 1)
+                self.assertIn(' ORDER BY ', related[0])
+
+    def test_renderer_matches_json_renderer(self):
+        data = {
+            'text': 'юникод     "\\" \x00 \x7f',
+            'datetime': timezone.now(),
+            'date': timezone.now().date(),
+            'decimal': Decimal('1.50'),
+            'uuid': uuid.UUID(int=1),
+            1: [None, True, 2 ** 40, 0.1],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
+
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='etag_user', password='secret-pass-123')
+        cls.category = Category.objects.create(name='Etag category')
+
+    def setUp(self):
+        self.client.force_authenticate(user=self.user)
+        self.task = Task.objects.create(title='Etag task', owner=self.user)
+        self.task.categories.add(self.category)
+        self.detail_url = reverse('task-detail', args=[self.task.id])
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertIn('Last-Modified', response)
+        # Без изменений - 304 после одного запроса состояния
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail_status_change(self):
+        def change():
+            self.task.status = 'Done'
+            self.task.save()
+        self.assertRevalidates(self.detail_url, change)
+
+    def test_detail_subtask_change(self):
+        self.assertRevalidates(
+            self.detail_url, lambda: SubTask.objects.create(title='Etag subtask', task=self.task, owner=self.user)
+        )
+
+    def test_detail_category_rename(self):
+        def change():
+            self.category.name = 'Renamed'
+            self.category.save()
+        self.assertRevalidates(self.detail_url, change)
+
+    def test_my_tasks_delete(self):
+        other = Task.objects.create(title='Etag other', owner=self.user)
+        self.assertRevalidates(reverse('my-tasks'), other.delete)
+
+    def test_my_tasks_bulk_category_change(self):
+        other = Category.objects.create(name='Etag other')
+
+        def change():
+            payload = [{'id': self.task.id, 'categories': [other.id]}]
+            self.client.patch(reverse('task-bulk'), payload, format='json')
+        self.assertRevalidates(reverse('my-tasks'), change)
+
+    def test_if_modified_since(self):
+        response = self.client.get(self.detail_url)
+        last_modified = response['Last-Modified']
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+        Task.objects.filter(id=self.task.id).update(updated_at=timezone.now() + timedelta(seconds=5))
+        response = self.client.get(self.detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_task(self):
+        self.task.delete()
+        response = self.client.get(self.detail_url, HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(TASKS_PROFILING_SAMPLE_RATE=1)
+class ProfilingMiddlewareTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='profiled', password='secret-pass-123')
+        cls.admin = User.objects.create_superuser(username='profiler', password='secret-pass-123')
+        cls.task = Task.objects.create(title='Profiled task', owner=cls.user)
+
+    def setUp(self):
+        get_profile_store().reset()
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE a = 15 AND b = 'x''y' AND c IN (%s, %s, %s)"),
+            'SELECT * FROM t WHERE a = ? AND b = ? AND c IN (...)',
+        )
+
+    def test_duplicates(self):
+        profile = RequestProfile()
+        with profile.capture():
+            list(Task.objects.filter(id=self.task.id))
+            list(Task.objects.filter(id=self.task.id + 1))
+            list(Category.objects.all())
+        self.assertEqual(profile.queries, 3)
+        self.assertEqual(list(profile.duplicates().values()), [2])
+
+    def test_records_endpoint(self):
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as captured:
+            self.client.get(reverse('task-detail', args=[self.task.id]))
+        stats = get_profile_store().snapshot()['task-detail']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['sampled'], 1)
+        self.assertEqual(stats['max_queries'], len(captured.captured_queries))
+        self.assertGreater(stats['avg_serialize_time_ms'], 0)
+
+    def test_streaming_response_recorded_after_body(self):
+        # SQL экспорта выполняется при чтении тела ответа
+        self.client.force_authenticate(user=self.user)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(reverse('task-export'))
+            self.assertNotIn('task-export', get_profile_store().snapshot())
+            body = b''.join(response.streaming_content)
+        self.assertIn(b'Profiled task', body)
+        stats = get_profile_store().snapshot()['task-export']
+        self.assertEqual(stats['requests'], 1)
+        self.assertEqual(stats['max_queries'], len(captured.captured_queries))
+        self.assertGreater(stats['max_queries'], 1)
+
+    @override_settings(TASKS_PROFILING_SAMPLE_RATE=0)
+    def test_latency_without_sampling(self):
+        self.client.force_authenticate(user=self.user)
+        self.client.get(reverse('my-tasks'))
+        stats = get_profile_store().snapshot()['my-tasks']
+        self.assertEqual((stats['requests'], stats['sampled']), (1, 0))
+
+    def test_report_admin_only(self):
+        self.client.force_authenticate(user=self.user)
+        self.assertEqual(self.client.get(reverse('profiling')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('profiling-metrics')).status_code, 403)
+
+        self.client.force_authenticate(user=self.admin)
+        self.client.get(reverse('task-detail', args=[self.task.id]))
+        response = self.client.get(reverse('profiling'), {'top': 5})
+        self.assertEqual(response.data['endpoints']['task-detail']['requests'], 1)
+
+        response = self.client.get(reverse('profiling-metrics'))
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        self.assertIn('tasks_http_requests_total{endpoint="task-detail"} 1', body)
+        self.assertIn('tasks_http_request_duration_seconds_bucket{endpoint="task-detail",le="+Inf"} 1', body)
+
+        self.assertEqual(self.client.delete(reverse('profiling')).status_code, 204)
+        # После сброса остается только сам DELETE
+        self.assertEqual(list(get_profile_store().snapshot()), ['profiling'])
+
+
+class QueuedLoggingTests(TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'app.log')
+        self.logger = logging.getLogger('src.tasks.tests.queued')
+        self.logger.propagate = False
+        self.logger.setLevel(logging.DEBUG)
+
+    def make_handler(self, **kwargs):
+        handler = QueuedFileHandler(self.path, **kwargs)
+        handler.setFormatter(JSONFormatter())
+        self.logger.addHandler(handler)
+        self.addCleanup(self.logger.removeHandler, handler)
+        return handler
+
+    def read_lines(self):
+        with open(self.path, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_json_lines(self):
+        handler = self.make_handler()
+        items = ['a']
+        self.logger.info('items %s', items, extra={'task_id': 7})
+        # Сообщение фиксируется в момент вызова, а не записи
+        items.append('b')
+        handler.close()
+        record, = self.read_lines()
+        self.assertEqual(record['message'], "items ['a']")
+        self.assertEqual((record['level'], record['logger'], record['task_id']), ('INFO', self.logger.name, 7))
+
+    def test_queue_overflow_drops(self):
+        handler = self.make_handler(queue_size=2)
+        # Фоновый поток не запущен - очередь не разбирается
+        with mock.patch.object(QueuedFileHandler, 'ensure_listener'):
+            for i in range(4):
+                self.logger.info('message %s', i)
+        self.assertEqual(handler.dropped, 2)
+        handler.ensure_listener()
+        handler.flush()
+        self.logger.info('after')
+        handler.close()
+        messages = [record['message'] for record in self.read_lines()]
+        self.assertEqual(messages[:2], ['message 0', 'message 1'])
+        self.assertIn('2', messages[2])
+        self.assertEqual(messages[3], 'after')
+        self.assertEqual(handler.dropped, 0)
+
+    def test_sampling_filter(self):
+        debug = logging.makeLogRecord({'levelno': logging.DEBUG})
+        warning = logging.makeLogRecord({'levelno': logging.WARNING})
+        self.assertFalse(SamplingFilter(rate=0).filter(debug))
+        self.assertTrue(SamplingFilter(rate=0).filter(warning))
+        self.assertTrue(SamplingFilter(rate=1).filter(debug))
+        self.assertTrue(SamplingFilter(rate=0, level='DEBUG').filter(debug))
+
+
+class BenchApiCommandTests(TestCase):
+
+    def test_percentile_nearest_rank(self):
+        from .management.commands.bench_api import percentile
+        ordered = list(range(1, 11))
+        self.assertEqual([percentile(ordered, q) for q in (0, 50, 90, 95, 100)], [1, 5, 9, 10, 10])
+        self.assertIsNone(percentile([], 50))
+
+    def test_report(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'bench.json')
+        call_command(
+            'bench_api', tasks=30, requests=4, warmup=1, only='task', output=path, stdout=StringIO(), stderr=StringIO()
+        )
+        with open(path, encoding='utf-8') as file:
+            report = json.load(file)
+        self.assertEqual(report['meta']['dataset']['tasks'], 30)
+        results = {result['case']: result for result in report['results']}
+        self.assertIn('task detail', results)
+        self.assertIn('subtasks bulk create x10', results)
+        for result in report['results']:
+            with self.subTest(case=result['case']):
+                self.assertEqual(result['errors'], 0, result['statuses'])
+                self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertGreater(results['task detail']['queries_per_request'], 0)
+
+        # Повторный запуск переиспользует данные и сравнивается с первым
+        out = StringIO()
+        call_command(
+            'bench_api', tasks=30, requests=2, warmup=0, only='task detail', compare=path, stdout=out, stderr=StringIO()
+        )
+        self.assertNotIn('Сгенерировано', out.getvalue())
+        self.assertIn('Сравнение с', out.getvalue())
+
+
+class SeedCommandTests(TestCase):
+
+    def test_deterministic_chunks(self):
+        now = timezone.now()
+
+        def build():
+            tasks, subtasks = build_task_chunk(SeedConfig(seed=3, now=now), 2, 200, 300, [1, 2, 3], [10, 11, 12])
+            return (
+                [(task.title, task.owner_id, task.status, task.deadline, task.created_at, ids) for task, ids in tasks],
+                [(index, subtask.title, subtask.status) for index, subtask in subtasks],
+            )
+        self.assertEqual(build(), build())
+
+    def test_generate_dataset(self):
+        config = SeedConfig(users=5, categories=10, tasks=120, deleted_categories=0.5, deleted_tasks=0.1,
+                            seed=1, chunk_size=50)
+        counts = generate_dataset(config)
+        self.assertEqual((counts['users'], counts['tasks']), (5, 120))
+        self.assertEqual(SubTask.all_objects.count(), counts['subtasks'])
+        self.assertTrue(Category.all_objects.filter(is_deleted=True).exists())
+        self.assertTrue(Task.all_objects.filter(is_deleted=True).exists())
+        # Даты распределены по истории, а не равны моменту вставки
+        self.assertLess(Task.all_objects.order_by('created_at').first().created_at, config.now - timedelta(days=30))
+        self.assertFalse(Task.all_objects.filter(updated_at__lt=F('created_at')).exists())
+        # Счетчики пересчитаны после вставки мимо сигналов
+        self.assertEqual(reconcile(dry_run=True), {'categories': 0, 'owner_statuses': 0})
+
+    def test_command(self):
+        out = StringIO()
+        call_command('seed', tasks=20, prefix='seed_cmd', stdout=out)
+        self.assertIn('задач - 20', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('seed', tasks=20, prefix='seed_cmd', stdout=StringIO())
+
+    def test_command_now(self):
+        out = StringIO()
+        call_command('seed', tasks=20, prefix='seed_now', now='2024-01-01', stdout=out)
+        self.assertIn('даты от 2024-01-01T00:00:00+00:00', out.getvalue())
+        latest = Task.all_objects.filter(owner__username__startswith='seed_now_').latest('created_at')
+        self.assertLessEqual(latest.created_at, datetime(2024, 1, 1, tzinfo=dt_timezone.utc))
+        with self.assertRaises(CommandError):
+            call_command('seed', tasks=20, prefix='seed_bad', now='01.01.2024', stdout=StringIO())
+
+
+class AsyncReadEndpointTests(QueryCountTestMixin, APITestCase):
+    tasks_count = 12
+
+    def setUp(self):
+        super().setUp()
+        get_user_cache().clear()
+        self.auth = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.task = Task.objects.order_by('id').first()
+
+    def async_get(self, url, **kwargs):
+        headers = {**self.auth, **kwargs.pop('headers', {})}
+        return async_to_sync(self.async_client.get)(url, headers=headers, **kwargs)
+
+    def test_lists_match_sync(self):
+        cases = [
+            ('task-list-create', 'async-task-list', {'page': 2, 'page_size': 3}),
+            ('task-list-create', 'async-task-list', {'fields': 'id,title', 'expand': '', 'ordering': 'created_at'}),
+            ('task-list-create', 'async-task-list', {'search': 'Task'}),
+            ('my-tasks', 'async-my-tasks', {'pagination': 'cursor'}),
+            ('subtask-list-create', 'async-subtask-list', {'expand': 'task'}),
+            ('category-list', 'async-category-list', {}),
+        ]
+        for sync_name, async_name, params in cases:
+            with self.subTest(async_name, **params):
+                expected = self.client.get(reverse(sync_name), params).json()
+                response = self.async_get(reverse(async_name), data=params)
+                self.assertEqual(response.status_code, 200)
+                data = response.json()
+                self.assertEqual(data['results'], expected['results'])
+                self.assertEqual(data.get('count'), expected.get('count'))
+
+    def test_details_match_sync(self):
+        subtask = SubTask.objects.first()
+        cases = [
+            (reverse('task-detail', args=[self.task.id]), reverse('async-task-detail', args=[self.task.id])),
+            (reverse('task-detail', args=[self.task.id]) + '?subtasks_limit=0',
+             reverse('async-task-detail', args=[self.task.id]) + '?subtasks_limit=0'),
+            (reverse('subtask-detail', args=[subtask.id]), reverse('async-subtask-detail', args=[subtask.id])),
+            (reverse('category-detail', args=[self.categories[0].id]),
+             reverse('async-category-detail', args=[self.categories[0].id])),
+        ]
+        for sync_url, async_url in cases:
+            with self.subTest(async_url):
+                response = self.async_get(async_url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, self.client.get(sync_url).content)
+
+    def test_list_query_count(self):
+        # Пользователь из кэша, затем COUNT, страница и категории страницы
+        self.async_get(reverse('async-task-list'))
+        with self.assertNumQueries(3):
+            response = self.async_get(reverse('async-task-list'))
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_authentication_required(self):
+        response = async_to_sync(self.async_client.get)(reverse('async-task-list'))
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response)
+        response = self.async_get(reverse('async-task-list'), headers={'authorization': 'Bearer broken'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_errors(self):
+        response = self.async_get(reverse('async-task-detail', args=[0]))
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.json(), self.client.get(reverse('task-detail', args=[0])).json())
+        response = self.async_get(reverse('async-task-list'), data={'page': 99})
+        self.assertEqual(response.status_code, 404)
+        response = async_to_sync(self.async_client.post)(reverse('async-task-list'), {}, headers=self.auth)
+        self.assertEqual(response.status_code, 405)
+
+    def test_conditional_get(self):
+        url = reverse('async-task-detail', args=[self.task.id])
+        etag = self.async_get(url)['ETag']
+        response = self.async_get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.task.status = 'Done'
+        self.task.save()
+        response = self.async_get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+
+        etag = self.async_get(reverse('async-my-tasks'))['ETag']
+        response = self.async_get(reverse('async-my-tasks'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
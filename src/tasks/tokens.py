@@ -0,0 +1,180 @@
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .cache import get_version
+
+
+BLACKLIST_CACHE_NAMESPACE = 'token_blacklist'
+
+
+class BlacklistIndex:
+    """
+    Множество JTI отозванных токенов в памяти процесса: jti -> срок действия.
+
+    Загружается при первой проверке (лениво, не при старте процесса): все еще
+    не истекшие записи. Дальше дочитываются только новые строки
+    BlacklistedToken (id больше последнего прочитанного, с JOIN на
+    OutstandingToken за jti и сроком действия). Пропуски в id перечитываются
+    еще gap_timeout секунд: строка с меньшим id может зафиксироваться позже
+    строки с большим. Истекшие JTI удаляются из памяти - такой токен и так не
+    пройдет проверку срока действия.
+
+    В БД индекс ходит, только когда сменилась версия BLACKLIST_CACHE_NAMESPACE
+    в TASKS_CACHE (ее меняет сохранение BlacklistedToken, signals.py) или
+    прошло sync_interval секунд с прошлого чтения. Токен, отозванный в этом
+    процессе, попадает в индекс сразу; отозванный другим процессом - после
+    смены версии в общем кэше (Redis), а с кэшем в памяти процесса или при
+    записи мимо сигналов - не позже чем через sync_interval секунд.
+    sync_interval = 0 - читать БД перед каждой проверкой
+    """
+
+    gap_timeout = 60
+    purge_interval = 60
+
+    def __init__(self, sync_interval=0):
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._expires = {}
+        self._gaps = {}
+        self._last_id = None
+        self._version = None
+        self._synced_at = 0.0
+        self._purged_at = 0.0
+
+    def _remember(self, rows, now):
+        for row_id, jti, expires_at in rows:
+            self._gaps.pop(row_id, None)
+            if self._last_id is not None and row_id > self._last_id + 1:
+                for missing in range(self._last_id + 1, min(row_id, self._last_id + 1001)):
+                    self._gaps.setdefault(missing, now)
+            if self._last_id is None or row_id > self._last_id:
+                self._last_id = row_id
+            self._expires[jti] = expires_at.timestamp()
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        # Версия читается до запроса: запись, зафиксированная во время
+        # чтения, сменит ее еще раз
+        version = get_version(BLACKLIST_CACHE_NAMESPACE)
+        with self._lock:
+            if (not force and self._last_id is not None and version == self._version
+                    and now - self._synced_at < self.sync_interval):
+                return
+            fields = ('id', 'token__jti', 'token__expires_at')
+            if self._last_id is None:
+                # Прогрев: все еще действующие отозванные токены
+                queryset = BlacklistedToken.objects.filter(token__expires_at__gt=timezone.now())
+                self._last_id = BlacklistedToken.objects.order_by('-id').values_list('id', flat=True).first() or 0
+                self._remember(queryset.order_by('id').values_list(*fields).iterator(chunk_size=5000), now)
+            else:
+                self._gaps = {gap: seen for gap, seen in self._gaps.items() if now - seen < self.gap_timeout}
+                condition = Q(id__gt=self._last_id)
+                if self._gaps:
+                    condition |= Q(id__in=list(self._gaps))
+                rows = list(BlacklistedToken.objects.filter(condition).order_by('id').values_list(*fields))
+                self._remember(rows, now)
+            self._synced_at = now
+            self._version = version
+            if now - self._purged_at >= self.purge_interval:
+                self.purge()
+                self._purged_at = now
+
+    def purge(self):
+        current = time.time()
+        self._expires = {jti: exp for jti, exp in self._expires.items() if exp > current}
+
+    def contains(self, jti):
+        self.sync()
+        return jti in self._expires
+
+    def add(self, jti, expires_at):
+        with self._lock:
+            self._expires[jti] = expires_at.timestamp()
+
+    def reset(self):
+        with self._lock:
+            self._expires.clear()
+            self._gaps.clear()
+            self._last_id = None
+            self._version = None
+
+
+_index = None
+_index_lock = threading.Lock()
+
+
+def get_blacklist_index():
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = BlacklistIndex(sync_interval=getattr(settings, 'TASKS_BLACKLIST_SYNC_INTERVAL', 60))
+    return _index
+
+
+class AcceleratedRefreshToken(RefreshToken):
+    """
+    RefreshToken, который проверяет отзыв по BlacklistIndex вместо
+    SELECT с JOIN на каждую проверку и пишет в таблицы blacklist без лишних
+    SELECT: пользователь не загружается, строки вставляются сразу
+    """
+
+    def check_blacklist(self):
+        if get_blacklist_index().contains(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_("Token is blacklisted"))
+
+    def get_outstanding_defaults(self):
+        user_id = self.payload.get(api_settings.USER_ID_CLAIM)
+        user_model = get_user_model()
+        defaults = {
+            'created_at': self.current_time,
+            'token': str(self),
+            'expires_at': datetime_from_epoch(self.payload['exp']),
+        }
+        if api_settings.USER_ID_FIELD == user_model._meta.pk.attname:
+            defaults['user_id'] = user_id
+        else:
+            defaults['user'] = user_model.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        return defaults
+
+    def outstand(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        defaults = self.get_outstanding_defaults()
+        try:
+            # Для нового jti после ротации строки еще нет - сразу INSERT
+            with transaction.atomic():
+                return OutstandingToken.objects.create(jti=jti, **defaults), True
+        except IntegrityError:
+            token = OutstandingToken.objects.filter(jti=jti).first()
+            if token is not None:
+                return token, False
+        # Строки с таким jti нет - INSERT нарушил внешний ключ: пользователь
+        # удален. Как simplejwt, сохраняем токен без пользователя
+        defaults.pop('user_id', None)
+        defaults['user'] = None
+        return OutstandingToken.objects.get_or_create(jti=jti, defaults=defaults)
+
+    def blacklist(self):
+        jti = self.payload[api_settings.JTI_CLAIM]
+        token = OutstandingToken.objects.filter(jti=jti).first()
+        if token is None:
+            token, _ = self.outstand()
+        try:
+            with transaction.atomic():
+                result = BlacklistedToken.objects.create(token=token), True
+        except IntegrityError:
+            result = BlacklistedToken.objects.get(token=token), False
+        get_blacklist_index().add(jti, token.expires_at)
+        return result
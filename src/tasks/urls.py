@@ -14,7 +14,20 @@ from .views import (
     CurrentUserTasksAPIView,
     UserRegistrationView,
     CustomTokenObtainPairView,
-    UserLogoutView
+    UserLogoutView,
+    TaskBulkAPIView,
+    SubTaskBulkAPIView,
+    TaskStatsAPIView,
+    TaskExportAPIView,
+    ProfilingAPIView,
+    ProfilingMetricsView,
+    AsyncTaskListAPIView,
+    AsyncTaskDetailAPIView,
+    AsyncCurrentUserTasksAPIView,
+    AsyncSubTaskListView,
+    AsyncSubTaskDetailView,
+    AsyncCategoryListAPIView,
+    AsyncCategoryDetailAPIView
 )
 
 
@@ -41,12 +54,28 @@ urlpatterns = [
     path('logout/', UserLogoutView.as_view(), name='logout'),
     path('tasks/', TaskListCreateAPIView.as_view(), name='task-list-create'),
     path('tasks/<int:id>/', TaskDetailAPIView.as_view(), name='task-detail'),
+    path('tasks/bulk/', TaskBulkAPIView.as_view(), name='task-bulk'),
 
     path('subtasks/', SubTaskListCreateView.as_view(), name='subtask-list-create'),
     path('subtasks/<int:id>/', SubTaskDetailUpdateDeleteView.as_view(), name='subtask-detail'),
+    path('subtasks/bulk/', SubTaskBulkAPIView.as_view(), name='subtask-bulk'),
 
     path('tasks/by-day/', TaskListByDayOfWeekAPIView.as_view(), name='task-list-by-day'),
     path('tasks/my_tasks/', CurrentUserTasksAPIView.as_view(), name='my-tasks'),
+    path('tasks/stats/', TaskStatsAPIView.as_view(), name='task-stats'),
+    path('tasks/export/', TaskExportAPIView.as_view(), name='task-export'),
+
+    path('profiling/', ProfilingAPIView.as_view(), name='profiling'),
+    path('profiling/metrics/', ProfilingMetricsView.as_view(), name='profiling-metrics'),
+
+    # Async-варианты эндпоинтов чтения для ASGI (core.asgi)
+    path('async/tasks/', AsyncTaskListAPIView.as_view(), name='async-task-list'),
+    path('async/tasks/<int:id>/', AsyncTaskDetailAPIView.as_view(), name='async-task-detail'),
+    path('async/tasks/my_tasks/', AsyncCurrentUserTasksAPIView.as_view(), name='async-my-tasks'),
+    path('async/subtasks/', AsyncSubTaskListView.as_view(), name='async-subtask-list'),
+    path('async/subtasks/<int:id>/', AsyncSubTaskDetailView.as_view(), name='async-subtask-detail'),
+    path('async/categories/', AsyncCategoryListAPIView.as_view(), name='async-category-list'),
+    path('async/categories/<int:pk>/', AsyncCategoryDetailAPIView.as_view(), name='async-category-detail'),
 
     path('', include(router.urls)),
 
@@ -2,27 +2,45 @@ from rest_framework import status, generics, filters, viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from django_filters.rest_framework import DjangoFilterBackend
-from django.db.models.functions import ExtractWeekDay
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.functions import Coalesce
 from django.utils import timezone
-from rest_framework.permissions import IsAuthenticated
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 
 from rest_framework_simplejwt.views import TokenObtainPairView
-from rest_framework_simplejwt.tokens import RefreshToken, TokenError
+from rest_framework_simplejwt.tokens import TokenError
 
 from .models import Task, SubTask, Category
 from .serializers import (
     TaskSerializer,
     TaskCreateSerializer,
     TaskDetailSerializer,
+    TaskBulkSerializer,
+    TaskExportSerializer,
     SubTaskSerializer,
     SubTaskCreateSerializer,
+    SubTaskBulkSerializer,
     CategorySerializer,
     UserRegistrationSerializer
 )
 from .pagination import StandardResultsSetPagination
 from .permissions import IsOwnerOrReadOnly
+from .mixins import (
+    AsyncListMixin, AsyncRetrieveMixin, ConditionalGetMixin, OptimizedQuerysetMixin, SelectablePaginationMixin,
+    ValuesListMixin, alist_state, list_state
+)
+from .search import FullTextSearchFilter
+from .bulk import BulkWriter
+from .cache import CATEGORY_CACHE_NAMESPACE, cached_response
+from .stats import get_task_stats
+from .export import EXPORT_FORMATS, export_lines, serialized_chunks
+from .tokens import AcceleratedRefreshToken
+from .profiling import get_profile_store
 
 
 WEEKDAY_MAPPING = {
@@ -66,7 +84,7 @@ class UserLogoutView(APIView):
             if not refresh_token:
                 return Response({"detail": "Refresh token not found."}, status=status.HTTP_400_BAD_REQUEST)
 
-            token = RefreshToken(refresh_token)
+            token = AcceleratedRefreshToken(refresh_token)
             token.blacklist()
 
             response = Response({"detail": "Successfully logged out."}, status=status.HTTP_200_OK)
@@ -77,14 +95,16 @@ class UserLogoutView(APIView):
         except TokenError:
             return Response({"detail": "Invalid refresh token."}, status=status.HTTP_400_BAD_REQUEST)
 
-class TaskListCreateAPIView(generics.ListCreateAPIView):
+class TaskListCreateAPIView(SelectablePaginationMixin, ValuesListMixin, OptimizedQuerysetMixin, generics.ListCreateAPIView):
     """
-    Эндпоинт для создания новой задачи и получения списка всех задач
+    Эндпоинт для создания новой задачи и получения списка всех задач.
+    ?pagination=cursor включает курсорную пагинацию по (created_at, id),
+    ?fields=id,title выбирает поля, ?expand= без значения отдает категории списком id
     """
     queryset = Task.objects.all()
     serializer_class = TaskSerializer
     pagination_class = StandardResultsSetPagination
-    filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
+    filter_backends = [DjangoFilterBackend, FullTextSearchFilter, filters.OrderingFilter]
     filterset_fields = ['status', 'deadline']
     search_fields = ['title', 'description']
     ordering_fields = ['created_at']
@@ -94,17 +114,66 @@ class TaskListCreateAPIView(generics.ListCreateAPIView):
         serializer.save(owner=self.request.user)
 
 
-class TaskDetailAPIView(generics.RetrieveUpdateDestroyAPIView):
+class TaskExportAPIView(OptimizedQuerysetMixin, generics.GenericAPIView):
+    """
+    Потоковая выгрузка задач с категориями и подзадачами без пагинации.
+    ?file_format=ndjson (по умолчанию) или csv; фильтры те же, что у списка задач,
+    но порядок всегда по created_at: ?search= отбирает задачи без ранжирования
+    """
+    queryset = TaskListCreateAPIView.queryset
+    serializer_class = TaskExportSerializer
+    filter_backends = TaskListCreateAPIView.filter_backends
+    filterset_fields = TaskListCreateAPIView.filterset_fields
+    search_fields = TaskListCreateAPIView.search_fields
+    ordering_fields = TaskListCreateAPIView.ordering_fields
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        file_format = request.query_params.get('file_format', 'ndjson')
+        if file_format not in EXPORT_FORMATS:
+            raise ValidationError({'file_format': f"Допустимые значения: {', '.join(EXPORT_FORMATS)}"})
+        content_type, filename = EXPORT_FORMATS[file_format]
+
+        queryset = self.filter_queryset(self.get_queryset())
+        chunk_size = getattr(settings, 'TASKS_EXPORT_CHUNK_SIZE', 1000)
+        chunks = serialized_chunks(queryset, self.get_serializer_class(), chunk_size)
+
+        response = StreamingHttpResponse(export_lines(file_format, chunks), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
+
+
+class TaskDetailAPIView(ConditionalGetMixin, OptimizedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
-    Эндпоинт для получения, обновления и удаления конкретной задачи по ее id
+    Эндпоинт для получения, обновления и удаления конкретной задачи по ее id.
+    Поддерживает ?fields=id,title,subtasks, ?subtasks_limit=N и условные GET:
+    updated_at проверяется запросом по первичному ключу
     """
     queryset = Task.objects.all()
     serializer_class = TaskDetailSerializer
     lookup_field = 'id'
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
 
+    def get_resource_state(self):
+        return self.updated_at_state(self.get_state_queryset().first())
+
+    def get_state_queryset(self):
+        return Task.objects.filter(id=self.kwargs['id']).order_by().values_list('updated_at', flat=True)
+
+    @staticmethod
+    def updated_at_state(updated_at):
+        if updated_at is None:
+            # Задачи нет - 404 вернет обычный путь
+            return None
+        return updated_at.isoformat(), updated_at
 
-class TaskListByDayOfWeekAPIView(generics.ListAPIView):
+    def perform_update(self, serializer):
+        # Задача и письмо в outbox о смене статуса сохраняются одной транзакцией
+        with transaction.atomic():
+            serializer.save()
+
+
+class TaskListByDayOfWeekAPIView(ValuesListMixin, OptimizedQuerysetMixin, generics.ListAPIView):
     """
     Эндпоинт для получения списка задач по дню недели.
     """
@@ -118,20 +187,85 @@ class TaskListByDayOfWeekAPIView(generics.ListAPIView):
         if day_of_week:
             try:
                 day_num = WEEKDAY_MAPPING[day_of_week.lower()]
-                queryset = queryset.annotate(
-                    weekday=ExtractWeekDay('created_at')
-                ).filter(weekday=day_num)
+                # Хранимый день недели с индексом вместо функции от created_at
+                queryset = queryset.filter(created_weekday=day_num)
             except KeyError:
                 return Task.objects.none()
         return queryset
 
 
-class SubTaskListCreateView(generics.ListCreateAPIView):
+class TaskStatsAPIView(APIView):
     """
-    Эндпоинт для создания подзадачи и получения списка всех подзадач с пагинацией и фильтрацией
+    Статистика задач текущего пользователя: распределение по статусам,
+    просроченные, распределение по дням недели и доля выполненных подзадач.
+    Для больших объемов берется из снимка (manage.py refresh_task_stats);
+    ?fresh=true - посчитать на лету, ?tasks_limit=N - сколько задач в списке tasks
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        tasks_limit = None
+        if 'tasks_limit' in params:
+            try:
+                tasks_limit = int(params['tasks_limit'])
+            except ValueError:
+                tasks_limit = -1
+            if not 0 <= tasks_limit <= 1000:
+                raise ValidationError({'tasks_limit': "Должно быть целым числом от 0 до 1000"})
+        fresh = params.get('fresh', '').lower() in ('1', 'true', 'yes')
+
+        data, generated_at, source = get_task_stats(request.user, fresh=fresh, tasks_limit=tasks_limit)
+        return Response({**data, 'generated_at': generated_at, 'source': source})
+
+
+class ProfilingAPIView(APIView):
+    """
+    Отчет ProfilingMiddleware по маршрутам этого процесса: время ответа,
+    среднее число SQL, время в БД и сериализации, самые частые повторы запросов.
+    ?top=N - сколько повторов показывать; DELETE - обнулить счетчики
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        try:
+            top = int(request.query_params.get('top', 10))
+        except ValueError:
+            top = -1
+        if not 0 <= top <= 100:
+            raise ValidationError({'top': "Должно быть целым числом от 0 до 100"})
+        store = get_profile_store()
+        return Response({
+            'started_at': store.started_at,
+            'sample_rate': getattr(settings, 'TASKS_PROFILING_SAMPLE_RATE', 0),
+            'endpoints': store.snapshot(top),
+        })
+
+    def delete(self, request):
+        get_profile_store().reset()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ProfilingMetricsView(APIView):
+    """
+    Те же счетчики в текстовом формате Prometheus
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return HttpResponse(get_profile_store().prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+class SubTaskListCreateView(SelectablePaginationMixin, ValuesListMixin, OptimizedQuerysetMixin, generics.ListCreateAPIView):
+    """
+    Эндпоинт для создания подзадачи и получения списка всех подзадач с пагинацией и фильтрацией.
+    ?search= - полнотекстовый поиск по названию и описанию подзадачи,
+    ?fields= - выбор полей, ?expand=task - краткая задача вместо ее id
     """
     serializer_class = SubTaskSerializer
     pagination_class = StandardResultsSetPagination
+    filter_backends = [FullTextSearchFilter]
+    search_fields = ['title', 'description']
     permission_classes = [IsAuthenticated]
 
     def perform_create(self, serializer):
@@ -150,7 +284,7 @@ class SubTaskListCreateView(generics.ListCreateAPIView):
         return queryset
 
 
-class SubTaskDetailUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
+class SubTaskDetailUpdateDeleteView(OptimizedQuerysetMixin, generics.RetrieveUpdateDestroyAPIView):
     """
     Эндпоинт для получения, обновления и удаления конкретной подзадачи
     """
@@ -160,27 +294,182 @@ class SubTaskDetailUpdateDeleteView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
 
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(OptimizedQuerysetMixin, viewsets.ModelViewSet):
     """
     Вьюсет для CRUD операций с категориями и подсчета количества задач
     """
-    queryset = Category.objects.all()
+    queryset = Category.objects.order_by('name')
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
 
+    def list(self, request, *args, **kwargs):
+        # Список категорий отдается из кэша, версия сбрасывается сигналами (см. signals.py)
+        return cached_response(
+            request, CATEGORY_CACHE_NAMESPACE, lambda: super(CategoryViewSet, self).list(request, *args, **kwargs).data
+        )
+
     @action(detail=False, methods=['get'])
     def count_tasks(self, request):
 
-        categories_with_task_count = Category.objects.annotate(task_count=Count('tasks')).values('id', 'name', 'task_count')
-        return Response(categories_with_task_count)
+        def build():
+            # Количество берется из таблицы счетчиков, а не считается по задачам
+            categories_with_task_count = Category.objects.annotate(
+                task_count=Coalesce('task_counter__task_count', 0)
+            ).values('id', 'name', 'task_count')
+            return list(categories_with_task_count)
+
+        return cached_response(request, CATEGORY_CACHE_NAMESPACE, build)
 
-class CurrentUserTasksAPIView(generics.ListAPIView):
+class CurrentUserTasksAPIView(ConditionalGetMixin, SelectablePaginationMixin, ValuesListMixin, OptimizedQuerysetMixin,
+                              generics.ListAPIView):
     """
-    Получение списка задач, принадлежащих только текущему пользователю
+    Получение списка задач, принадлежащих только текущему пользователю.
+    Поддерживает условные GET: состояние списка - COUNT и MAX(updated_at) задач
+    пользователя, которые читаются из индекса (owner, is_deleted, updated_at)
     """
     serializer_class = TaskSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_resource_state(self):
+        return list_state(self.get_queryset())
+
     def get_queryset(self):
         # Фильтруем задачи по текущему пользователю
         return Task.objects.filter(owner=self.request.user).order_by('-created_at')
+
+
+class AsyncTaskListAPIView(AsyncListMixin, TaskListCreateAPIView):
+    """
+    Async-вариант GET /tasks/ для ASGI: те же фильтры, поиск, ?fields=, ?expand= и пагинация
+    """
+
+
+class AsyncTaskDetailAPIView(AsyncRetrieveMixin, TaskDetailAPIView):
+    """
+    Async-вариант GET /tasks/<id>/ с ?fields=, ?subtasks_limit= и условными GET
+    """
+
+    async def aget_resource_state(self):
+        return self.updated_at_state(await self.get_state_queryset().afirst())
+
+
+class AsyncCurrentUserTasksAPIView(AsyncListMixin, CurrentUserTasksAPIView):
+    """
+    Async-вариант GET /tasks/my_tasks/ с условными GET
+    """
+
+    async def aget_resource_state(self):
+        return await alist_state(self.get_queryset())
+
+
+class AsyncSubTaskListView(AsyncListMixin, SubTaskListCreateView):
+    """
+    Async-вариант GET /subtasks/
+    """
+
+
+class AsyncSubTaskDetailView(AsyncRetrieveMixin, SubTaskDetailUpdateDeleteView):
+    """
+    Async-вариант GET /subtasks/<id>/
+    """
+
+
+class AsyncCategoryListAPIView(AsyncListMixin, OptimizedQuerysetMixin, generics.ListAPIView):
+    """
+    Async-вариант GET /categories/. Кэш ответов CategoryViewSet не используется:
+    запрос страницы категорий сам по себе дешевый
+    """
+    queryset = CategoryViewSet.queryset
+    serializer_class = CategorySerializer
+    permission_classes = [IsAuthenticated]
+
+
+class AsyncCategoryDetailAPIView(AsyncRetrieveMixin, OptimizedQuerysetMixin, generics.RetrieveAPIView):
+    """
+    Async-вариант GET /categories/<id>/
+    """
+    queryset = CategoryViewSet.queryset
+    serializer_class = CategorySerializer
+    permission_classes = [IsAuthenticated]
+
+
+class BulkAPIView(APIView):
+    """
+    Базовый эндпоинт пакетных операций: POST - создание, PATCH - обновление списка.
+    ?mode=atomic (по умолчанию) - все или ничего, ?mode=partial - сохраняются валидные
+    элементы; ?batch_size=N - размер пачки вставки/обновления
+    """
+    serializer_class = None
+    permission_classes = [IsAuthenticated]
+
+    def get_update_queryset(self):
+        return self.serializer_class.Meta.model.objects.all()
+
+    def get_writer(self, request):
+        params = request.query_params
+        mode = params.get('mode', 'atomic')
+        if mode not in ('atomic', 'partial'):
+            raise ValidationError({'mode': "Допустимые значения: atomic, partial"})
+
+        max_batch_size = getattr(settings, 'TASKS_BULK_MAX_BATCH_SIZE', 2000)
+        batch_size = getattr(settings, 'TASKS_BULK_BATCH_SIZE', 500)
+        if 'batch_size' in params:
+            try:
+                batch_size = int(params['batch_size'])
+            except ValueError:
+                batch_size = 0
+            if not 1 <= batch_size <= max_batch_size:
+                raise ValidationError({'batch_size': f"Должно быть целым числом от 1 до {max_batch_size}"})
+
+        return BulkWriter(
+            self.serializer_class,
+            request,
+            batch_size=batch_size,
+            atomic=mode == 'atomic',
+            queryset=self.get_update_queryset(),
+            extra_fields={'owner': request.user},
+        )
+
+    def get_items(self, request):
+        items = request.data
+        max_items = getattr(settings, 'TASKS_BULK_MAX_ITEMS', 5000)
+        if not isinstance(items, list) or not items:
+            raise ValidationError({'non_field_errors': ["Ожидается непустой список объектов"]})
+        if len(items) > max_items:
+            raise ValidationError({'non_field_errors': [f"Не больше {max_items} объектов за запрос"]})
+        return items
+
+    def make_response(self, results, all_ok, success_status):
+        if all_ok:
+            response_status = success_status
+        elif any(result['status'] in ('created', 'updated') for result in results):
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'results': results}, status=response_status)
+
+    def post(self, request):
+        results, all_ok = self.get_writer(request).create(self.get_items(request))
+        return self.make_response(results, all_ok, status.HTTP_201_CREATED)
+
+    def patch(self, request):
+        results, all_ok = self.get_writer(request).update(self.get_items(request))
+        return self.make_response(results, all_ok, status.HTTP_200_OK)
+
+
+class TaskBulkAPIView(BulkAPIView):
+    """
+    Пакетное создание и обновление задач
+    """
+    serializer_class = TaskBulkSerializer
+
+    def get_update_queryset(self):
+        # Владелец нужен для писем о смене статуса
+        return Task.objects.select_related('owner')
+
+
+class SubTaskBulkAPIView(BulkAPIView):
+    """
+    Пакетное создание и обновление подзадач
+    """
+    serializer_class = SubTaskBulkSerializer